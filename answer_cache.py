@@ -0,0 +1,125 @@
+"""
+Semantic cache of generated answers for repeat first-turn questions.
+
+An answer is reused when a new question
+
+- retrieves the same knowledge-base chunks,
+- comes from a user in the same coarse profile bucket,
+- embeds within `similarity_threshold` (cosine) of the cached question,
+- and the knowledge base has not been re-ingested since it was cached.
+
+Only first messages are cached: with history the answer depends on the
+conversation, which the cache key does not capture.
+"""
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from ttl_cache import TTLCache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# user_metadata fields that RAGSystem puts into the prompt's profile section
+PROFILE_FIELDS = ('age', 'income_range', 'marital_status', 'employment_status', 'education')
+
+
+def _age_bucket(age) -> Optional[str]:
+    """Decade bucket for numeric ages; range strings ("25-34") are already coarse"""
+    if age is None or age == "":
+        return None
+    try:
+        return f"{int(age) // 10 * 10}s"
+    except (TypeError, ValueError):
+        return str(age).strip().lower()
+
+
+def profile_bucket(user_metadata: Optional[Dict]) -> tuple:
+    """Coarse, hashable summary of the profile fields used in the prompt"""
+    if not user_metadata:
+        return ()
+    bucket = []
+    for field in PROFILE_FIELDS:
+        value = user_metadata.get(field)
+        if field == 'age':
+            value = _age_bucket(value)
+        elif value:
+            value = str(value).strip().lower()
+        bucket.append(value or None)
+    return tuple(bucket)
+
+
+class SemanticAnswerCache:
+    """LRU + TTL answer cache keyed by (retrieved chunk ids, profile bucket)"""
+
+    def __init__(self, maxsize: int = 512, ttl: Optional[float] = 86400.0,
+                 similarity_threshold: float = 0.95, entries_per_key: int = 8):
+        self.similarity_threshold = similarity_threshold
+        self.entries_per_key = entries_per_key
+        # key -> list of (normalized query embedding, answer)
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._kb_version: Optional[str] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(chunk_ids: Sequence[str], user_metadata: Optional[Dict]) -> tuple:
+        return tuple(sorted(chunk_ids)), profile_bucket(user_metadata)
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_kb_version(self, kb_version: str):
+        with self._lock:
+            if kb_version != self._kb_version:
+                if self._kb_version is not None:
+                    logger.info("Knowledge base changed; clearing answer cache")
+                self._cache.clear()
+                self._kb_version = kb_version
+
+    def lookup(self, key: tuple, embedding, kb_version: str) -> Optional[str]:
+        """Return a cached answer for a semantically equivalent question, if any"""
+        self._check_kb_version(kb_version)
+        entries: List = self._cache.get(key) or []
+        match = None
+        if entries:
+            query = self._normalize(embedding)
+            for cached_embedding, answer in entries:
+                if float(np.dot(query, cached_embedding)) >= self.similarity_threshold:
+                    match = answer
+                    break
+        with self._lock:
+            if match is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return match
+
+    def store(self, key: tuple, embedding, answer: str, kb_version: str):
+        """Cache an answer generated for the given key and question embedding"""
+        self._check_kb_version(kb_version)
+        with self._lock:
+            entries = list(self._cache.get(key) or [])
+            entries.append((self._normalize(embedding), answer))
+            self._cache.set(key, entries[-self.entries_per_key:])
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        stats = self._cache.stats()
+        stats.update({
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        })
+        return stats
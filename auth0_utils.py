@@ -2,65 +2,129 @@
 Auth0 token verification utilities for FastAPI
 """
 import jwt
+from jwt.algorithms import RSAAlgorithm
 from jwt.exceptions import InvalidTokenError, ExpiredSignatureError, InvalidAudienceError, InvalidIssuerError
 import requests
 from typing import Optional, Dict
 from fastapi import HTTPException, status
-from functools import lru_cache
+import hashlib
 import logging
 import json
+import threading
+import time
 
 from config import Config
+from executors import run_http
+from ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
-# Cache JWKS (JSON Web Key Set) for 1 hour
-@lru_cache(maxsize=1)
-def get_jwks():
-    """Fetch Auth0's public keys for token verification"""
-    jwks_url = f"https://{Config.AUTH0_DOMAIN}/.well-known/jwks.json"
-    try:
-        response = requests.get(jwks_url, timeout=10)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        logger.error(f"Error fetching JWKS: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Unable to verify authentication"
-        )
+class JWKSKeyStore:
+    """
+    Auth0 signing keys as ready-to-use public key objects, indexed by kid.
 
-def get_rsa_key(token: str) -> Dict:
-    """Get the RSA key from JWKS that matches the token"""
-    jwks = get_jwks()
-    try:
-        unverified_header = jwt.get_unverified_header(token)
-    except Exception as e:
-        logger.error(f"Error decoding token header: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token format"
-        )
+    Keys are refreshed when older than `ttl` seconds, and an unknown kid
+    (key rotation) triggers a refetch - at most once per
+    `min_refresh_interval` seconds so garbage kids cannot hammer Auth0.
+    """
     
-    rsa_key = {}
-    for key in jwks["keys"]:
-        if key["kid"] == unverified_header["kid"]:
-            rsa_key = {
-                "kty": key["kty"],
-                "kid": key["kid"],
-                "use": key["use"],
-                "n": key["n"],
-                "e": key["e"]
-            }
-            break
+    def __init__(self, ttl: float = 3600.0, min_refresh_interval: float = 30.0):
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._keys: Dict[str, object] = {}
+        self._jwks: Dict = {"keys": []}
+        self._fetched_at = 0.0
+        self._last_attempt = float("-inf")
+        self._lock = threading.Lock()
     
-    if not rsa_key:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Unable to find appropriate key"
-        )
+    @property
+    def jwks_url(self) -> str:
+        return f"https://{Config.AUTH0_DOMAIN}/.well-known/jwks.json"
     
-    return rsa_key
+    def load_jwks(self, jwks: Dict):
+        """Build public keys for every RSA signing key in a JWKS document"""
+        keys = {}
+        for jwk in jwks.get("keys", []):
+            if jwk.get("kty") != "RSA" or "kid" not in jwk:
+                continue
+            try:
+                keys[jwk["kid"]] = RSAAlgorithm.from_jwk(json.dumps(jwk))
+            except Exception as e:
+                logger.warning(f"Skipping unusable JWK {jwk.get('kid')}: {e}")
+        self._keys = keys
+        self._jwks = jwks
+        self._fetched_at = time.monotonic()
+    
+    def refresh(self, force: bool = False) -> bool:
+        """Refetch the JWKS (rate limited unless forced); returns True on success"""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_attempt < self.min_refresh_interval:
+                return False
+            self._last_attempt = now
+            try:
+                response = requests.get(self.jwks_url, timeout=10)
+                response.raise_for_status()
+                self.load_jwks(response.json())
+                logger.info(f"Loaded {len(self._keys)} Auth0 signing keys")
+                return True
+            except Exception as e:
+                logger.error(f"Error fetching JWKS: {e}")
+                return False
+    
+    def get_jwks(self) -> Dict:
+        """Raw JWKS document, refreshed if stale"""
+        self._refresh_if_stale()
+        return self._jwks
+    
+    def get_key(self, kid: str):
+        """Public key for a kid, refreshing on TTL expiry or unknown kid"""
+        self._refresh_if_stale()
+        key = self._keys.get(kid)
+        if key is None:
+            self.refresh()
+            key = self._keys.get(kid)
+        if key is None:
+            if not self._keys:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Unable to verify authentication"
+                )
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Unable to find appropriate key"
+            )
+        return key
+    
+    def _refresh_if_stale(self):
+        if not self._keys or time.monotonic() - self._fetched_at > self.ttl:
+            # Keep serving the old keys if the refresh fails
+            self.refresh()
+
+
+key_store = JWKSKeyStore(ttl=Config.JWKS_CACHE_TTL, min_refresh_interval=Config.JWKS_MIN_REFRESH_INTERVAL)
+
+# Verified claims by sha256(token); each entry expires at the token's `exp`
+verified_token_cache = TTLCache(maxsize=Config.TOKEN_CACHE_SIZE, ttl=None)
+
+
+def get_jwks():
+    """Fetch Auth0's public keys for token verification"""
+    return key_store.get_jwks()
+
+
+def _strip_bearer(token: str) -> str:
+    return token[7:] if token.startswith("Bearer ") else token
+
+
+def _token_cache_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def get_cached_claims(token: str) -> Optional[Dict]:
+    """Claims of a previously verified, still unexpired token"""
+    return verified_token_cache.get(_token_cache_key(_strip_bearer(token)))
+
 
 def verify_token(token: str) -> Optional[Dict]:
     """
@@ -77,35 +141,24 @@ def verify_token(token: str) -> Optional[Dict]:
     """
     try:
         # Remove 'Bearer ' prefix if present
-        if token.startswith("Bearer "):
-            token = token[7:]
-        
-        # Get RSA key
-        rsa_key = get_rsa_key(token)
-        
-        # Construct public key from JWK
-        # PyJWT 2.x uses cryptography library directly
-        from cryptography.hazmat.primitives.asymmetric import rsa
-        from cryptography.hazmat.backends import default_backend
-        import base64
-        
-        # Decode base64url-encoded values
-        def base64url_decode(value):
-            # Add padding if needed
-            padding = 4 - len(value) % 4
-            if padding != 4:
-                value += '=' * padding
-            return base64.urlsafe_b64decode(value)
+        token = _strip_bearer(token)
         
-        n_bytes = base64url_decode(rsa_key['n'])
-        e_bytes = base64url_decode(rsa_key['e'])
+        cache_key = _token_cache_key(token)
+        payload = verified_token_cache.get(cache_key)
+        if payload is not None:
+            return payload
         
-        # Convert to integers
-        n = int.from_bytes(n_bytes, 'big')
-        e = int.from_bytes(e_bytes, 'big')
+        try:
+            unverified_header = jwt.get_unverified_header(token)
+        except Exception as e:
+            logger.error(f"Error decoding token header: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid token format"
+            )
         
-        # Create RSA public key
-        public_key = rsa.RSAPublicNumbers(e, n).public_key(default_backend())
+        # Prebuilt public key for the token's kid
+        public_key = key_store.get_key(unverified_header.get("kid"))
         
         # Verify and decode token
         issuer = f"https://{Config.AUTH0_DOMAIN}/"
@@ -118,8 +171,17 @@ def verify_token(token: str) -> Optional[Dict]:
             options={"verify_signature": True}
         )
         
+        # Cache until the token expires (tokens without exp are not cached)
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            remaining = min(exp - time.time(), Config.TOKEN_CACHE_MAX_TTL)
+            if remaining > 0:
+                verified_token_cache.set(cache_key, payload, ttl=remaining)
+        
         return payload
         
+    except HTTPException:
+        raise
     except ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -153,3 +215,16 @@ def get_current_user(token: Optional[str] = None) -> Dict:
     payload = verify_token(token)
     return payload
 
+
+async def get_current_user_async(token: Optional[str] = None) -> Dict:
+    """
+    Async get_current_user for route handlers.
+    
+    Cached tokens are answered on the event loop; anything that may need
+    RSA verification or a JWKS fetch runs on the HTTP executor.
+    """
+    if token:
+        payload = get_cached_claims(token)
+        if payload is not None:
+            return payload
+    return await run_http(get_current_user, token)
@@ -0,0 +1,109 @@
+"""
+Microbenchmark: per-request Auth0 token verification cost.
+
+Signs an RS256 token with a throwaway key, loads the matching JWKS into
+auth0_utils.key_store (no network), then times:
+
+- before:      the previous verify_token path - base64-decode the JWK,
+               build RSAPublicNumbers, full RS256 jwt.decode - every call
+- prebuilt:    verify_token with the verified-claims cache cleared each
+               call (prebuilt key, still a full RS256 verification)
+- cached:      verify_token on a repeat token (claims cache hit)
+
+Usage:
+    python benchmarks/auth_verify.py [--iterations 2000]
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jwt  # noqa: E402
+from cryptography.hazmat.backends import default_backend  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import rsa  # noqa: E402
+from jwt.algorithms import RSAAlgorithm  # noqa: E402
+
+from config import Config  # noqa: E402
+
+Config.AUTH0_DOMAIN = "bench.example.auth0.com"
+Config.AUTH0_AUDIENCE = "https://bench-api"
+
+import auth0_utils  # noqa: E402
+
+KID = "bench-key"
+
+
+def make_token_and_jwks():
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update({"kid": KID, "use": "sig", "alg": "RS256"})
+    claims = {
+        "sub": "auth0|bench",
+        "iss": f"https://{Config.AUTH0_DOMAIN}/",
+        "aud": Config.AUTH0_AUDIENCE,
+        "iat": int(time.time()),
+        "exp": int(time.time()) + 3600,
+    }
+    token = jwt.encode(claims, private_key, algorithm="RS256", headers={"kid": KID})
+    return token, {"keys": [jwk]}
+
+
+def legacy_verify(token: str, jwks: dict):
+    """The verification steps verify_token used to run on every request"""
+    header = jwt.get_unverified_header(token)
+    rsa_key = next(key for key in jwks["keys"] if key["kid"] == header["kid"])
+
+    def base64url_decode(value):
+        padding = 4 - len(value) % 4
+        if padding != 4:
+            value += '=' * padding
+        return base64.urlsafe_b64decode(value)
+
+    n = int.from_bytes(base64url_decode(rsa_key['n']), 'big')
+    e = int.from_bytes(base64url_decode(rsa_key['e']), 'big')
+    public_key = rsa.RSAPublicNumbers(e, n).public_key(default_backend())
+    return jwt.decode(
+        token, public_key, algorithms=["RS256"], audience=Config.AUTH0_AUDIENCE,
+        issuer=f"https://{Config.AUTH0_DOMAIN}/", options={"verify_signature": True}
+    )
+
+
+def time_per_call(func, iterations: int) -> float:
+    func()  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    token, jwks = make_token_and_jwks()
+    auth0_utils.key_store.load_jwks(jwks)
+    bearer = f"Bearer {token}"
+
+    def prebuilt():
+        auth0_utils.verified_token_cache.clear()
+        return auth0_utils.verify_token(bearer)
+
+    results = {
+        "before (rebuild key + RS256)": time_per_call(lambda: legacy_verify(token, jwks), args.iterations),
+        "prebuilt key + RS256": time_per_call(prebuilt, args.iterations),
+        "claims cache hit": time_per_call(lambda: auth0_utils.verify_token(bearer), args.iterations),
+    }
+
+    baseline = results["before (rebuild key + RS256)"]
+    print(f"{args.iterations} iterations")
+    for label, micros in results.items():
+        print(f"{label:<32}{micros:>10.1f} us/request{baseline / micros:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
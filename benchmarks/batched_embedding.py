@@ -0,0 +1,88 @@
+"""
+Benchmark: one-shot collection.add vs. batched (multi-process) embedding.
+
+Extracts the knowledge base once (replicated --copies times so there is
+enough work), then writes all chunks into a fresh scratch collection with:
+
+- "one-shot":  a single collection.add of every chunk, Chroma embedding
+               implicitly in one batch (the previous behaviour)
+- "batched":   VectorStore._write_chunks with EMBEDDING_BATCH_SIZE batches
+               and a background writer, in-process
+- "batched-N": the same on an N-process sentence-transformers pool
+
+Each mode runs in its own process so peak RSS is comparable.
+
+Usage:
+    python benchmarks/batched_embedding.py [--copies 10] [--batch-size 256] [--processes 2,4]
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from document_processor import DocumentProcessor  # noqa: E402
+
+
+def run_mode(mode: str, processes: int, batch_size: int, chunks, results):
+    from vector_store import VectorStore
+
+    Config.EMBEDDING_BATCH_SIZE = batch_size
+    Config.EMBEDDING_PROCESSES = processes
+    store = VectorStore(db_path=tempfile.mkdtemp(prefix="embed_bench_"), embedding_model=Config.EMBEDDING_MODEL)
+    ids = [f"chunk_{i}" for i in range(len(chunks))]
+    metadatas = [{"chunk_index": i} for i in range(len(chunks))]
+
+    start = time.perf_counter()
+    if mode == "one-shot":
+        store.collection.add(ids=ids, documents=chunks, metadatas=metadatas)
+    else:
+        store._write_chunks(store.collection.add, ids, chunks, metadatas)
+    elapsed = time.perf_counter() - start
+    results[mode] = {
+        "seconds": elapsed,
+        "chunks_per_sec": len(chunks) / elapsed,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "stored": store.get_collection_info()["document_count"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=Config.KNOWLEDGE_BASE_PATH)
+    parser.add_argument("--copies", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=Config.EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--processes", default="2,4", help="comma-separated pool sizes ('' to skip)")
+    args = parser.parse_args()
+
+    processor = DocumentProcessor(args.corpus)
+    documents = processor.process_all_documents()
+    chunks = [chunk["text"] for doc in documents for chunk in doc["chunks"]] * args.copies
+
+    modes = [("one-shot", 0), ("batched", 0)]
+    modes += [(f"batched-{n}", int(n)) for n in args.processes.split(",") if n]
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Manager().dict()
+    for mode, processes in modes:
+        child = context.Process(target=run_mode, args=(mode, processes, args.batch_size, chunks, results))
+        child.start()
+        child.join()
+
+    print(f"{len(chunks)} chunks, batch size {args.batch_size}")
+    print(f"{'mode':<12}{'seconds':>9}{'chunks/s':>10}{'peak RSS MB':>13}{'stored':>8}")
+    for mode, _ in modes:
+        if mode not in results:
+            print(f"{mode:<12}  failed (see log above)")
+            continue
+        r = results[mode]
+        print(f"{mode:<12}{r['seconds']:>9.2f}{r['chunks_per_sec']:>10.0f}{r['peak_rss_mb']:>13.0f}{r['stored']:>8}")
+
+
+if __name__ == "__main__":
+    main()
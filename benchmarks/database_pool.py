@@ -0,0 +1,129 @@
+"""
+Benchmark: pooled WAL connections vs. one fresh connection per call.
+
+Runs the same mixed workload (get_user, get_conversation, store_conversation)
+from N threads against two scratch databases:
+
+- "pooled": the current Database (per-thread connections, WAL,
+  busy_timeout, synchronous=NORMAL, cached statements)
+- "fresh":  the previous behaviour, a new default (rollback-journal)
+  connection opened and closed around every call
+
+Usage:
+    python benchmarks/database_pool.py [--threads 8] [--seconds 5] [--history 20]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database  # noqa: E402
+
+OPERATIONS = ("get_user", "get_conversation", "store_conversation")
+
+
+class FreshConnectionDatabase(Database):
+    """Database as it behaved before pooling: connect/close on every call"""
+
+    @contextmanager
+    def connection(self):
+        conn = sqlite3.connect(str(self.db_path))
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+def seed(db: Database, users: int, history: int):
+    messages = [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i} " * 20, "timestamp": "t"}
+        for i in range(history)
+    ]
+    user_ids = []
+    for i in range(users):
+        user_id = db.create_user(f"User {i}", f"user{i}@example.com")
+        db.store_conversation(user_id, f"conv-{user_id}", messages)
+        user_ids.append(user_id)
+    return user_ids, messages
+
+
+def worker(db: Database, user_ids, messages, op: str, deadline: float, counts, errors, index: int):
+    n = 0
+    failed = 0
+    i = index
+    while time.perf_counter() < deadline:
+        user_id = user_ids[i % len(user_ids)]
+        i += 1
+        if op == "get_user":
+            ok = db.get_user(user_id) is not None
+        elif op == "get_conversation":
+            ok = db.get_conversation(user_id, f"conv-{user_id}") is not None
+        else:
+            ok = db.store_conversation(user_id, f"conv-{user_id}", messages)
+        n += 1
+        failed += 0 if ok else 1
+    counts[index] = n
+    errors[index] = failed
+
+
+def run_mix(db: Database, user_ids, messages, threads: int, seconds: float):
+    """Threads are split evenly across the three operations"""
+    counts = [0] * threads
+    errors = [0] * threads
+    ops = [OPERATIONS[i % len(OPERATIONS)] for i in range(threads)]
+    deadline = time.perf_counter() + seconds
+    pool = [
+        threading.Thread(target=worker, args=(db, user_ids, messages, ops[i], deadline, counts, errors, i))
+        for i in range(threads)
+    ]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+
+    result = {}
+    for op in OPERATIONS:
+        total = sum(c for c, o in zip(counts, ops) if o == op)
+        failed = sum(e for e, o in zip(errors, ops) if o == op)
+        result[op] = {"ops_per_sec": round(total / seconds, 1), "errors": failed}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=9, help="worker threads (split across the 3 operations)")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--history", type=int, default=20, help="messages per stored conversation")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="db_bench_")
+    results = {}
+    for label, cls in (("fresh", FreshConnectionDatabase), ("pooled", Database)):
+        db = cls(os.path.join(scratch, f"{label}.db"))
+        user_ids, messages = seed(db, args.users, args.history)
+        results[label] = run_mix(db, user_ids, messages, args.threads, args.seconds)
+        db.close()
+
+    print(f"{args.threads} threads, {args.seconds}s, {args.history} messages/conversation")
+    print(f"{'operation':<20}{'fresh ops/s':>14}{'pooled ops/s':>14}{'speedup':>10}{'errors':>10}")
+    for op in OPERATIONS:
+        fresh, pooled = results["fresh"][op], results["pooled"][op]
+        speedup = pooled["ops_per_sec"] / fresh["ops_per_sec"] if fresh["ops_per_sec"] else float("inf")
+        errors = f"{fresh['errors']}/{pooled['errors']}"
+        print(f"{op:<20}{fresh['ops_per_sec']:>14}{pooled['ops_per_sec']:>14}{speedup:>9.1f}x{errors:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Benchmark and compatibility check: PyTorch vs. ONNX Runtime embeddings.
+
+Each backend (sentence-transformers, onnx, onnx int8) runs in a fresh
+process, which reports:
+
+- import + load:  seconds to import the backend and load the model
+- RSS:            resident memory of the process after loading and encoding
+- query p50/p95:  single-query latency on QUESTIONS (query-time path)
+- chunks/s:       batch throughput on the knowledge-base chunks (ingestion path)
+
+The parent then compares every backend's vectors with the PyTorch ones:
+minimum and mean cosine similarity over chunks and questions, and the
+overlap of each question's top-5 chunks when questions are embedded by the
+backend but chunks by PyTorch (an index built before switching backends).
+Exits non-zero if the fp32 ONNX vectors fall below --tolerance, or the int8
+ones below --int8-tolerance.
+
+Needs sentence-transformers, onnxruntime and access to the model's ONNX
+export on the Hugging Face Hub (or EMBEDDING_ONNX_PATH).
+
+Usage:
+    python benchmarks/embedding_backends.py [--tolerance 0.999] [--int8-tolerance 0.98]
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from document_processor import DocumentProcessor  # noqa: E402
+
+QUESTIONS = [
+    "What is the difference between a 401(k) and an IRA?",
+    "How should a beginner start saving for retirement?",
+    "How do I start investing with little money?",
+    "How can I raise my credit score quickly?",
+    "When is the tax filing deadline?",
+    "How do I protect myself from online scams?",
+    "Where can I get help if my partner controls my finances?",
+    "How can I prepare for the SAT for free?",
+    "How can I make my resume pass applicant tracking systems?",
+    "What is a Roth IRA?",
+]
+
+BACKENDS = [
+    ("torch", "sentence-transformers", False),
+    ("onnx", "onnx", False),
+    ("onnx-int8", "onnx", True),
+]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_backend(name: str, backend: str, quantized: bool, chunks, repeats: int, results):
+    start = time.perf_counter()
+    Config.EMBEDDING_QUANTIZED = quantized
+    from embeddings import create_embedding_function
+    embed = create_embedding_function(Config.EMBEDDING_MODEL, backend)
+    load = time.perf_counter() - start
+
+    embed(QUESTIONS[:1])  # warm-up
+    latencies = []
+    for _ in range(repeats):
+        for question in QUESTIONS:
+            start = time.perf_counter()
+            embed([question])
+            latencies.append((time.perf_counter() - start) * 1e3)
+
+    start = time.perf_counter()
+    chunk_vectors = embed(chunks)
+    throughput = len(chunks) / (time.perf_counter() - start)
+
+    results[name] = {
+        "load": load,
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "chunks_per_sec": throughput,
+        "chunks": np.asarray(chunk_vectors, dtype=np.float32),
+        "questions": np.asarray(embed(QUESTIONS), dtype=np.float32),
+    }
+
+
+def unit(vectors):
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=Config.KNOWLEDGE_BASE_PATH)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--tolerance", type=float, default=0.999, help="min cosine vs. torch for fp32 ONNX")
+    parser.add_argument("--int8-tolerance", type=float, default=0.98, help="min cosine vs. torch for int8 ONNX")
+    args = parser.parse_args()
+
+    documents = DocumentProcessor(args.corpus).process_all_documents()
+    chunks = [chunk["text"] for doc in documents for chunk in doc["chunks"]]
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Manager().dict()
+    for name, backend, quantized in BACKENDS:
+        child = context.Process(target=run_backend, args=(name, backend, quantized, chunks, args.repeats, results))
+        child.start()
+        child.join()
+
+    print(f"{len(chunks)} chunks, {len(QUESTIONS)} questions")
+    print(f"{'backend':<11}{'load s':>8}{'RSS MB':>8}{'p50 ms':>8}{'p95 ms':>8}{'chunks/s':>10}"
+          f"{'min cos':>9}{'mean cos':>10}{'top5 overlap':>14}")
+    if "torch" not in results:
+        print("torch backend failed (see log above); nothing to compare against")
+        sys.exit(1)
+    reference = results["torch"]
+    ref_chunks, ref_questions = unit(reference["chunks"]), unit(reference["questions"])
+    ref_top = np.argsort(-(ref_questions @ ref_chunks.T), axis=1)[:, :5]
+
+    failed = False
+    for name, _, quantized in BACKENDS:
+        if name not in results:
+            print(f"{name:<11}  failed (see log above)")
+            failed = failed or name != "onnx-int8"
+            continue
+        r = results[name]
+        cosines = np.concatenate([
+            np.sum(unit(r["chunks"]) * ref_chunks, axis=1),
+            np.sum(unit(r["questions"]) * ref_questions, axis=1),
+        ])
+        top = np.argsort(-(unit(r["questions"]) @ ref_chunks.T), axis=1)[:, :5]
+        overlap = np.mean([len(set(a) & set(b)) / 5 for a, b in zip(top, ref_top)])
+        tolerance = args.int8_tolerance if quantized else args.tolerance
+        ok = cosines.min() >= tolerance
+        failed = failed or not ok
+        print(f"{name:<11}{r['load']:>8.2f}{r['rss_mb']:>8.0f}{r['p50']:>8.2f}{r['p95']:>8.2f}"
+              f"{r['chunks_per_sec']:>10.0f}{cosines.min():>9.4f}{cosines.mean():>10.4f}{overlap:>14.2f}"
+              f"{'' if ok else '  BELOW TOLERANCE'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
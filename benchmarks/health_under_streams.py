@@ -0,0 +1,165 @@
+"""
+Concurrency check: /health latency while many chat streams are open.
+
+Starts the real FastAPI app in a child process on a scratch SQLite database
+(so the load generator does not share its GIL) with the fake LLM backend
+(LLM_BACKEND=fake) streaming --chunks chunks --chunk-delay seconds apart the
+way a slow Gemini stream does, opens N concurrent /api/chat/stream requests
+and samples /health throughout.
+
+Exits non-zero if p99 /health latency under load is not "flat", i.e. exceeds
+both FLAT_FACTOR x the idle p99 and idle p99 + FLAT_SLACK_MS.
+
+Usage:
+    python benchmarks/health_under_streams.py [--streams 50] [--chunks 40] [--chunk-delay 0.05]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+FLAT_FACTOR = 3.0
+FLAT_SLACK_MS = 50.0
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples_ms):
+    return {
+        "count": len(samples_ms),
+        "p50_ms": round(percentile(samples_ms, 50), 2),
+        "p99_ms": round(percentile(samples_ms, 99), 2),
+        "max_ms": round(max(samples_ms), 2),
+        "mean_ms": round(statistics.mean(samples_ms), 2),
+    }
+
+
+async def sample_health(client, samples, stop: asyncio.Event, interval: float):
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get("/health")
+        samples.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200
+        await asyncio.sleep(interval)
+
+
+async def open_stream(client, user_id: int, index: int):
+    payload = {"user_id": str(user_id), "message": f"How should I start investing? ({index})"}
+    frames = 0
+    async with client.stream("POST", "/api/chat/stream", json=payload) as response:
+        async for line in response.aiter_lines():
+            if line.startswith("data:"):
+                frames += 1
+    return frames
+
+
+async def run(base_url: str, user_id: int, args):
+    import httpx
+
+    timeout = httpx.Timeout(120.0)
+    limits = httpx.Limits(max_connections=args.streams + 10)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        # Idle baseline
+        idle, stop = [], asyncio.Event()
+        sampler = asyncio.create_task(sample_health(client, idle, stop, args.interval))
+        await asyncio.sleep(args.baseline_seconds)
+        stop.set()
+        await sampler
+
+        # Under load
+        loaded, stop = [], asyncio.Event()
+        sampler = asyncio.create_task(sample_health(client, loaded, stop, args.interval))
+        streams_started = time.perf_counter()
+        frames = await asyncio.gather(*(open_stream(client, user_id, i) for i in range(args.streams)))
+        streams_elapsed = time.perf_counter() - streams_started
+        stop.set()
+        await sampler
+
+    return idle, loaded, frames, streams_elapsed
+
+
+def serve(args, db_path: str, ready, user_id):
+    """Child process: run the app with a slow fake Gemini stream"""
+    os.environ["DATABASE_PATH"] = db_path
+    os.environ.update({
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_TOKENS": str(args.chunks),
+        "FAKE_LLM_CHUNK_TOKENS": "1",
+        "FAKE_LLM_FIRST_TOKEN_MS": str(args.chunk_delay * 1000),
+        "FAKE_LLM_TOKEN_MS": str(args.chunk_delay * 1000),
+        "FAKE_LLM_JITTER": "0",
+    })
+
+    import uvicorn
+    import main as app_module
+
+    user_id.value = app_module.db.create_user("Bench User", "bench@example.com")
+
+    config = uvicorn.Config(app_module.app, host="127.0.0.1", port=args.port, log_level="warning")
+    server = uvicorn.Server(config)
+    original_startup = server.startup
+
+    async def startup(sockets=None):
+        await original_startup(sockets=sockets)
+        ready.set()
+
+    server.startup = startup
+    server.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=50)
+    parser.add_argument("--chunks", type=int, default=40, help="chunks per simulated Gemini stream")
+    parser.add_argument("--chunk-delay", type=float, default=0.05, help="seconds between chunks")
+    parser.add_argument("--interval", type=float, default=0.01, help="seconds between /health probes")
+    parser.add_argument("--baseline-seconds", type=float, default=2.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="health_bench_")
+    ready = multiprocessing.Event()
+    user_id = multiprocessing.Value("i", 0)
+    server = multiprocessing.Process(
+        target=serve, args=(args, os.path.join(scratch, "chatbot.db"), ready, user_id), daemon=True
+    )
+    server.start()
+    if not ready.wait(timeout=300):
+        server.terminate()
+        sys.exit("server did not start")
+
+    try:
+        idle, loaded, frames, streams_elapsed = asyncio.run(
+            run(f"http://127.0.0.1:{args.port}", user_id.value, args)
+        )
+    finally:
+        server.terminate()
+        server.join(timeout=10)
+
+    idle_stats, loaded_stats = summarize(idle), summarize(loaded)
+    print(f"streams: {args.streams} x {args.chunks} chunks @ {args.chunk_delay * 1000:.0f}ms "
+          f"-> completed in {streams_elapsed:.2f}s, frames/stream min={min(frames)} max={max(frames)}")
+    print(f"/health idle:       {idle_stats}")
+    print(f"/health under load: {loaded_stats}")
+
+    limit = max(idle_stats["p99_ms"] * FLAT_FACTOR, idle_stats["p99_ms"] + FLAT_SLACK_MS)
+    if loaded_stats["p99_ms"] > limit:
+        print(f"FAIL: p99 under load {loaded_stats['p99_ms']}ms exceeds {limit:.2f}ms")
+        sys.exit(1)
+    print(f"OK: p99 under load within {limit:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark: dense-only vs. hybrid (BM25 + dense, reciprocal-rank fusion) retrieval.
+
+Ingests the knowledge base into a scratch vector store, then:
+
+1. BM25 index: build time, size on disk, memory-mapped load time and
+   per-query latency.
+2. Retrieval: per-query latency and file-level recall@k for dense-only
+   (HYBRID_SEARCH off) and hybrid search on QUERIES, exact-term questions
+   each labelled with the documents that contain the answer.
+
+Needs chromadb and sentence-transformers.
+
+Usage:
+    python benchmarks/hybrid_search.py [--k 3] [--repeats 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from document_processor import DocumentProcessor  # noqa: E402
+from ingestion import IngestionManifest, sync_knowledge_base  # noqa: E402
+from lexical_index import INDEX_DIR, BM25Index  # noqa: E402
+from vector_store import VectorStore  # noqa: E402
+
+RETIREMENT = "Best Advice for Beginners Saving for Retirement.pdf"
+DIFFERENCES = "Main Differences Between a 401(k) and an IRA.pdf"
+MATCHING = "Matching Investment and Savings Solutions to Inves.pdf"
+
+# (question, files that answer it)
+QUERIES = [
+    ("What is a 403(b)?", {RETIREMENT}),
+    ("SEP IRA vs SIMPLE IRA", {RETIREMENT}),
+    ("Roth 401(k) rules", {RETIREMENT, DIFFERENCES, MATCHING}),
+    ("catch-up contributions", {RETIREMENT}),
+    ("domestic violence hotline 1-800 number", {"Domestic Abuse.docx"}),
+    ("restraining order", {"Domestic Abuse.docx"}),
+    ("W-2 form", {"2025 Taxes I.docx"}),
+    ("IRS Form 1040", {"2025 Taxes I.docx"}),
+    ("FAFSA", {"SAT and college free.docx"}),
+    ("Khan Academy SAT prep", {"SAT and college free.docx"}),
+    ("ETF or index fund", {"Best Advice for Beginners Interested in Investing.pdf"}),
+    ("phishing emails", {"Cyber Crime 1.docx", "Cyber Crime 2.docx"}),
+    ("ATS resume keywords", {"Best Tips and Tricks for Creating an ATS-Friendly.pdf"}),
+]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def bench_bm25(store: VectorStore, repeats: int):
+    results = store.collection.get(include=["documents"])
+    start = time.perf_counter()
+    index = BM25Index.build(results["ids"], results["documents"])
+    build = time.perf_counter() - start
+    index.save(str(store.db_path))
+    size = sum(f.stat().st_size for f in (Path(store.db_path) / INDEX_DIR).rglob("*") if f.is_file())
+
+    start = time.perf_counter()
+    index = BM25Index.load(str(store.db_path))
+    load = time.perf_counter() - start
+
+    latencies = []
+    for _ in range(repeats):
+        for query, _ in QUERIES:
+            start = time.perf_counter()
+            index.search(query, Config.HYBRID_CANDIDATES)
+            latencies.append((time.perf_counter() - start) * 1e6)
+    print(f"BM25: {len(results['ids'])} chunks, {len(index.vocabulary)} terms, {size / 1024:.0f} KiB on disk")
+    print(f"  build {build * 1e3:.1f} ms, mmap load {load * 1e3:.2f} ms, "
+          f"query p50 {percentile(latencies, 0.5):.0f} us / p95 {percentile(latencies, 0.95):.0f} us")
+
+
+def bench_retrieval(store: VectorStore, k: int, repeats: int):
+    print(f"\n{'mode':<8}{'recall@' + str(k):>10}{'p50 ms':>9}{'p95 ms':>9}")
+    for mode, hybrid in (("dense", False), ("hybrid", True)):
+        Config.HYBRID_SEARCH = hybrid
+        hits = 0
+        for query, expected in QUERIES:
+            docs = store.search(query, n_results=k)
+            hits += any(doc["metadata"].get("filename") in expected for doc in docs)
+
+        latencies = []
+        for _ in range(repeats):
+            for query, _ in QUERIES:
+                start = time.perf_counter()
+                store.search(query, n_results=k)
+                latencies.append((time.perf_counter() - start) * 1e3)
+        print(f"{mode:<8}{hits / len(QUERIES):>10.2f}{percentile(latencies, 0.5):>9.2f}"
+              f"{percentile(latencies, 0.95):>9.2f}")
+        if mode == "hybrid":
+            print(f"  mean {statistics.mean(latencies):.2f} ms (query embeddings are cached after the first pass)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=Config.KNOWLEDGE_BASE_PATH)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    db_path = tempfile.mkdtemp(prefix="hybrid_bench_")
+    store = VectorStore(db_path=db_path, embedding_model=Config.EMBEDDING_MODEL)
+    sync_knowledge_base(DocumentProcessor(args.corpus), store, IngestionManifest.load(db_path))
+
+    bench_bm25(store, args.repeats)
+    bench_retrieval(store, args.k, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark: incremental knowledge-base ingestion.
+
+Copies the knowledge base to a scratch directory, ingests it into a scratch
+vector store, then times re-runs of sync_knowledge_base for:
+
+- "unchanged": nothing touched (should be close to a no-op)
+- "touched":   every file's mtime bumped, content identical (hash only)
+- "corrupted": one file overwritten with bytes its parser rejects; it must
+               count as failed and keep its chunks (exits non-zero if not),
+               then the original is restored
+- "edited":    one file replaced by different content
+- "removed":   one file deleted
+- "rechunk-failed" / "rechunk-retry": chunk size changed while one file
+               fails to parse; after restoring its bytes and mtime, the next
+               run must re-chunk it (exits non-zero if it is skipped)
+
+Usage:
+    python benchmarks/incremental_ingest.py [--corpus DATABSE] [--runs 3]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from document_processor import DocumentProcessor  # noqa: E402
+from ingestion import IngestionManifest, sync_knowledge_base  # noqa: E402
+from vector_store import VectorStore  # noqa: E402
+
+
+def run_sync(corpus: str, db_path: str, vector_store: VectorStore, **processor_options):
+    manifest = IngestionManifest.load(db_path)
+    return sync_knowledge_base(DocumentProcessor(corpus, **processor_options), vector_store, manifest)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=Config.KNOWLEDGE_BASE_PATH)
+    parser.add_argument("--runs", type=int, default=3, help="repeats of the unchanged re-run")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="ingest_bench_")
+    corpus = os.path.join(scratch, "kb")
+    db_path = os.path.join(scratch, "vector_db")
+    shutil.copytree(args.corpus, corpus)
+    vector_store = VectorStore(db_path=db_path, embedding_model=Config.EMBEDDING_MODEL)
+
+    rows = [("initial", run_sync(corpus, db_path, vector_store))]
+    for _ in range(args.runs):
+        rows.append(("unchanged", run_sync(corpus, db_path, vector_store)))
+
+    files = sorted(DocumentProcessor(corpus).list_documents())
+    now = time.time()
+    for path in files:
+        os.utime(path, (now + 10, now + 10))
+    rows.append(("touched", run_sync(corpus, db_path, vector_store)))
+
+    failures = []
+    if files:
+        victim = files[0]
+        original = victim.read_bytes()
+        chunks_before = vector_store.get_collection_info()["document_count"]
+        entry_before = IngestionManifest.load(db_path).files.get(victim.name)
+        victim.write_bytes(b"not a " + victim.suffix.encode() + b" file" * 100)
+        stats = run_sync(corpus, db_path, vector_store)
+        rows.append(("corrupted", stats))
+        if stats["failed"] != 1 or stats["chunks_deleted"]:
+            failures.append(f"corrupted {victim.name}: failed={stats['failed']}, deleted={stats['chunks_deleted']}")
+        if vector_store.get_collection_info()["document_count"] != chunks_before:
+            failures.append(f"corrupted {victim.name}: chunk count changed")
+        entry_after = dict(IngestionManifest.load(db_path).files.get(victim.name) or {})
+        if not entry_after.pop("stale", False) or entry_after != entry_before:
+            failures.append(f"corrupted {victim.name}: manifest entry changed or not marked stale")
+        victim.write_bytes(original)
+        os.utime(victim, (now + 20, now + 20))
+        rows.append(("restored", run_sync(corpus, db_path, vector_store)))
+
+    if len(files) >= 2:
+        # Same extension keeps the file extractable; different bytes force a re-embed
+        pair = next(
+            ((target, donor) for target in files for donor in files
+             if target != donor and target.suffix == donor.suffix),
+            None
+        )
+        if pair is not None:
+            shutil.copyfile(pair[1], pair[0])
+            rows.append(("edited", run_sync(corpus, db_path, vector_store)))
+        os.remove(files[-1])
+        rows.append(("removed", run_sync(corpus, db_path, vector_store)))
+
+    if files:
+        victim = files[0]
+        original = victim.read_bytes()
+        victim_stat = victim.stat()
+        victim.write_bytes(b"not a " + victim.suffix.encode() + b" file" * 100)
+        rows.append(("rechunk-failed", run_sync(corpus, db_path, vector_store, chunk_size=400)))
+        # Same bytes, size and mtime as the manifest entry: only the stale mark forces the retry
+        victim.write_bytes(original)
+        os.utime(victim, ns=(victim_stat.st_atime_ns, victim_stat.st_mtime_ns))
+        stats = run_sync(corpus, db_path, vector_store, chunk_size=400)
+        rows.append(("rechunk-retry", stats))
+        if stats["updated"] != 1 or stats["failed"]:
+            failures.append(f"rechunk of {victim.name} not retried: updated={stats['updated']}, failed={stats['failed']}")
+
+    print(f"corpus: {args.corpus} ({len(files)} files), chunks in store: {vector_store.get_collection_info()['document_count']}")
+    print(f"{'run':<16}{'seconds':>10}{'added':>8}{'updated':>9}{'unchanged':>11}{'removed':>9}{'failed':>8}"
+          f"{'upserted':>10}{'deleted':>9}")
+    for label, s in rows:
+        print(f"{label:<16}{s['seconds']:>10.3f}{s['added']:>8}{s['updated']:>9}{s['unchanged']:>11}"
+              f"{s['removed']:>9}{s['failed']:>8}{s['chunks_upserted']:>10}{s['chunks_deleted']:>9}")
+    shutil.rmtree(scratch, ignore_errors=True)
+    if failures:
+        sys.exit("FAIL: " + "; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
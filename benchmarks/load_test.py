@@ -0,0 +1,466 @@
+"""
+Load test: concurrent multi-turn chats against /api/chat and /api/chat/stream.
+
+Starts the real FastAPI app under uvicorn in a child process with a real
+Database and VectorStore in a scratch directory (the vector store is seeded
+with a small finance corpus unless --vector-db-path points at an ingested
+index), the fake LLM backend (LLM_BACKEND=fake, latencies set by the
+--llm-* options) and a stub web search with a fixed delay. Simulated users
+then hold multi-turn conversations: each turn waits for the previous answer
+plus a think time, so --users is the number of concurrent chats.
+
+Reports throughput, time to first token (first non-empty stream frame),
+p50/p95/p99 latency per endpoint, error rate, the worker's RSS and the
+server's own /api/stats counters as JSON on stdout (a readable summary goes
+to stderr). Results carry the git commit; --compare prints the change of the
+headline numbers against an earlier result file, and --max-regression makes
+the run fail when any of them got worse by more than that percentage.
+
+Usage:
+    python benchmarks/load_test.py [--users 50] [--conversations 2] [--turns 4] [--mode mixed]
+                                   [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+STREAM = "/api/chat/stream"
+CHAT = "/api/chat"
+# Start of the reply the server sends (with status 200) when generation fails
+ERROR_REPLY = "I apologize, but I encountered an error"
+
+# Multi-turn scripts; a user works through one per conversation (up to --turns)
+CONVERSATIONS = [
+    ["How do I start building an emergency fund?",
+     "How many months of expenses should it cover?",
+     "Should I keep it in a high-yield savings account?",
+     "What if I have credit card debt at the same time?",
+     "Can you summarize the order I should do these in?"],
+    ["What is the difference between a 401k and an IRA?",
+     "My employer matches 4%. How much should I contribute?",
+     "Is a Roth IRA better for someone early in their career?",
+     "What happens to my 401k if I change jobs?",
+     "How do I roll it over?"],
+    ["I want to pay off my student loans faster. Where do I start?",
+     "Should I use the avalanche or the snowball method?",
+     "Is refinancing my student loans a good idea?",
+     "How does paying extra affect the interest I pay?"],
+    ["How do I create a monthly budget?",
+     "What is the 50/30/20 rule?",
+     "How should I budget with an irregular freelance income?",
+     "Which expenses are the easiest to cut?",
+     "How often should I review my budget?"],
+    ["How can I improve my credit score?",
+     "How long do late payments stay on my credit report?",
+     "Should I close old credit cards I no longer use?",
+     "What credit utilization should I aim for?"],
+    ["I'm going through a divorce. How do I protect my finances?",
+     "How do I open accounts in my own name?",
+     "What should I know about splitting retirement accounts?",
+     "How do I rebuild my budget on a single income?"],
+]
+
+# Seed corpus for a scratch vector store
+CORPUS = [
+    ("emergency_fund.txt",
+     "An emergency fund covers three to six months of essential expenses such as rent, food, utilities and "
+     "insurance. Keep it in a liquid, insured account like a high-yield savings account. Build it gradually "
+     "with automatic transfers on payday, and refill it after you use it."),
+    ("retirement_accounts.txt",
+     "A 401k is an employer-sponsored retirement plan; contributions are made from your paycheck and many "
+     "employers match part of them. An IRA is an individual retirement account you open yourself. Roth "
+     "accounts are funded with after-tax money and grow tax-free; traditional accounts defer taxes until "
+     "withdrawal. When changing jobs, a 401k can be rolled over into an IRA or the new employer's plan."),
+    ("debt_repayment.txt",
+     "The avalanche method pays extra toward the debt with the highest interest rate first and minimizes "
+     "total interest. The snowball method pays the smallest balance first for quicker wins. Refinancing "
+     "student loans can lower the rate but may give up federal protections such as income-driven repayment."),
+    ("budgeting.txt",
+     "The 50/30/20 rule splits after-tax income into 50% needs, 30% wants and 20% savings and debt "
+     "repayment. With irregular income, budget from your lowest typical month and save the surplus from "
+     "good months. Review your budget monthly and after any major life change."),
+    ("credit_scores.txt",
+     "Payment history and credit utilization are the largest factors in a credit score. Keep utilization "
+     "below 30% of your limits, ideally below 10%. Late payments stay on a credit report for seven years. "
+     "Closing old cards shortens your credit history and raises utilization."),
+    ("life_transitions.txt",
+     "During a divorce, open checking, savings and credit accounts in your own name, gather statements for "
+     "all joint accounts and request your credit report. Retirement accounts are divided with a qualified "
+     "domestic relations order. Rebuild your budget around a single income and update your beneficiaries."),
+]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples_ms):
+    if not samples_ms:
+        return None
+    return {
+        "count": len(samples_ms),
+        "mean_ms": round(statistics.mean(samples_ms), 2),
+        "p50_ms": round(percentile(samples_ms, 50), 2),
+        "p95_ms": round(percentile(samples_ms, 95), 2),
+        "p99_ms": round(percentile(samples_ms, 99), 2),
+        "max_ms": round(max(samples_ms), 2),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_mb(pid: int):
+    """Resident set size of `pid` in MB, or None where /proc is not available"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def serve(args, scratch: str, ready, user_ids):
+    """Child process: the app with the fake LLM backend, a stub web search and a scratch database"""
+    os.environ.update({
+        "DATABASE_PATH": os.path.join(scratch, "chatbot.db"),
+        "VECTOR_DB_PATH": args.vector_db_path or os.path.join(scratch, "vector_db"),
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_FIRST_TOKEN_MS": str(args.llm_first_token_ms),
+        "FAKE_LLM_TOKEN_MS": str(args.llm_token_ms),
+        "FAKE_LLM_TOKENS": str(args.llm_tokens),
+        "FAKE_LLM_FAILURE_RATE": str(args.llm_failure_rate),
+        "FAKE_LLM_SEED": str(args.seed),
+        "ANSWER_CACHE_ENABLED": "true" if args.answer_cache else "false",
+        "WARMUP_ON_STARTUP": "false",
+    })
+
+    import logging
+    import uvicorn
+    import main as app_module
+    from web_search import WebSearchService
+
+    class StubWebSearch(WebSearchService):
+        """Canned results after a fixed delay instead of a Google request"""
+
+        def search(self, query, num_results=5):
+            time.sleep(args.web_search_ms / 1000)
+            return [{"title": f"Result {i} for {query[:40]}", "snippet": "Current rates and guidance.",
+                     "url": f"https://example.com/{i}"} for i in range(num_results)]
+
+    app_module.services.register("web_search", StubWebSearch)
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    # Build the heavy components up front so the first requests do not pay for it
+    vector_store = app_module.services.get("vector_store")
+    if not args.vector_db_path:
+        vector_store.add_documents([{"filename": name, "content": text} for name, text in CORPUS])
+    app_module.services.get("rag_system")
+    for i in range(len(user_ids)):
+        user_ids[i] = app_module.db.create_user(f"Load User {i}", f"load{i}@example.com")
+
+    config = uvicorn.Config(app_module.app, host="127.0.0.1", port=args.port, log_level="warning")
+    server = uvicorn.Server(config)
+    original_startup = server.startup
+
+    async def startup(sockets=None):
+        await original_startup(sockets=sockets)
+        ready.set()
+
+    server.startup = startup
+    server.run()
+
+
+async def chat_turn(client, endpoint: str, user_id: int, conversation_id, message: str):
+    """One request; returns (record, conversation_id)"""
+    payload = {"user_id": str(user_id), "conversation_id": conversation_id, "message": message}
+    record = {"endpoint": endpoint, "error": None, "ttft_ms": None, "chars": 0}
+    start = time.perf_counter()
+    try:
+        if endpoint == CHAT:
+            response = await client.post(endpoint, json=payload)
+            if response.status_code != 200:
+                record["error"] = f"http_{response.status_code}"
+            else:
+                body = response.json()
+                text = body.get("response") or ""
+                record["chars"] = len(text)
+                if text.startswith(ERROR_REPLY):
+                    record["error"] = "error_reply"
+                conversation_id = body.get("conversation_id", conversation_id)
+        else:
+            done = False
+            async with client.stream("POST", endpoint, json=payload) as response:
+                if response.status_code != 200:
+                    record["error"] = f"http_{response.status_code}"
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    event = json.loads(line[5:])
+                    if event.get("chunk"):
+                        if record["ttft_ms"] is None:
+                            record["ttft_ms"] = (time.perf_counter() - start) * 1000
+                            if event["chunk"].startswith(ERROR_REPLY):
+                                record["error"] = "error_reply"
+                        record["chars"] += len(event["chunk"])
+                    if event.get("error"):
+                        record["error"] = "stream_error"
+                    if event.get("done"):
+                        done = True
+                        conversation_id = event.get("conversation_id", conversation_id)
+            if record["error"] is None and not done:
+                record["error"] = "incomplete_stream"
+    except Exception as e:
+        record["error"] = type(e).__name__
+    record["latency_ms"] = (time.perf_counter() - start) * 1000
+    return record, conversation_id
+
+
+async def simulate_user(client, index: int, user_id: int, args, records):
+    rng = random.Random(args.seed * 100003 + index)
+    await asyncio.sleep(rng.uniform(0, args.ramp_up))
+    for _ in range(args.conversations):
+        conversation_id = None
+        script = rng.choice(CONVERSATIONS)
+        for message in script[:args.turns]:
+            if args.mode == "mixed":
+                endpoint = STREAM if rng.random() < args.stream_share else CHAT
+            else:
+                endpoint = STREAM if args.mode == "stream" else CHAT
+            record, conversation_id = await chat_turn(client, endpoint, user_id, conversation_id, message)
+            records.append(record)
+            if args.think_time:
+                await asyncio.sleep(rng.expovariate(1 / args.think_time))
+
+
+async def sample_rss(pid: int, samples, stop: asyncio.Event, interval: float = 0.1):
+    while not stop.is_set():
+        value = rss_mb(pid)
+        if value is not None:
+            samples.append(value)
+        await asyncio.sleep(interval)
+
+
+async def run(base_url: str, pid: int, user_ids, args):
+    import httpx
+
+    timeout = httpx.Timeout(args.request_timeout)
+    limits = httpx.Limits(max_connections=args.users + 10, max_keepalive_connections=args.users + 10)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        # Warm-up turn per endpoint (first-request costs are not what is being measured)
+        for endpoint in (CHAT, STREAM):
+            await chat_turn(client, endpoint, user_ids[0], None, "How do I start saving?")
+        rss_start = rss_mb(pid)
+
+        records, rss, stop = [], [], asyncio.Event()
+        sampler = asyncio.create_task(sample_rss(pid, rss, stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(simulate_user(client, i, user_id, args, records)
+                               for i, user_id in enumerate(user_ids)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await sampler
+
+        server_stats = (await client.get("/api/stats")).json()
+    return records, elapsed, {"start": rss_start, "peak": max(rss, default=None), "end": rss_mb(pid)}, server_stats
+
+
+def build_report(args, records, elapsed, rss, server_stats):
+    ok = [record for record in records if record["error"] is None]
+    errors_by_type = {}
+    for record in records:
+        if record["error"]:
+            errors_by_type[record["error"]] = errors_by_type.get(record["error"], 0) + 1
+
+    endpoints = {}
+    for endpoint in (CHAT, STREAM):
+        all_requests = [record for record in records if record["endpoint"] == endpoint]
+        if not all_requests:
+            continue
+        done = [record for record in all_requests if record["error"] is None]
+        endpoints[endpoint] = {
+            "requests": len(all_requests),
+            "errors": len(all_requests) - len(done),
+            "latency": summarize([record["latency_ms"] for record in done]),
+            "ttft": summarize([record["ttft_ms"] for record in done if record["ttft_ms"] is not None]),
+        }
+
+    llm = server_stats.get("llm") or {}
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("output", "compare", "max_regression", "verbose", "port")},
+        "duration_s": round(elapsed, 3),
+        "requests": len(records),
+        "errors": len(records) - len(ok),
+        "error_rate": round((len(records) - len(ok)) / max(1, len(records)), 4),
+        "errors_by_type": errors_by_type,
+        "throughput": {
+            "requests_per_s": round(len(ok) / elapsed, 2),
+            "chars_per_s": round(sum(record["chars"] for record in ok) / elapsed, 1),
+        },
+        "latency": summarize([record["latency_ms"] for record in ok]),
+        "ttft": summarize([record["ttft_ms"] for record in ok if record["ttft_ms"] is not None]),
+        "endpoints": endpoints,
+        # LLM calls that failed after retries (chat replies and background summaries)
+        "llm_failures": llm.get("failures"),
+        "rss_mb": rss,
+        "server_stats": {key: server_stats.get(key)
+                         for key in ("llm", "prompt_tokens", "summaries", "answer_cache", "executors")},
+    }
+
+
+# Headline numbers for --compare: (label, path, True if higher is better)
+HEADLINE = [
+    ("requests/s", ("throughput", "requests_per_s"), True),
+    ("latency p50 ms", ("latency", "p50_ms"), False),
+    ("latency p95 ms", ("latency", "p95_ms"), False),
+    ("latency p99 ms", ("latency", "p99_ms"), False),
+    ("ttft p50 ms", ("ttft", "p50_ms"), False),
+    ("ttft p99 ms", ("ttft", "p99_ms"), False),
+    ("error rate", ("error_rate",), False),
+    ("peak RSS MB", ("rss_mb", "peak"), False),
+]
+
+
+def lookup(report, path):
+    value = report
+    for key in path:
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def compare(baseline, report, max_regression):
+    """Print the headline changes; returns the metrics that regressed by more than `max_regression` percent"""
+    print(f"\nvs {baseline.get('commit')} ({baseline.get('timestamp')})", file=sys.stderr)
+    print(f"{'metric':<16}{'baseline':>12}{'current':>12}{'change':>10}", file=sys.stderr)
+    regressions = []
+    for label, path, higher_is_better in HEADLINE:
+        before, after = lookup(baseline, path), lookup(report, path)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before * 100 if before else 0.0
+        print(f"{label:<16}{before:>12}{after:>12}{change:>+9.1f}%", file=sys.stderr)
+        worse = -change if higher_is_better else change
+        if max_regression is not None and worse > max_regression:
+            regressions.append(label)
+    return regressions
+
+
+def print_summary(report):
+    def line(name, stats):
+        if stats:
+            return (f"{name:<22} p50 {stats['p50_ms']:>8.1f}  p95 {stats['p95_ms']:>8.1f}  "
+                    f"p99 {stats['p99_ms']:>8.1f}  max {stats['max_ms']:>8.1f} ms")
+        return f"{name:<22} -"
+
+    config = report["config"]
+    print(f"{config['users']} users x {config['conversations']} conversations x {config['turns']} turns "
+          f"({config['mode']}) in {report['duration_s']:.1f}s: {report['requests']} requests, "
+          f"{report['throughput']['requests_per_s']} req/s, error rate {report['error_rate']:.2%} "
+          f"{report['errors_by_type'] or ''}", file=sys.stderr)
+    print(line("latency", report["latency"]), file=sys.stderr)
+    print(line("ttft (stream)", report["ttft"]), file=sys.stderr)
+    for endpoint, stats in report["endpoints"].items():
+        print(line(f"latency {endpoint}", stats["latency"]), file=sys.stderr)
+    print(f"worker RSS MB: {report['rss_mb']}, LLM failures: {report['llm_failures']}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50, help="concurrent simulated users")
+    parser.add_argument("--conversations", type=int, default=2, help="conversations per user")
+    parser.add_argument("--turns", type=int, default=4, help="turns per conversation")
+    parser.add_argument("--mode", choices=("stream", "chat", "mixed"), default="mixed")
+    parser.add_argument("--stream-share", type=float, default=0.8, help="share of streamed turns in mixed mode")
+    parser.add_argument("--think-time", type=float, default=0.5, help="mean seconds between turns (0 = none)")
+    parser.add_argument("--ramp-up", type=float, default=2.0, help="seconds over which users start")
+    parser.add_argument("--llm-first-token-ms", type=float, default=400)
+    parser.add_argument("--llm-token-ms", type=float, default=15)
+    parser.add_argument("--llm-tokens", type=int, default=200)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--web-search-ms", type=float, default=300)
+    parser.add_argument("--answer-cache", action="store_true", help="keep the semantic answer cache on")
+    parser.add_argument("--vector-db-path", help="use an ingested index instead of the seeded scratch one")
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=0, help="default: a free port")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    parser.add_argument("--max-regression", type=float,
+                        help="with --compare: exit 1 if a headline metric is this many percent worse")
+    parser.add_argument("--verbose", action="store_true", help="keep the server's INFO logs")
+    args = parser.parse_args()
+    args.port = args.port or free_port()
+
+    scratch = tempfile.mkdtemp(prefix="load_test_")
+    ready = multiprocessing.Event()
+    user_ids = multiprocessing.Array("i", args.users)
+    server = multiprocessing.Process(target=serve, args=(args, scratch, ready, user_ids), daemon=True)
+    server.start()
+    if not ready.wait(timeout=300):
+        server.terminate()
+        sys.exit("server did not start")
+
+    try:
+        records, elapsed, rss, server_stats = asyncio.run(
+            run(f"http://127.0.0.1:{args.port}", server.pid, list(user_ids), args)
+        )
+    finally:
+        server.terminate()
+        server.join(timeout=10)
+
+    report = build_report(args, records, elapsed, rss, server_stats)
+    print_summary(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.max_regression)
+        if regressions:
+            print(f"FAIL: regressed by more than {args.max_regression}%: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
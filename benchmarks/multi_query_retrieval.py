@@ -0,0 +1,99 @@
+"""
+Benchmark: sequential per-sub-question search vs. VectorStore.search_many.
+
+Ingests the knowledge base into a scratch vector store, then retrieves for
+COMPOUND messages split the way RAGSystem.preprocess_query splits them:
+
+- "first":      search(query_chunks[0]) only (the previous behaviour)
+- "sequential": one search() per sub-question, results concatenated
+- "batched":    search_many(sub-questions), one embedding batch and one
+                vector query
+
+Reports latency (query-embedding cache cleared before every call, so each
+call pays for its embeddings) and how many sub-questions get at least one
+chunk from their labelled file into the 5-source context.
+
+Needs chromadb and sentence-transformers.
+
+Usage:
+    python benchmarks/multi_query_retrieval.py [--repeats 10]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import vector_store  # noqa: E402
+from config import Config  # noqa: E402
+from document_processor import DocumentProcessor  # noqa: E402
+from ingestion import IngestionManifest, sync_knowledge_base  # noqa: E402
+from rag_system import RAGSystem  # noqa: E402
+
+# (compound message, file answering each sub-question in order)
+COMPOUND = [
+    ("What is the difference between a 401(k) and an IRA? How do I file my taxes for free?",
+     ["Main Differences Between a 401(k) and an IRA.pdf", "2025 Taxes I.docx"]),
+    ("How can I raise my credit score? What should I do if I am a victim of cybercrime?",
+     ["2025 Credit Score.xlsx", "Cyber Crime 2.docx"]),
+    ("How do I start investing with little money? How can I prepare for the SAT for free? "
+     "Where can I get help if my partner controls my finances?",
+     ["Best Advice for Beginners Interested in Investing.pdf", "SAT and college free.docx", "Domestic Abuse.docx"]),
+    ("How can I make my resume pass applicant tracking systems? When is the tax filing deadline?",
+     ["Best Tips and Tricks for Creating an ATS-Friendly.pdf", "2025 Taxes I.docx"]),
+]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def context_files(rag: RAGSystem, docs):
+    """Files of the docs build_context would put in the prompt"""
+    files = []
+    for block in rag.build_context(docs).split("\n---\n"):
+        if block.startswith("[Source"):
+            files.append(block.split(" from ", 1)[1].split("]:", 1)[0])
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=Config.KNOWLEDGE_BASE_PATH)
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    db_path = tempfile.mkdtemp(prefix="multi_query_bench_")
+    store = vector_store.VectorStore(db_path=db_path, embedding_model=Config.EMBEDDING_MODEL)
+    sync_knowledge_base(DocumentProcessor(args.corpus), store, IngestionManifest.load(db_path))
+    # Only the retrieval helpers are used, so skip the Gemini client setup
+    rag = RAGSystem.__new__(RAGSystem)
+
+    modes = {
+        "first": lambda subs: store.search(subs[0], n_results=7),
+        "sequential": lambda subs: [doc for sub in subs for doc in store.search(sub, n_results=7)],
+        "batched": lambda subs: store.search_many(subs, n_results=7),
+    }
+    total = sum(len(expected) for _, expected in COMPOUND)
+    print(f"{'mode':<12}{'covered':>10}{'p50 ms':>9}{'p95 ms':>9}")
+    for mode, retrieve in modes.items():
+        covered = 0
+        latencies = []
+        for message, expected in COMPOUND:
+            subs = rag.preprocess_query(message)[:RAGSystem.MAX_SUB_QUERIES]
+            files = context_files(rag, retrieve(subs))
+            covered += sum(name in files for name in expected)
+            for _ in range(args.repeats):
+                vector_store._query_embedding_cache.clear()
+                start = time.perf_counter()
+                retrieve(subs)
+                latencies.append((time.perf_counter() - start) * 1e3)
+        print(f"{mode:<12}{f'{covered}/{total}':>10}{percentile(latencies, 0.5):>9.2f}"
+              f"{percentile(latencies, 0.95):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
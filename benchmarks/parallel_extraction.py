@@ -0,0 +1,100 @@
+"""
+Benchmark: in-process vs. process-pool document extraction.
+
+Replicates the knowledge base into a scratch directory (--copies times) and
+extracts it with DocumentProcessor at each worker count, checking that the
+output is identical and in the same order. Then runs the pool against a file
+whose extractor hangs and one whose extractor raises: the hung worker must be
+killed at the per-file timeout, the raising file reported as "error: ..."
+(not "empty"), and the run must complete. A file with bytes its parser
+rejects is also put through DocumentProcessor in-process and on the pool.
+Exits non-zero if any status is wrong.
+
+Usage:
+    python benchmarks/parallel_extraction.py [--copies 4] [--workers 0,1,2,4] [--timeout 2]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from document_processor import DocumentProcessor  # noqa: E402
+from extraction_pool import extract_in_processes  # noqa: E402
+
+HANG_MARKER = "hang"
+RAISE_MARKER = "raise"
+
+
+def extract_or_hang(path: Path):
+    """Stand-in for pathological files: never returns, or raises like a parser on a corrupt file"""
+    if HANG_MARKER in path.name:
+        while True:
+            time.sleep(1)
+    if RAISE_MARKER in path.name:
+        raise ValueError("corrupt file")
+    return {"filename": path.name, "chunks": [{"text": "ok"}], "file_path": str(path)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=Config.KNOWLEDGE_BASE_PATH)
+    parser.add_argument("--copies", type=int, default=4, help="times the corpus is replicated")
+    parser.add_argument("--workers", default="0,1,2,4", help="comma-separated worker counts (0 = in-process)")
+    parser.add_argument("--timeout", type=float, default=2.0, help="per-file timeout for the hang check")
+    args = parser.parse_args()
+
+    scratch = Path(tempfile.mkdtemp(prefix="extract_bench_"))
+    for copy in range(args.copies):
+        for source in DocumentProcessor(args.corpus, workers=0).list_documents():
+            shutil.copyfile(source, scratch / f"{copy:02d}_{source.name}")
+
+    baseline = None
+    print(f"{'workers':>8}{'files':>7}{'seconds':>10}{'speedup':>9}{'slowest file':>40}")
+    for workers in [int(w) for w in args.workers.split(",")]:
+        processor = DocumentProcessor(str(scratch), workers=workers, timeout=600)
+        start = time.perf_counter()
+        documents = processor.process_files(processor.list_documents())
+        elapsed = time.perf_counter() - start
+        contents = [(d["filename"], [c["text"] for c in d["chunks"]]) if d else None for d in documents]
+        if baseline is None:
+            baseline = (contents, elapsed)
+        elif contents != baseline[0]:
+            print(f"  workers={workers}: output differs from the first run!")
+        slowest = max(processor.last_timings, key=lambda t: t["seconds"])
+        print(f"{workers:>8}{len(documents):>7}{elapsed:>10.2f}{baseline[1] / elapsed:>8.1f}x"
+              f"{slowest['filename'][:30]:>32} {slowest['seconds']:.2f}s")
+
+    failures = []
+    files = [scratch / "a.pdf", scratch / f"b_{HANG_MARKER}.pdf", scratch / f"c_{RAISE_MARKER}.pdf",
+             scratch / "d.pdf"]
+    expected = ["ok", "timeout", "error", "ok"]
+    start = time.perf_counter()
+    results, timings = extract_in_processes(extract_or_hang, files, workers=2, timeout=args.timeout)
+    print(f"\nfailure check (timeout {args.timeout}s): finished in {time.perf_counter() - start:.2f}s")
+    for timing, status in zip(timings, expected):
+        print(f"  {timing['filename']:<14}{timing['status']:<24}{timing['seconds']:.2f}s")
+        if not timing["status"].startswith(status):
+            failures.append(f"{timing['filename']}: {timing['status']} (expected {status})")
+
+    corrupt = scratch / "corrupt.pdf"
+    corrupt.write_bytes(b"not a pdf" * 100)
+    for workers in (0, 1):
+        processor = DocumentProcessor(str(scratch), workers=workers, timeout=args.timeout)
+        processor.process_files([corrupt])
+        status = processor.last_timings[0]["status"]
+        print(f"  {corrupt.name} (workers={workers}): {status}")
+        if not status.startswith("error"):
+            failures.append(f"{corrupt.name} with workers={workers}: {status} (expected error)")
+    shutil.rmtree(scratch, ignore_errors=True)
+    if failures:
+        sys.exit("FAIL: " + "; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Benchmark: float32 vs. float16 vs. int8-quantized NumPy vector index.
+
+Embeds the knowledge base once (replicated --copies times, with small
+perturbations, to model a bigger corpus), writes it with each VECTOR_DTYPE,
+then, in a fresh process per variant, opens the index and runs every query:
+
+- anon MB:   private memory added by opening and querying the index,
+             which every uvicorn worker pays separately (Linux RssAnon);
+             the index is written with the real chunk texts and metadata,
+             so this includes the chunk ids parsed from meta.json (texts
+             and metadata are memory-mapped, decoded per returned row)
+- file MB:   mapped index pages made resident (RssFile); these are clean,
+             shared page cache, not per-worker memory
+- scanned:   bytes of the matrix every query scans, i.e. the part of the
+             index that must stay hot (int8 rescoring only touches
+             candidate rows of the float32 file)
+- p50 ms:    single-query top-k latency
+- recall@k:  overlap with exact float32 top-k, for int8 with and without
+             rescoring (rescore_candidates = k means no rescoring)
+
+Queries are the knowledge-base questions below plus chunk embeddings nudged
+off their source point. Needs sentence-transformers.
+
+Usage:
+    python benchmarks/quantized_index.py [--copies 20] [--k 7] [--rescore 50]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from document_processor import DocumentProcessor  # noqa: E402
+from numpy_index import NumpyCollection, normalize_rows, top_k  # noqa: E402
+
+QUESTIONS = [
+    "What is the difference between a 401(k) and an IRA?",
+    "How should a beginner start saving for retirement?",
+    "How do I start investing with little money?",
+    "How can I raise my credit score quickly?",
+    "When is the tax filing deadline?",
+    "How do I protect myself from online scams?",
+    "Where can I get help if my partner controls my finances?",
+    "How can I prepare for the SAT for free?",
+    "How can I make my resume pass applicant tracking systems?",
+]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def resident_mb():
+    """(RssAnon, RssFile) of this process in MB"""
+    values = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("RssAnon", "RssFile"):
+                values[key] = int(rest.split()[0]) / 1024
+    return values["RssAnon"], values["RssFile"]
+
+
+def build(path: str, dtype: str, ids, texts, metadatas, embeddings):
+    collection = NumpyCollection(path, dtype=dtype)
+    collection.add(ids=ids, documents=texts, metadatas=metadatas, embeddings=embeddings)
+
+
+def measure(name: str, path: str, dtype: str, rescore: int, k: int, queries, results):
+    anon_before, file_before = resident_mb()
+    collection = NumpyCollection(path, dtype=dtype, rescore_candidates=rescore)
+    found = []
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        found.append(collection.query(query_embeddings=[query], n_results=k)["ids"][0])
+        latencies.append((time.perf_counter() - start) * 1e3)
+    snapshot = collection._snapshot
+    matrix = snapshot.embeddings if snapshot.codes is None else snapshot.codes
+    anon_after, file_after = resident_mb()
+    results[name] = {
+        "anon_mb": anon_after - anon_before,
+        "file_mb": file_after - file_before,
+        "scanned_mb": matrix.nbytes / 2 ** 20,
+        "p50": percentile(latencies, 0.5),
+        "found": found,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=Config.KNOWLEDGE_BASE_PATH)
+    parser.add_argument("--copies", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200, help="perturbed-chunk queries besides QUESTIONS")
+    parser.add_argument("--k", type=int, default=7)
+    parser.add_argument("--rescore", type=int, default=Config.VECTOR_RESCORE_CANDIDATES)
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+
+    documents = DocumentProcessor(args.corpus).process_all_documents()
+    chunks = [(doc["filename"], chunk) for doc in documents for chunk in doc["chunks"]]
+    texts = [chunk["text"] for _, chunk in chunks]
+    model = SentenceTransformer(Config.EMBEDDING_MODEL, device="cpu")
+    base = model.encode(texts, batch_size=64)
+    rng = np.random.default_rng(0)
+    embeddings = normalize_rows(np.concatenate(
+        [base] + [base + rng.normal(0, 0.01, base.shape) for _ in range(args.copies - 1)]
+    ))
+    ids = [f"chunk_{i}" for i in range(len(embeddings))]
+    # Same shape as VectorStore's metadata: filename, chunk index and source position
+    metadatas = [
+        {"filename": filename, "chunk_index": i, **{key: value for key, value in chunk.items() if key != "text"}}
+        for i, (filename, chunk) in enumerate(chunks)
+    ] * args.copies
+    picks = rng.choice(len(embeddings), size=args.queries)
+    queries = np.concatenate([
+        model.encode(QUESTIONS),
+        embeddings[picks] + rng.normal(0, 0.05, (args.queries, embeddings.shape[1])),
+    ]).astype(np.float32)
+    exact = normalize_rows(queries) @ embeddings.T
+    expected = [{ids[i] for i in top_k(row, args.k)} for row in exact]
+
+    variants = [
+        ("float32", "float32", args.k),
+        ("float16", "float16", args.k),
+        ("int8", "int8", args.k),
+        (f"int8+rescore{args.rescore}", "int8", args.rescore),
+    ]
+    paths = {}
+    context = multiprocessing.get_context("spawn")
+    results = context.Manager().dict()
+    for name, dtype, rescore in variants:
+        if dtype not in paths:
+            paths[dtype] = tempfile.mkdtemp(prefix=f"quantized_bench_{dtype}_")
+            child = context.Process(target=build,
+                                    args=(paths[dtype], dtype, ids, texts * args.copies, metadatas, embeddings))
+            child.start()
+            child.join()
+        child = context.Process(target=measure, args=(name, paths[dtype], dtype, rescore, args.k, queries, results))
+        child.start()
+        child.join()
+
+    print(f"{len(ids)} chunks x {embeddings.shape[1]} dims, {len(queries)} queries")
+    print(f"{'variant':<20}{'anon MB':>9}{'file MB':>9}{'scanned MB':>12}{'p50 ms':>8}"
+          f"{'recall@' + str(args.k):>10}{'delta':>8}")
+    baseline = None
+    for name, _, _ in variants:
+        if name not in results:
+            print(f"{name:<20}  failed (see log above)")
+            continue
+        r = results[name]
+        recall = np.mean([len(set(found) & want) / args.k for found, want in zip(r["found"], expected)])
+        baseline = recall if baseline is None else baseline
+        print(f"{name:<20}{r['anon_mb']:>9.1f}{r['file_mb']:>9.1f}{r['scanned_mb']:>12.1f}{r['p50']:>8.3f}"
+              f"{recall:>10.4f}{recall - baseline:>+8.4f}")
+
+
+if __name__ == "__main__":
+    main()
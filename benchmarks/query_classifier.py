@@ -0,0 +1,146 @@
+"""
+Benchmark: single-pass query classifier vs. the per-list keyword scans.
+
+1. Equivalence: the previous RAGSystem scans (detect_sensitive_content,
+   analyze_query_completeness, preprocess_query, reproduced below) and
+   QueryClassifier.classify must agree on every sample query.
+2. Latency: microseconds per query for the three scans vs. one classify().
+3. Scaling: a list of N synthetic keywords checked with `any(k in q ...)`
+   vs. the Aho-Corasick automaton, for growing N. The linear scan grows
+   with N; the automaton stays roughly flat (one pass over the query).
+
+Needs no models or network.
+
+Usage:
+    python benchmarks/query_classifier.py [--repeat 2000]
+"""
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from query_classifier import AhoCorasick, QueryClassifier  # noqa: E402
+
+SAMPLE_QUERIES = [
+    "How do I start saving for retirement?",
+    "What is an IRA",
+    "tell me about budgets",
+    "help with debt",
+    "I'm 35 and my income is $60k. Should I pay off my mortgage early? What about my 401k?",
+    "Can you compare stocks and bonds for a beginner",
+    "I feel like I want to die because of my debt",
+    "My partner threatens me when I ask about our savings",
+    "We are facing bankruptcy and I can't pay rent",
+    "hello",
+    "What's the weather like today?",
+    "How should a single mother plan her taxes? Where do I find a mutual fund? What insurance matters?",
+    "  Investment options for my current situation  ",
+    "Is domestic violence covered by any financial assistance programs?",
+    "budget",
+]
+
+
+def legacy_preprocess_query(query):
+    query = query.strip()
+    questions = re.split(r'[?]\s+', query)
+    questions = [q.strip() + '?' if not q.endswith('?') and q else q.strip()
+                 for q in questions if q.strip()]
+    if len(questions) == 1:
+        query_lower = query.lower()
+        financial_keywords = [
+            'investment', 'savings', 'retirement', 'budget', 'debt', 'credit',
+            'insurance', 'tax', 'mortgage', 'loan', 'income', 'expense',
+            'portfolio', '401k', 'ira', 'stocks', 'bonds', 'mutual fund'
+        ]
+        has_keywords = any(keyword in query_lower for keyword in financial_keywords)
+        if not has_keywords and len(query.split()) < 5:
+            return [query]
+    return questions if questions else [query]
+
+
+def legacy_analyze_query_completeness(query):
+    query_lower = query.lower()
+    vague_patterns = [r'^how\s+(do|can|should)', r'^what\s+is', r'^tell\s+me\s+about', r'^help\s+with']
+    is_vague = any(re.match(pattern, query_lower) for pattern in vague_patterns)
+    word_count = len(query.split())
+    needs_clarification = (is_vague and word_count < 5) or word_count < 3
+    context_indicators = ['my', 'i', 'me', 'specific', 'situation', 'current']
+    has_context = any(indicator in query_lower for indicator in context_indicators)
+    return {"needs_clarification": needs_clarification and not has_context,
+            "is_vague": is_vague, "has_context": has_context}
+
+
+def legacy_detect_sensitive_content(query):
+    query_lower = query.lower()
+    for sensitivity_type, keywords in (
+        ("DANGER", ['suicide', 'kill myself', 'end my life', 'want to die', 'harm myself']),
+        ("ABUSE", ['abuse', 'violence', 'beaten', 'hurt me', 'threaten']),
+        ("SENSITIVE", ['financial crisis', 'bankruptcy', 'losing everything', 'can\'t pay']),
+    ):
+        if any(keyword in query_lower for keyword in keywords):
+            return True, sensitivity_type
+    return False, ""
+
+
+def legacy_classify(query):
+    return (legacy_detect_sensitive_content(query), legacy_analyze_query_completeness(query),
+            legacy_preprocess_query(query))
+
+
+def new_classify(classifier, query):
+    c = classifier.classify(query)
+    return ((c.is_sensitive, c.sensitivity_type),
+            {"needs_clarification": c.needs_clarification, "is_vague": c.is_vague, "has_context": c.has_context},
+            list(c.sub_questions))
+
+
+def per_query_us(fn, queries, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            fn(query)
+    return (time.perf_counter() - start) / (repeat * len(queries)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    classifier = QueryClassifier.from_file(Config.QUERY_KEYWORDS_PATH)
+
+    mismatches = [q for q in SAMPLE_QUERIES if legacy_classify(q) != new_classify(classifier, q)]
+    print(f"equivalence: {len(SAMPLE_QUERIES) - len(mismatches)}/{len(SAMPLE_QUERIES)} queries agree")
+    for query in mismatches:
+        print(f"  MISMATCH {query!r}\n    legacy {legacy_classify(query)}\n    new    {new_classify(classifier, query)}")
+
+    legacy_us = per_query_us(legacy_classify, SAMPLE_QUERIES, args.repeat)
+    new_us = per_query_us(classifier.classify, SAMPLE_QUERIES, args.repeat)
+    print(f"\nper query: legacy scans {legacy_us:.1f} us, classify() {new_us:.1f} us")
+
+    rng = random.Random(0)
+    queries = [q.lower() for q in SAMPLE_QUERIES]
+    print(f"\n{'keywords':>9}{'build ms':>10}{'linear us':>11}{'automaton us':>14}")
+    for n in (10, 100, 1000, 5000):
+        terms = {"".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 12)))
+                 for _ in range(n)}
+        start = time.perf_counter()
+        automaton = AhoCorasick({term: [("term", term)] for term in terms})
+        build_ms = (time.perf_counter() - start) * 1e3
+        term_list = list(terms)
+        repeat = max(1, args.repeat // max(1, n // 10))
+        linear = per_query_us(lambda q: any(term in q for term in term_list), queries, repeat)
+        automaton_us = per_query_us(automaton.labels, queries, args.repeat)
+        print(f"{n:>9}{build_ms:>10.1f}{linear:>11.1f}{automaton_us:>14.1f}")
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark: SSE frames, bytes and CPU per streamed response.
+
+Compares the previous framing (one `data:` frame per upstream piece, with
+canned replies split into characters) against coalesce_chunks for:
+
+- escalation:  a ~300-character canned reply
+- gemini:      an LLM answer arriving in 40-160 character chunks
+- trickle:     a ~1200-character answer arriving 1-4 characters at a time
+
+Upstream pieces are produced without delay so CPU time covers framing only.
+For the gemini shape, a second run spaces chunks 20 ms apart and reports
+the extra delay coalescing adds before each chunk's text is sent (should be
+~0: frame-sized chunks pass straight through).
+
+Usage:
+    python benchmarks/sse_framing.py [--repeat 200]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streaming import coalesce_chunks, sse_event  # noqa: E402
+
+ESCALATION = ("I want to make sure you get the support you need. Please contact the **National Domestic "
+              "Violence Hotline at 1-800-799-7233** for confidential support and resources. You deserve to "
+              "be safe, and trained advocates are available 24/7 to help you think through your options, "
+              "including financial ones.")
+
+ANSWER = " ".join(
+    "Building an **emergency fund** is the first step: aim for three to six months of essential expenses "
+    "in a high-yield savings account, then direct extra income toward high-interest debt.".split()
+) * 6
+
+
+def split_random(text, low, high, rng):
+    pieces, i = [], 0
+    while i < len(text):
+        size = rng.randint(low, high)
+        pieces.append(text[i:i + size])
+        i += size
+    return pieces
+
+
+async def source(pieces, gap=0.0):
+    for piece in pieces:
+        if gap:
+            await asyncio.sleep(gap)
+        yield piece
+
+
+async def legacy_frames(pieces):
+    return [sse_event({'chunk': piece, 'done': False}) async for piece in source(pieces)]
+
+
+async def coalesced_frames(pieces):
+    return [sse_event({'chunk': frame, 'done': False}) async for frame in coalesce_chunks(source(pieces))]
+
+
+async def measure(framer, pieces, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        frames = await framer(pieces)
+    cpu_us = (time.process_time() - start) / repeat * 1e6
+    return len(frames), sum(len(frame.encode()) for frame in frames), cpu_us
+
+
+async def added_delay(pieces, gap):
+    """Mean / max seconds between a chunk leaving upstream and its last character being framed"""
+    produced = []
+
+    async def timed():
+        for piece in pieces:
+            await asyncio.sleep(gap)
+            produced.append(time.perf_counter())
+            yield piece
+
+    sent, total = [], 0
+    async for frame in coalesce_chunks(timed()):
+        total += len(frame)
+        sent.append((total, time.perf_counter()))
+    delays, end, frame_index = [], 0, 0
+    for piece, produced_at in zip(pieces, produced):
+        end += len(piece)
+        while sent[frame_index][0] < end:
+            frame_index += 1
+        delays.append(sent[frame_index][1] - produced_at)
+    return sum(delays) / len(delays), max(delays)
+
+
+async def run(repeat):
+    rng = random.Random(0)
+    shapes = {
+        "escalation": (list(ESCALATION), [ESCALATION]),
+        "gemini": (split_random(ANSWER, 40, 160, rng),) * 2,
+        "trickle": (split_random(ANSWER, 1, 4, rng),) * 2,
+    }
+    print(f"{'response':<12}{'framing':<11}{'frames':>8}{'bytes':>8}{'CPU us':>9}")
+    for name, (legacy_pieces, pieces) in shapes.items():
+        for label, framer, shape_pieces in (("legacy", legacy_frames, legacy_pieces),
+                                            ("coalesced", coalesced_frames, pieces)):
+            frames, size, cpu_us = await measure(framer, shape_pieces, repeat)
+            print(f"{name:<12}{label:<11}{frames:>8}{size:>8}{cpu_us:>9.0f}")
+
+    mean, worst = await added_delay(shapes["gemini"][1], gap=0.02)
+    print(f"\ngemini chunks 20 ms apart: added delay mean {mean * 1e3:.2f} ms, max {worst * 1e3:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Startup profile: import time of main.py and time-to-live / time-to-ready.
+
+1. Runs `python -X importtime -c "import main"` and prints the total
+   import time plus the slowest modules by cumulative time, so a heavy
+   import creeping back into the module level shows up.
+2. Starts uvicorn on a free port and polls /health/live and /health/ready,
+   reporting when the server first answers, when it reports ready, and the
+   per-component build times from the readiness report.
+
+Uses the environment's .env / Config, so point VECTOR_DB_PATH at an
+ingested index for realistic numbers.
+
+Usage:
+    python benchmarks/startup_profile.py [--top 15] [--timeout 180]
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_profile(top: int):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip() for part in line.replace("import time:", "|").split("|"))
+        modules.append((int(cumulative_us), int(self_us), name))
+    total = next((cumulative for cumulative, _, name in modules if name == "main"), None)
+    if result.returncode != 0 or total is None:
+        print(f"import main failed:\n{result.stderr[-2000:]}")
+        return
+    print(f"import main: {total / 1e3:.0f} ms")
+    print(f"{'cumulative ms':>14}{'self ms':>9}  module")
+    for cumulative, self_us, name in sorted(modules, reverse=True)[:top]:
+        print(f"{cumulative / 1e3:>14.1f}{self_us / 1e3:>9.1f}  {name}")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def probe(url: str):
+    """(status code, JSON body), or (None, None) while the server is not accepting connections"""
+    try:
+        with urllib.request.urlopen(url, timeout=2) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"null")
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        return None, None
+
+
+def readiness_profile(timeout: float):
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    live_at = ready_at = None
+    report = None
+    try:
+        while time.perf_counter() - start < timeout and server.poll() is None:
+            if live_at is None:
+                status, _ = probe(f"{base}/health/live")
+                if status == 200:
+                    live_at = time.perf_counter() - start
+            if live_at is not None:
+                status, report = probe(f"{base}/health/ready")
+                if status == 200:
+                    ready_at = time.perf_counter() - start
+                    break
+            time.sleep(0.05)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    print(f"\nlive  after {live_at:.2f} s" if live_at is not None else "\nnever answered /health/live")
+    print(f"ready after {ready_at:.2f} s" if ready_at is not None else "never became ready")
+    if report:
+        for name, state in report.get("components", {}).items():
+            detail = f" {state['seconds']:.2f} s" if "seconds" in state else ""
+            error = f" ({state['error']})" if state.get("error") else ""
+            print(f"  {name:<14}{state['status']}{detail}{error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--timeout", type=float, default=180)
+    args = parser.parse_args()
+    import_profile(args.top)
+    readiness_profile(args.timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Benchmark: whole-string extraction vs. streaming segments + streaming chunker.
+
+Generates a synthetic PDF (--pages, default 500) and XLSX workbook (--rows,
+default 100k) in a scratch directory and compares, per file:
+
+- "legacy":    the previous extractors (``text += ...``, XLSX loaded fully)
+               followed by VectorStore._chunk_text on the whole string
+- "streaming": DocumentProcessor.process_document (page / row segments fed
+               straight into chunking.chunk_segments, XLSX in read-only mode)
+
+Reports wall time, chunks/sec and peak Python heap (tracemalloc, measured in
+a separate pass), and checks both paths produce the same chunks.
+
+Usage:
+    python benchmarks/streaming_extraction.py [--pages 500] [--rows 100000]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import PyPDF2
+from openpyxl import Workbook, load_workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunking import CHUNK_OVERLAP, CHUNK_SIZE  # noqa: E402
+from document_processor import DocumentProcessor  # noqa: E402
+from vector_store import VectorStore  # noqa: E402
+
+SENTENCE = "Compound interest rewards savers who start early and contribute consistently. "
+
+
+def write_pdf(path: Path, pages: int, lines_per_page: int = 40):
+    """Write a plain-text PDF by hand (one Helvetica text block per page)"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for page in range(pages):
+        lines = [f"Page {page + 1} line {line}: {SENTENCE}" for line in range(lines_per_page)]
+        body = "BT /F1 9 Tf 12 TL 36 800 Td " + " ".join(f"({line}) Tj T*" for line in lines) + " ET"
+        stream = body.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % pages
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(bytes(out))
+
+
+def write_xlsx(path: Path, rows: int):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Accounts")
+    for row in range(rows):
+        sheet.append([row, f"Account {row}", "savings" if row % 3 else "checking", row * 12.5, SENTENCE])
+    workbook.save(path)
+
+
+def legacy_extract(path: Path) -> str:
+    """The extractors as they were: one growing string, XLSX fully loaded"""
+    text = ""
+    if path.suffix == ".pdf":
+        with open(path, "rb") as file:
+            for page in PyPDF2.PdfReader(file).pages:
+                text += page.extract_text() + "\n"
+    else:
+        workbook = load_workbook(path)
+        for sheet_name in workbook.sheetnames:
+            sheet = workbook[sheet_name]
+            text += f"\n=== Sheet: {sheet_name} ===\n"
+            for row in sheet.iter_rows(values_only=True):
+                text += " | ".join([str(cell) if cell else "" for cell in row]) + "\n"
+    return text
+
+
+def run_legacy(path: Path):
+    return VectorStore._chunk_text(None, legacy_extract(path), CHUNK_SIZE, CHUNK_OVERLAP)
+
+
+def run_streaming(path: Path):
+    processor = DocumentProcessor(str(path.parent), workers=0)
+    return [chunk["text"] for chunk in processor.process_document(path)["chunks"]]
+
+
+def measure(func, path: Path):
+    start = time.perf_counter()
+    chunks = func(path)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return chunks, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    scratch = Path(tempfile.mkdtemp(prefix="stream_bench_"))
+    files = [scratch / "synthetic.pdf", scratch / "synthetic.xlsx"]
+    write_pdf(files[0], args.pages)
+    write_xlsx(files[1], args.rows)
+
+    print(f"{'file':<16}{'mode':<11}{'MB':>6}{'seconds':>9}{'chunks/s':>10}{'peak MB':>9}")
+    for path in files:
+        size_mb = path.stat().st_size / 1e6
+        results = {}
+        for mode, func in (("legacy", run_legacy), ("streaming", run_streaming)):
+            chunks, elapsed, peak = measure(func, path)
+            results[mode] = chunks
+            print(f"{path.name:<16}{mode:<11}{size_mb:>6.1f}{elapsed:>9.2f}{len(chunks) / elapsed:>10.0f}{peak / 1e6:>9.1f}")
+        if results["legacy"] != results["streaming"]:
+            print(f"  {path.name}: chunk output differs between modes!")
+    shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark: character chunks (500/50) vs. token-aware chunks on DATABSE.
+
+1. Throughput: chunks the corpus (--copies times) with both strategies and
+   reports MB/s and chunks/s, plus how many character chunks exceed the
+   model's 256 word-piece window (and so are partly never embedded).
+2. Retrieval recall: embeds each strategy's chunks with the embedding model
+   and runs QUERIES, each labelled with the document that answers it.
+   Reports file-level recall@k and MRR.
+
+Needs `tokenizers` and `sentence-transformers`.
+
+Usage:
+    python benchmarks/token_chunking.py [--copies 20] [--k 1,3,5]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunking import TextSegment, chunk_segments, chunk_segments_by_tokens, get_tokenizer  # noqa: E402
+from config import Config  # noqa: E402
+from document_processor import DocumentProcessor  # noqa: E402
+
+MODEL_WINDOW = 256 - 2  # word-pieces left after [CLS] and [SEP]
+
+# (question, file that answers it)
+QUERIES = [
+    ("What is the difference between a 401(k) and an IRA?", "Main Differences Between a 401(k) and an IRA.pdf"),
+    ("Which retirement account has higher contribution limits?", "Main Differences Between a 401(k) and an IRA.pdf"),
+    ("How should a beginner start saving for retirement?", "Best Advice for Beginners Saving for Retirement.pdf"),
+    ("What is an employer match and why should I take it?", "Best Advice for Beginners Saving for Retirement.pdf"),
+    ("How do I start investing with little money?", "Best Advice for Beginners Interested in Investing.pdf"),
+    ("Should I pick individual stocks or index funds as a new investor?", "Best Advice for Beginners Interested in Investing.pdf"),
+    ("How do I match investments to my risk tolerance and time horizon?", "Matching Investment and Savings Solutions to Inves.pdf"),
+    ("How can I make my resume pass applicant tracking systems?", "Best Tips and Tricks for Creating an ATS-Friendly.pdf"),
+    ("How can I raise my credit score quickly?", "2025 Credit Score.xlsx"),
+    ("What do credit bureaus do?", "2025 Credit Score.xlsx"),
+    ("When is the tax filing deadline?", "2025 Taxes I.docx"),
+    ("How do I file my taxes for free?", "2025 Taxes I.docx"),
+    ("How do I protect myself from online scams and identity theft?", "Cyber Crime 1.docx"),
+    ("What should I do if I am a victim of cybercrime?", "Cyber Crime 2.docx"),
+    ("Where can I get help if my partner controls my finances?", "Domestic Abuse.docx"),
+    ("How can I prepare for the SAT for free?", "SAT and college free.docx"),
+]
+
+
+def chunk_corpus(processor: DocumentProcessor, paths, strategy: str, tokenizer):
+    chunks = []
+    for path in paths:
+        segments = processor.iter_segments(path)
+        if strategy == "tokens":
+            pieces = chunk_segments_by_tokens(segments, tokenizer, Config.CHUNK_TOKENS, Config.CHUNK_OVERLAP_TOKENS)
+        else:
+            pieces = chunk_segments(segments)
+        chunks.extend((path.name, text) for text, _ in pieces)
+    return chunks
+
+
+def throughput(processor, paths, tokenizer, copies: int):
+    # Extract once so only chunking is timed
+    texts = [[segment.text for segment in processor.iter_segments(path)] for path in paths]
+    size_mb = sum(len(t) for parts in texts for t in parts) * copies / 1e6
+    print(f"{'strategy':<10}{'MB/s':>8}{'chunks/s':>10}{'chunks':>8}{'over window':>14}")
+    for strategy in ("chars", "tokens"):
+        def run():
+            for parts in texts:
+                segments = [TextSegment(t) for t in parts]
+                if strategy == "tokens":
+                    yield from chunk_segments_by_tokens(
+                        segments, tokenizer, Config.CHUNK_TOKENS, Config.CHUNK_OVERLAP_TOKENS
+                    )
+                else:
+                    yield from chunk_segments(segments)
+
+        start = time.perf_counter()
+        count = sum(1 for _ in range(copies) for _ in run())
+        elapsed = time.perf_counter() - start
+        lengths = [len(tokenizer.encode(text, add_special_tokens=False).ids) for text, _ in run()]
+        over = sum(1 for n in lengths if n > MODEL_WINDOW)
+        print(f"{strategy:<10}{size_mb / elapsed:>8.2f}{count / elapsed:>10.0f}{len(lengths):>8}"
+              f"{over:>8} ({over / max(1, len(lengths)):.0%})")
+
+
+def recall(processor, paths, tokenizer, ks):
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(Config.EMBEDDING_MODEL, device="cpu")
+    queries = model.encode([q for q, _ in QUERIES], normalize_embeddings=True)
+    print(f"\n{'strategy':<10}" + "".join(f"{'recall@' + str(k):>11}" for k in ks) + f"{'MRR':>8}")
+    for strategy in ("chars", "tokens"):
+        chunks = chunk_corpus(processor, paths, strategy, tokenizer)
+        vectors = model.encode([text for _, text in chunks], normalize_embeddings=True, batch_size=64)
+        ranking = np.argsort(-(queries @ vectors.T), axis=1)
+        hits = {k: 0 for k in ks}
+        reciprocal = 0.0
+        for (_, expected), order in zip(QUERIES, ranking):
+            files = [chunks[i][0] for i in order]
+            for k in ks:
+                hits[k] += expected in files[:k]
+            reciprocal += 1.0 / (files.index(expected) + 1)
+        print(f"{strategy:<10}" + "".join(f"{hits[k] / len(QUERIES):>11.2f}" for k in ks)
+              + f"{reciprocal / len(QUERIES):>8.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=Config.KNOWLEDGE_BASE_PATH)
+    parser.add_argument("--copies", type=int, default=20, help="corpus repeats for the throughput run")
+    parser.add_argument("--k", default="1,3,5")
+    args = parser.parse_args()
+
+    processor = DocumentProcessor(args.corpus, workers=0)
+    paths = processor.list_documents()
+    tokenizer = get_tokenizer(Config.EMBEDDING_MODEL)
+    throughput(processor, paths, tokenizer, args.copies)
+    recall(processor, paths, tokenizer, [int(k) for k in args.k.split(",")])
+
+
+if __name__ == "__main__":
+    main()
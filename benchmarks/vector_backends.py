@@ -0,0 +1,151 @@
+"""
+Benchmark: Chroma (HNSW + sqlite) vs. the NumPy memory-mapped backend.
+
+Extracts and embeds the knowledge base once (replicated --copies times to
+model a bigger corpus), writes the same chunks and embeddings into a scratch
+index per backend, then, in a fresh process per backend so nothing is
+already warm, measures:
+
+- open:   time to open the persisted index and answer the first query
+- RSS:    resident memory added by opening and querying it
+- query:  p50 / p95 latency of single-query top-7 searches, and of one
+          batched call for 4 queries
+- recall: overlap of each backend's top-7 with exact brute-force top-7
+
+Embedding is excluded from the timings (queries are pre-embedded), so the
+numbers isolate the index itself. Needs chromadb and sentence-transformers.
+
+Usage:
+    python benchmarks/vector_backends.py [--copies 10] [--queries 200] [--dtype float32]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from document_processor import DocumentProcessor  # noqa: E402
+from numpy_index import NumpyCollection, normalize_rows, top_k  # noqa: E402
+
+N_RESULTS = 7
+BATCH = 4
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process (Linux)"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def open_collection(backend: str, path: str, dtype: str):
+    if backend == "numpy":
+        return NumpyCollection(path, dtype=dtype)
+    import chromadb
+    from chromadb.config import Settings
+    client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+    return client.get_or_create_collection(name="finance_knowledge_base", metadata={"hnsw:space": "cosine"})
+
+
+def build(backend: str, path: str, dtype: str, ids, texts, embeddings):
+    collection = open_collection(backend, path, dtype)
+    for offset in range(0, len(ids), Config.EMBEDDING_BATCH_SIZE):
+        end = offset + Config.EMBEDDING_BATCH_SIZE
+        collection.add(ids=ids[offset:end], documents=texts[offset:end],
+                       metadatas=[{"i": i} for i in range(offset, min(end, len(ids)))],
+                       embeddings=embeddings[offset:end].tolist())
+
+
+def measure(backend: str, path: str, dtype: str, queries, results):
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    collection = open_collection(backend, path, dtype)
+    first = collection.query(query_embeddings=queries[:1].tolist(), n_results=N_RESULTS)
+    open_seconds = time.perf_counter() - start
+
+    single = []
+    top_ids = [first["ids"][0]]
+    for query in queries[1:]:
+        start = time.perf_counter()
+        found = collection.query(query_embeddings=[query.tolist()], n_results=N_RESULTS)
+        single.append((time.perf_counter() - start) * 1e3)
+        top_ids.append(found["ids"][0])
+    batched = []
+    for offset in range(0, len(queries) - BATCH + 1, BATCH):
+        start = time.perf_counter()
+        collection.query(query_embeddings=queries[offset:offset + BATCH].tolist(), n_results=N_RESULTS)
+        batched.append((time.perf_counter() - start) * 1e3)
+
+    results[backend] = {
+        "open_ms": open_seconds * 1e3,
+        "rss_mb": rss_mb() - rss_before,
+        "single": (percentile(single, 0.5), percentile(single, 0.95)),
+        "batched": (percentile(batched, 0.5), percentile(batched, 0.95)),
+        "top_ids": top_ids,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=Config.KNOWLEDGE_BASE_PATH)
+    parser.add_argument("--copies", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dtype", default=Config.VECTOR_DTYPE, choices=["float32", "float16"])
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+
+    documents = DocumentProcessor(args.corpus).process_all_documents()
+    texts = [chunk["text"] for doc in documents for chunk in doc["chunks"]]
+    model = SentenceTransformer(Config.EMBEDDING_MODEL, device="cpu")
+    base = model.encode(texts, batch_size=64)
+    # Copies get small perturbations so they are distinct neighbours, not exact ties
+    rng = np.random.default_rng(0)
+    embeddings = np.concatenate(
+        [base] + [base + rng.normal(0, 0.01, base.shape) for _ in range(args.copies - 1)]
+    ).astype(np.float32)
+    all_texts = texts * args.copies
+    ids = [f"chunk_{i}" for i in range(len(all_texts))]
+    # Queries: chunk embeddings nudged off their source point
+    picks = rng.choice(len(embeddings), size=args.queries, replace=len(embeddings) < args.queries)
+    queries = (embeddings[picks] + rng.normal(0, 0.05, (args.queries, embeddings.shape[1]))).astype(np.float32)
+
+    exact = normalize_rows(queries) @ normalize_rows(embeddings).T
+    expected = [{ids[i] for i in top_k(row, N_RESULTS)} for row in exact]
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Manager().dict()
+    for backend in ("chroma", "numpy"):
+        path = tempfile.mkdtemp(prefix=f"{backend}_bench_")
+        child = context.Process(target=build, args=(backend, path, args.dtype, ids, all_texts, embeddings))
+        child.start()
+        child.join()
+        child = context.Process(target=measure, args=(backend, path, args.dtype, queries, results))
+        child.start()
+        child.join()
+
+    print(f"{len(ids)} chunks x {embeddings.shape[1]} dims, {args.queries} queries, numpy dtype {args.dtype}")
+    print(f"{'backend':<8}{'open ms':>9}{'RSS MB':>8}{'p50 ms':>8}{'p95 ms':>8}"
+          f"{f'batch{BATCH} p50':>12}{'recall@' + str(N_RESULTS):>11}")
+    for backend in ("chroma", "numpy"):
+        if backend not in results:
+            print(f"{backend:<8}  failed (see log above)")
+            continue
+        r = results[backend]
+        recall = np.mean([len(set(found) & want) / N_RESULTS for found, want in zip(r["top_ids"], expected)])
+        print(f"{backend:<8}{r['open_ms']:>9.1f}{r['rss_mb']:>8.1f}{r['single'][0]:>8.3f}{r['single'][1]:>8.3f}"
+              f"{r['batched'][0]:>12.3f}{recall:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Streaming chunkers over extracted text segments.
+
+- `chunk_segments` yields exactly the chunks `VectorStore._chunk_text` would
+  produce (character windows), buffering about one chunk plus one segment.
+- `chunk_segments_by_tokens` tokenizes each segment once with the embedding
+  model's tokenizer and cuts chunks at a target token count on sentence
+  boundaries, so no chunk runs past what the model actually embeds.
+
+Either way peak memory is bounded by segment size rather than file size.
+"""
+import re
+import threading
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+
+# all-MiniLM-L6-v2 truncates at 256 word-pieces including [CLS]/[SEP]
+CHUNK_TOKENS = 200
+CHUNK_OVERLAP_TOKENS = 32
+
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]*$")
+
+_tokenizers: Dict[str, object] = {}
+_tokenizers_lock = threading.Lock()
+
+
+class TextSegment:
+    """A piece of extracted text and where it came from (page, paragraph or sheet row)"""
+
+    __slots__ = ("text", "page", "paragraph", "sheet", "row")
+
+    def __init__(self, text: str, page: Optional[int] = None, paragraph: Optional[int] = None,
+                 sheet: Optional[str] = None, row: Optional[int] = None):
+        self.text = text
+        self.page = page
+        self.paragraph = paragraph
+        self.sheet = sheet
+        self.row = row
+
+    def position(self) -> Dict:
+        """Source position fields that are set (usable as vector-store metadata)"""
+        return {
+            name: getattr(self, name)
+            for name in ("page", "paragraph", "sheet", "row")
+            if getattr(self, name) is not None
+        }
+
+
+def chunk_segments(segments: Iterable[TextSegment], chunk_size: int = CHUNK_SIZE,
+                   chunk_overlap: int = CHUNK_OVERLAP) -> Iterator[Tuple[str, Dict]]:
+    """
+    Yield (chunk, position) pairs for the concatenated text of `segments`.
+
+    Chunk boundaries match `VectorStore._chunk_text` on the joined text;
+    `position` is the source position of the segment the chunk starts in.
+    """
+    segments = iter(segments)
+    buffer = ""         # text[buffer_start:buffer_start + len(buffer)]
+    buffer_start = 0
+    # (absolute offset, segment) of buffered segments, oldest first
+    starts = deque()
+    exhausted = False
+
+    def fill(until: int):
+        """Buffer text up to absolute offset `until` (or the end of input)"""
+        nonlocal buffer, exhausted
+        while not exhausted and buffer_start + len(buffer) < until:
+            segment = next(segments, None)
+            if segment is None:
+                exhausted = True
+            elif segment.text:
+                starts.append((buffer_start + len(buffer), segment))
+                buffer += segment.text
+
+    start = 0
+    while True:
+        # One character past the window tells us whether `end < len(text)`
+        fill(start + chunk_size + 1)
+        text_end = buffer_start + len(buffer)
+        if start >= text_end:
+            return
+
+        end = start + chunk_size
+        chunk = buffer[start - buffer_start:end - buffer_start]
+
+        # Try to break at sentence boundary (same rule as _chunk_text)
+        if end < text_end:
+            last_period = chunk.rfind('.')
+            last_newline = chunk.rfind('\n')
+            break_point = max(last_period, last_newline)
+
+            if break_point > start + chunk_size - 100:
+                chunk = chunk[:break_point + 1]
+                end = start + break_point + 1
+
+        while len(starts) > 1 and starts[1][0] <= start:
+            starts.popleft()
+        chunk = chunk.strip()
+        if chunk:
+            yield chunk, starts[0][1].position() if starts else {}
+
+        start = end - chunk_overlap
+        # Drop text no later chunk can reach
+        if start > buffer_start:
+            buffer = buffer[start - buffer_start:]
+            buffer_start = start
+
+
+def get_tokenizer(model_name: str):
+    """Fast tokenizer of a sentence-transformers model (loaded once per process)"""
+    with _tokenizers_lock:
+        tokenizer = _tokenizers.get(model_name)
+        if tokenizer is None:
+            from tokenizers import Tokenizer
+
+            repo_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+            tokenizer = Tokenizer.from_pretrained(repo_id)
+            # Chunk lengths are decided here, so the tokenizer must see whole segments
+            tokenizer.no_truncation()
+            tokenizer.no_padding()
+            _tokenizers[model_name] = tokenizer
+        return tokenizer
+
+
+def chunk_segments_by_tokens(segments: Iterable[TextSegment], tokenizer,
+                             max_tokens: int = CHUNK_TOKENS,
+                             overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> Iterator[Tuple[str, Dict]]:
+    """
+    Yield (chunk, metadata) pairs of at most `max_tokens` tokens each.
+
+    Chunks end at the last sentence boundary after half the budget (falling
+    back to a line break, a word boundary, then a hard cut) and consecutive
+    chunks share up to `overlap_tokens` tokens. Metadata holds the source
+    position of the segment the chunk starts in plus `start_char` /
+    `end_char`, the chunk's offsets in the concatenated document text.
+    """
+    segments = iter(segments)
+    min_tokens = max(1, max_tokens // 2)
+    text = ""               # document text from absolute offset text_start on
+    text_start = 0
+    # Parallel per-token lists (absolute char offsets) of the buffered tokens
+    starts: List[int] = []
+    ends: List[int] = []
+    # Boundary before each token: 3 = sentence / paragraph, 2 = line break, 1 = word, 0 = inside a word
+    breaks: List[int] = []
+    segment_starts = deque()    # (absolute offset, segment), oldest first
+    exhausted = False
+
+    def fill(tokens_needed: int):
+        """Tokenize segments until `tokens_needed` tokens are buffered (or input ends)"""
+        nonlocal text, exhausted
+        while not exhausted and len(starts) < tokens_needed:
+            segment = next(segments, None)
+            if segment is None:
+                exhausted = True
+                continue
+            if not segment.text:
+                continue
+            offset = text_start + len(text)
+            segment_starts.append((offset, segment))
+            text += segment.text
+            for start, end in tokenizer.encode(segment.text, add_special_tokens=False).offsets:
+                if end <= start:
+                    continue
+                start += offset
+                end += offset
+                if not ends:
+                    kind = 3
+                else:
+                    gap = text[ends[-1] - text_start:start - text_start]
+                    if not gap:
+                        kind = 0
+                    elif "\n\n" in gap or _SENTENCE_END.search(text[starts[-1] - text_start:ends[-1] - text_start]):
+                        kind = 3
+                    elif "\n" in gap:
+                        # PDF text wraps lines with newlines, so alone this is weaker than a sentence end
+                        kind = 2
+                    else:
+                        kind = 1
+                starts.append(start)
+                ends.append(end)
+                breaks.append(kind)
+
+    while True:
+        fill(max_tokens + 1)
+        if not starts:
+            return
+
+        cut = len(starts)
+        if cut > max_tokens:
+            cut = max_tokens
+            for wanted in (3, 2, 1):
+                boundary = next((k for k in range(max_tokens, min_tokens, -1) if breaks[k] >= wanted), None)
+                if boundary is not None:
+                    cut = boundary
+                    break
+
+        start_char, end_char = starts[0], ends[cut - 1]
+        while len(segment_starts) > 1 and segment_starts[1][0] <= start_char:
+            segment_starts.popleft()
+        metadata = segment_starts[0][1].position() if segment_starts else {}
+        metadata["start_char"] = start_char
+        metadata["end_char"] = end_char
+        yield text[start_char - text_start:end_char - text_start], metadata
+
+        if cut == len(starts) and exhausted:
+            return
+
+        # Overlap: step back up to overlap_tokens, restarting on the strongest
+        # boundary in range (sentence, then line, then word)
+        window = range(max(1, cut - overlap_tokens), cut)
+        for wanted in (3, 2, 1):
+            next_first = next((k for k in window if breaks[k] >= wanted), None)
+            if next_first is not None:
+                break
+        else:
+            next_first = cut
+        del starts[:next_first], ends[:next_first], breaks[:next_first]
+        if starts:
+            text = text[starts[0] - text_start:]
+            text_start = starts[0]
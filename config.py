@@ -9,16 +9,99 @@ class Config:
     
     # Database
     DATABASE_PATH = os.getenv("DATABASE_PATH", "chatbot.db")
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_STATEMENT_CACHE_SIZE = int(os.getenv("SQLITE_STATEMENT_CACHE_SIZE", "128"))
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+    USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
     
     # Vector Database
     VECTOR_DB_PATH = os.getenv("VECTOR_DB_PATH", "./vector_db")
+    # "chroma" (HNSW) or "numpy" (exact search over a memory-mapped matrix; float32 or float16)
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+    # numpy backend only: "int8" scans quantized codes and rescores the top candidates in float32
+    VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float32")
+    VECTOR_RESCORE_CANDIDATES = int(os.getenv("VECTOR_RESCORE_CANDIDATES", "50"))
     
     # Knowledge Base - use relative path by default, can be overridden via env var
     KNOWLEDGE_BASE_PATH = os.getenv("KNOWLEDGE_BASE_PATH", os.path.join(os.path.dirname(__file__), "DATABSE"))
+    # Document extraction processes (0 = in-process) and per-file timeout in seconds
+    EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+    EXTRACTION_TIMEOUT = float(os.getenv("EXTRACTION_TIMEOUT", "120"))
+    
+    # Sensitivity / financial / context keyword lists for the query classifier
+    QUERY_KEYWORDS_PATH = os.getenv("QUERY_KEYWORDS_PATH", os.path.join(os.path.dirname(__file__), "query_keywords.json"))
+    
+    # Prompt token budget (tokens estimated as characters / PROMPT_CHARS_PER_TOKEN): total, and per
+    # section for knowledge-base sources, web results, conversation history and each history message
+    PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+    PROMPT_CHARS_PER_TOKEN = float(os.getenv("PROMPT_CHARS_PER_TOKEN", "4"))
+    PROMPT_CONTEXT_TOKENS = int(os.getenv("PROMPT_CONTEXT_TOKENS", "2500"))
+    PROMPT_WEB_TOKENS = int(os.getenv("PROMPT_WEB_TOKENS", "1000"))
+    PROMPT_HISTORY_TOKENS = int(os.getenv("PROMPT_HISTORY_TOKENS", "1500"))
+    PROMPT_HISTORY_MESSAGE_TOKENS = int(os.getenv("PROMPT_HISTORY_MESSAGE_TOKENS", "400"))
+    PROMPT_SUMMARY_TOKENS = int(os.getenv("PROMPT_SUMMARY_TOKENS", "400"))
+    # Fraction of Gemini prompts also sent to countTokens to calibrate the estimate (one extra request each)
+    PROMPT_TOKEN_COUNT_SAMPLE = float(os.getenv("PROMPT_TOKEN_COUNT_SAMPLE", "0.05"))
+    
+    # Rolling conversation summaries: messages leaving the prompt's history window are folded into a
+    # per-conversation summary after the reply is sent, once at least SUMMARY_MIN_MESSAGES have left it
+    # (default: a full history window, so one summary call per three turns rather than every turn;
+    # until then the prompt carries those messages verbatim, within PROMPT_HISTORY_TOKENS).
+    # Summary calls have their own limit, SUMMARY_MAX_CONCURRENCY, outside LLM_MAX_CONCURRENCY
+    SUMMARY_ENABLED = os.getenv("SUMMARY_ENABLED", "true").lower() == "true"
+    SUMMARY_MIN_MESSAGES = int(os.getenv("SUMMARY_MIN_MESSAGES", "6"))
+    SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "2"))
+    SUMMARY_MAX_WORDS = int(os.getenv("SUMMARY_MAX_WORDS", "150"))
     
     # Model Configuration
     GEMINI_MODEL = "gemini-2.5-flash"  # or "gemini-1.5-pro" for better quality
+    # "gemini", or "fake" (deterministic local model with the FAKE_LLM_* latencies, for offline load tests)
+    LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+    # Per process: concurrent LLM calls, total and first-chunk deadlines (seconds), retries of 429/5xx,
+    # and hedging (second request if no first chunk after LLM_HEDGE_AFTER seconds; 0 = off)
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+    LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+    LLM_FIRST_TOKEN_TIMEOUT = float(os.getenv("LLM_FIRST_TOKEN_TIMEOUT", "15"))
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+    LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "0.5"))
+    LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))
+    FAKE_LLM_FIRST_TOKEN_MS = float(os.getenv("FAKE_LLM_FIRST_TOKEN_MS", "400"))
+    FAKE_LLM_TOKEN_MS = float(os.getenv("FAKE_LLM_TOKEN_MS", "15"))
+    FAKE_LLM_TOKENS = int(os.getenv("FAKE_LLM_TOKENS", "200"))
+    FAKE_LLM_CHUNK_TOKENS = int(os.getenv("FAKE_LLM_CHUNK_TOKENS", "10"))
+    FAKE_LLM_JITTER = float(os.getenv("FAKE_LLM_JITTER", "0.2"))
+    FAKE_LLM_FAILURE_RATE = float(os.getenv("FAKE_LLM_FAILURE_RATE", "0"))
+    FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
     EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+    # "sentence-transformers" (PyTorch) or "onnx" (ONNX Runtime, no torch import; optionally int8-quantized)
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence-transformers")
+    EMBEDDING_ONNX_PATH = os.getenv("EMBEDDING_ONNX_PATH", "")  # default: the model's export on the HF Hub
+    EMBEDDING_QUANTIZED = os.getenv("EMBEDDING_QUANTIZED", "false").lower() == "true"
+    EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))  # ONNX Runtime intra-op threads, 0 = all cores
+    
+    # Ingestion: chunks embedded/written per batch, and embedding processes (0 = in-process)
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+    EMBEDDING_PROCESSES = int(os.getenv("EMBEDDING_PROCESSES", "0"))
+    # Chunking: "chars" (500/50 windows) or "tokens" (embedding-model tokenizer, sentence boundaries;
+    # switching re-chunks every file on the next ingestion run, and the tokenizer is downloaded then)
+    CHUNKING = os.getenv("CHUNKING", "chars")
+    CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "200"))
+    CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+    
+    # Hybrid retrieval: BM25 fused with dense results by reciprocal-rank fusion
+    HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+    RRF_K = int(os.getenv("RRF_K", "60"))
+    
+    # Query-embedding cache (LRU; TTL in seconds, 0 = entries only leave by LRU eviction)
+    QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+    QUERY_EMBEDDING_CACHE_TTL = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "0"))
+    
+    # Semantic answer cache for repeat first-turn questions
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+    ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+    ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
     
     # Auth0 Configuration
     AUTH0_DOMAIN = os.getenv("AUTH0_DOMAIN", "").strip()
@@ -26,11 +109,29 @@ class Config:
     AUTH0_CLIENT_ID = os.getenv("AUTH0_CLIENT_ID", "").strip()
     AUTH0_CLIENT_SECRET = os.getenv("AUTH0_CLIENT_SECRET", "").strip()
     AUTH0_NEXTJS_URL = os.getenv("AUTH0_NEXTJS_URL", "http://localhost:3000").strip()
-    
+    JWKS_CACHE_TTL = float(os.getenv("JWKS_CACHE_TTL", "3600"))
+    JWKS_MIN_REFRESH_INTERVAL = float(os.getenv("JWKS_MIN_REFRESH_INTERVAL", "30"))
+    TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+    TOKEN_CACHE_MAX_TTL = float(os.getenv("TOKEN_CACHE_MAX_TTL", "3600"))
+
+    # Build the embedding model, vector index and Gemini client in the background at startup
+    # (otherwise on the first request that needs them)
+    WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+
+    # Executor sizes for blocking work run off the event loop
+    DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "8"))
+    RETRIEVAL_EXECUTOR_WORKERS = int(os.getenv("RETRIEVAL_EXECUTOR_WORKERS", "4"))
+    HTTP_EXECUTOR_WORKERS = int(os.getenv("HTTP_EXECUTOR_WORKERS", "16"))
+
+    # SSE framing: small upstream pieces are merged into word-aligned frames of at least
+    # SSE_MIN_FRAME_CHARS, but buffered text is never held longer than SSE_MAX_FRAME_DELAY seconds
+    SSE_MIN_FRAME_CHARS = int(os.getenv("SSE_MIN_FRAME_CHARS", "32"))
+    SSE_MAX_FRAME_DELAY = float(os.getenv("SSE_MAX_FRAME_DELAY", "0.05"))
+
     @classmethod
     def validate(cls):
         """Validate that required configuration is present"""
-        if not cls.GOOGLE_GEMINI_API_KEY:
+        if cls.LLM_BACKEND == "gemini" and not cls.GOOGLE_GEMINI_API_KEY:
             raise ValueError("GOOGLE_GEMINI_API_KEY is required")
         if not cls.AUTH0_DOMAIN:
             raise ValueError("AUTH0_DOMAIN is required")
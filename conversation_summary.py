@@ -0,0 +1,170 @@
+"""
+Rolling per-conversation summaries.
+
+The prompt carries only the last few messages, so everything older used to
+be lost. After a reply is sent, `ConversationSummarizer` folds the messages
+that have left the prompt's history window into a short running summary
+stored on the conversation row (together with the meaningful questions
+they contained, for redirects). Prompt assembly reads the summary plus the
+recent messages: constant size and constant DB work per turn, however long
+the conversation gets.
+
+Summaries are folded a window's worth of messages at a time (not every
+turn) and run on their own small LLMClient over the chat client's backend,
+so they never take one of the chat requests' LLM_MAX_CONCURRENCY slots;
+they also wait for the chat client to have a free slot before starting.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from config import Config
+from executors import run_db
+from llm_client import LLMClient
+from prompt_budget import PromptBudget
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Messages folded per summarization call (a long backlog takes several calls)
+MAX_FOLD_MESSAGES = 20
+# Meaningful questions remembered per conversation
+MAX_QUESTIONS = 3
+# How long a fold waits for chat traffic to leave a free slot before it is put off to the next turn
+MAX_DEFER_SECONDS = 30.0
+IDLE_POLL_SECONDS = 0.25
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and Pia, an assistant for women's financial empowerment.
+
+Update the summary with the new messages. Keep what later answers depend on: the user's circumstances (age, income, family, employment), goals, decisions, advice already given and open questions. Drop greetings and small talk. Write plain text, at most {max_words} words, no headings.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+
+Updated summary:"""
+
+
+class ConversationSummarizer:
+    """Folds messages that leave the prompt's history window into a per-conversation summary"""
+
+    def __init__(self, db, get_rag_system: Callable[[], Awaitable[object]],
+                 min_messages: Optional[int] = None, max_words: Optional[int] = None,
+                 max_concurrency: Optional[int] = None):
+        self.db = db
+        # Resolved on first use so the Gemini client is not built just for this
+        self._get_rag_system = get_rag_system
+        self.min_messages = Config.SUMMARY_MIN_MESSAGES if min_messages is None else min_messages
+        self.max_words = Config.SUMMARY_MAX_WORDS if max_words is None else max_words
+        self.max_concurrency = Config.SUMMARY_MAX_CONCURRENCY if max_concurrency is None else max_concurrency
+        self._llm: Optional[LLMClient] = None
+        self._budget = PromptBudget()
+        self._tasks: Set[asyncio.Task] = set()
+        self._running: Set[str] = set()
+        self._rerun: Set[str] = set()
+        self.updates = 0
+        self.failures = 0
+        self.deferred = 0
+
+    def schedule(self, user_id: int, conversation_id: str):
+        """Update the conversation's summary in the background (call from the event loop after replying)"""
+        if conversation_id in self._running:
+            # One update per conversation at a time; run again once it finishes
+            self._rerun.add(conversation_id)
+            return
+        self._running.add(conversation_id)
+        task = asyncio.get_running_loop().create_task(self._run(user_id, conversation_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, user_id: int, conversation_id: str):
+        try:
+            while True:
+                self._rerun.discard(conversation_id)
+                try:
+                    folded = await self.update(user_id, conversation_id)
+                except Exception as e:
+                    logger.error(f"Error summarizing conversation {conversation_id}: {e}")
+                    self.failures += 1
+                    return
+                if not folded and conversation_id not in self._rerun:
+                    return
+        finally:
+            self._running.discard(conversation_id)
+
+    async def update(self, user_id: int, conversation_id: str) -> bool:
+        """Fold the next batch of out-of-window messages into the summary; True if anything was folded"""
+        rag_system = await self._get_rag_system()
+        state = await run_db(
+            self.db.get_unsummarized_messages, user_id, conversation_id,
+            keep_recent=rag_system.HISTORY_MESSAGES - 1, limit=MAX_FOLD_MESSAGES
+        )
+        if not state:
+            return False
+        messages = state["messages"]
+        # Keep a trailing question with its answer (still in the window) for the next fold
+        if messages and messages[-1]["role"] == "user":
+            messages = messages[:-1]
+        if len(messages) < self.min_messages:
+            return False
+
+        if not await self._wait_for_chat_slot(rag_system.llm):
+            # Chat traffic has priority; the messages stay unsummarized until a later turn
+            self.deferred += 1
+            return False
+        summary = await self.summarize(self._client(rag_system.llm), state["summary"], messages)
+        if summary is None:
+            self.failures += 1
+            return False
+        questions = (state["questions"] + rag_system.extract_meaningful_questions(messages, limit=MAX_QUESTIONS))
+        stored = await run_db(
+            self.db.update_conversation_summary, user_id, conversation_id, summary, messages[-1]["seq"] + 1,
+            questions[-MAX_QUESTIONS:], expected_seq=state["summary_seq"]
+        )
+        if stored:
+            self.updates += 1
+            logger.info(f"Folded {len(messages)} messages into the summary of conversation {conversation_id}")
+        return stored
+
+    def _client(self, chat_llm: LLMClient) -> LLMClient:
+        """Summaries' own client on the chat client's backend: separate, smaller limit and no hedging"""
+        if self._llm is None or self._llm.backend is not chat_llm.backend:
+            self._llm = LLMClient(chat_llm.backend, max_concurrency=self.max_concurrency, hedge_after=0)
+        return self._llm
+
+    async def _wait_for_chat_slot(self, chat_llm: LLMClient) -> bool:
+        """Wait until chat requests leave a slot free (False after MAX_DEFER_SECONDS)"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + MAX_DEFER_SECONDS
+        while chat_llm.in_flight + chat_llm.waiting >= chat_llm.max_concurrency:
+            if loop.time() >= deadline:
+                return False
+            await asyncio.sleep(IDLE_POLL_SECONDS)
+        return True
+
+    async def summarize(self, llm, summary: str, messages: List[Dict]) -> Optional[str]:
+        """New running summary from the previous one and the messages being folded"""
+        transcript = "\n".join(
+            f"{'User' if msg['role'] == 'user' else 'Assistant'}: "
+            f"{self._budget.truncate(msg['content'], Config.PROMPT_HISTORY_MESSAGE_TOKENS)}"
+            for msg in messages
+        )
+        prompt = SUMMARY_PROMPT.format(max_words=self.max_words, summary=summary or "(none yet)",
+                                       messages=transcript)
+        try:
+            text = (await llm.generate(prompt)).strip()
+        except Exception as e:
+            logger.error(f"Error generating conversation summary: {e}")
+            return None
+        return text or None
+
+    def stats(self) -> Dict:
+        return {
+            "updates": self.updates,
+            "failures": self.failures,
+            "deferred": self.deferred,
+            "in_progress": len(self._running),
+            "llm": self._llm.stats() if self._llm else None,
+        }
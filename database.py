@@ -2,9 +2,15 @@ import sqlite3
 from typing import Optional, Dict, List
 import json
 import logging
+import os
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from config import Config
+from user_cache import UserCache
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -14,109 +20,184 @@ class Database:
     
     def __init__(self, db_path: str = "chatbot.db"):
         self.db_path = Path(db_path)
+        
+        # Per-thread connection pool: each executor thread keeps one open
+        # connection (and its prepared-statement cache) for its lifetime
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        
+        # Users are resolved several times per chat message; serve repeats from memory
+        self.user_cache = UserCache(maxsize=Config.USER_CACHE_SIZE, ttl=Config.USER_CACHE_TTL)
+        
         self.init_db()
     
-    def get_connection(self):
-        """Get database connection"""
-        conn = sqlite3.connect(str(self.db_path))
+    def get_connection(self) -> sqlite3.Connection:
+        """Get this thread's pooled database connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        # A forked worker must not reuse its parent's connection
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        
+        conn = sqlite3.connect(
+            str(self.db_path),
+            timeout=Config.SQLITE_BUSY_TIMEOUT_MS / 1000,
+            cached_statements=Config.SQLITE_STATEMENT_CACHE_SIZE,
+            check_same_thread=False  # only used by its own thread; close() may run elsewhere
+        )
         conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA busy_timeout={int(Config.SQLITE_BUSY_TIMEOUT_MS)}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        with self._connections_lock:
+            self._connections.append(conn)
         return conn
     
-    def init_db(self):
-        """Initialize database tables"""
+    @contextmanager
+    def connection(self):
+        """Yield the pooled connection, committing on success and rolling back on error"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Users table - ADD auth0_sub field and metadata fields
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                auth0_sub TEXT UNIQUE,
-                name TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                phone TEXT,
-                age INTEGER,
-                financial_goals TEXT,
-                income_range TEXT,
-                employment_status TEXT,
-                marital_status TEXT,
-                dependents INTEGER,
-                investment_experience TEXT,
-                risk_tolerance TEXT,
-                education TEXT,
-                location TEXT,
-                username TEXT,
-                metadata TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Add new columns if they don't exist (for existing databases)
-        new_columns = [
-            ("auth0_sub", "TEXT"),
-            ("age", "INTEGER"),
-            ("financial_goals", "TEXT"),
-            ("income_range", "TEXT"),
-            ("employment_status", "TEXT"),
-            ("marital_status", "TEXT"),
-            ("dependents", "INTEGER"),
-            ("investment_experience", "TEXT"),
-            ("risk_tolerance", "TEXT"),
-            ("education", "TEXT"),
-            ("location", "TEXT"),
-            ("username", "TEXT"),
-            ("metadata", "TEXT"),
-            ("updated_at", "TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
-        ]
-        
-        for column_name, column_type in new_columns:
-            try:
-                cursor.execute(f"ALTER TABLE users ADD COLUMN {column_name} {column_type}")
-                conn.commit()
-            except sqlite3.OperationalError as e:
-                if "duplicate column" in str(e).lower() or "already exists" in str(e).lower():
-                    pass  # Column already exists
-                else:
-                    logger.warning(f"Could not add {column_name} column: {e}")
-        
-        # Create unique index for auth0_sub
         try:
-            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_auth0_sub ON users(auth0_sub)")
+            yield conn
             conn.commit()
-        except sqlite3.OperationalError:
-            pass  # Index might already exist
-        
-        # Conversations table (temporary storage - auto cleanup old ones)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS conversations (
-                id TEXT PRIMARY KEY,
-                user_id INTEGER NOT NULL,
-                messages TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        """)
+        except Exception:
+            conn.rollback()
+            raise
+    
+    def close(self):
+        """Close every pooled connection"""
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except Exception as e:
+                    logger.warning(f"Error closing database connection: {e}")
+            self._connections.clear()
+        self._local = threading.local()
+    
+    def init_db(self):
+        """Initialize database tables"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            # Users table - ADD auth0_sub field and metadata fields
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    auth0_sub TEXT UNIQUE,
+                    name TEXT NOT NULL,
+                    email TEXT UNIQUE NOT NULL,
+                    phone TEXT,
+                    age INTEGER,
+                    financial_goals TEXT,
+                    income_range TEXT,
+                    employment_status TEXT,
+                    marital_status TEXT,
+                    dependents INTEGER,
+                    investment_experience TEXT,
+                    risk_tolerance TEXT,
+                    education TEXT,
+                    location TEXT,
+                    username TEXT,
+                    metadata TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
+            # Add new columns if they don't exist (for existing databases)
+            new_columns = [
+                ("auth0_sub", "TEXT"),
+                ("age", "INTEGER"),
+                ("financial_goals", "TEXT"),
+                ("income_range", "TEXT"),
+                ("employment_status", "TEXT"),
+                ("marital_status", "TEXT"),
+                ("dependents", "INTEGER"),
+                ("investment_experience", "TEXT"),
+                ("risk_tolerance", "TEXT"),
+                ("education", "TEXT"),
+                ("location", "TEXT"),
+                ("username", "TEXT"),
+                ("metadata", "TEXT"),
+                ("updated_at", "TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
+            ]
+            
+            for column_name, column_type in new_columns:
+                try:
+                    cursor.execute(f"ALTER TABLE users ADD COLUMN {column_name} {column_type}")
+                except sqlite3.OperationalError as e:
+                    if "duplicate column" in str(e).lower() or "already exists" in str(e).lower():
+                        pass  # Column already exists
+                    else:
+                        logger.warning(f"Could not add {column_name} column: {e}")
+            
+            # Create unique index for auth0_sub
+            try:
+                cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_auth0_sub ON users(auth0_sub)")
+            except sqlite3.OperationalError:
+                pass  # Index might already exist
+            
+            # Conversations table (temporary storage - auto cleanup old ones)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS conversations (
+                    id TEXT PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    messages TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            """)
+            
+            # Messages table - one row per message so a turn appends two rows
+            # instead of rewriting the whole conversation
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    conversation_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    timestamp TEXT,
+                    PRIMARY KEY (conversation_id, seq),
+                    FOREIGN KEY (conversation_id) REFERENCES conversations (id)
+                )
+            """)
+            
+            # Running summary of the messages before summary_seq (kept by ConversationSummarizer)
+            for column_name, column_type in [
+                ("summary", "TEXT NOT NULL DEFAULT ''"),
+                ("summary_seq", "INTEGER NOT NULL DEFAULT 0"),
+                ("summary_questions", "TEXT NOT NULL DEFAULT '[]'"),
+            ]:
+                try:
+                    cursor.execute(f"ALTER TABLE conversations ADD COLUMN {column_name} {column_type}")
+                except sqlite3.OperationalError as e:
+                    if "duplicate column" not in str(e).lower():
+                        logger.warning(f"Could not add {column_name} column: {e}")
+            
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_conversations_user_id ON conversations(user_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_conversations_updated_at ON conversations(updated_at)")
+            
+            self._migrate_conversation_blobs(cursor)
         
-        conn.commit()
-        conn.close()
         logger.info(f"Database initialized at {self.db_path}")
     
     # User methods
     def create_user(self, name: str, email: str, phone: Optional[str] = None) -> Optional[int]:
         """Create a new user"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO users (name, email, phone) VALUES (?, ?, ?)",
-                (name, email, phone)
-            )
-            user_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            return user_id
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "INSERT INTO users (name, email, phone) VALUES (?, ?, ?)",
+                    (name, email, phone)
+                )
+                user_id = cursor.lastrowid
+                return user_id
         except sqlite3.IntegrityError:
             logger.error(f"User with email {email} already exists")
             return None
@@ -126,16 +207,34 @@ class Database:
     
     def get_user(self, user_id: int) -> Optional[Dict]:
         """Get user by ID"""
+        cached = self._get_cached_user(user_id=user_id)
+        return dict(cached.record) if cached else None
+    
+    def get_user_metadata(self, user_id: int) -> Optional[Dict]:
+        """Get the (read-only) personalization metadata for a user"""
+        cached = self._get_cached_user(user_id=user_id)
+        return cached.user_metadata if cached else None
+    
+    def _get_cached_user(self, user_id: Optional[int] = None, auth0_sub: Optional[str] = None):
+        """Look a user up by id or auth0_sub through the user cache"""
+        if user_id is not None:
+            cached = self.user_cache.get_by_id(user_id)
+            query, param = "SELECT * FROM users WHERE id = ?", user_id
+        else:
+            cached = self.user_cache.get_by_auth0_sub(auth0_sub)
+            query, param = "SELECT * FROM users WHERE auth0_sub = ?", auth0_sub
+        if cached is not None:
+            return cached
+        
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-            row = cursor.fetchone()
-            conn.close()
-            
-            if row:
-                return dict(row)
-            return None
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, (param,))
+                row = cursor.fetchone()
+                
+                if row:
+                    return self.user_cache.put(dict(row))
+                return None
         except Exception as e:
             logger.error(f"Error getting user: {e}")
             return None
@@ -143,70 +242,251 @@ class Database:
     def get_user_by_email(self, email: str) -> Optional[Dict]:
         """Get user by email"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM users WHERE email = ?", (email,))
-            row = cursor.fetchone()
-            conn.close()
-            
-            if row:
-                return dict(row)
-            return None
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT * FROM users WHERE email = ?", (email,))
+                row = cursor.fetchone()
+                
+                if row:
+                    return dict(row)
+                return None
         except Exception as e:
             logger.error(f"Error getting user by email: {e}")
             return None
     
+    def _migrate_conversation_blobs(self, cursor):
+        """Move legacy JSON message blobs into the messages table (idempotent)"""
+        cursor.execute("SELECT id, messages FROM conversations WHERE messages != '[]'")
+        rows = cursor.fetchall()
+        for row in rows:
+            try:
+                messages = json.loads(row['messages'])
+            except (TypeError, ValueError):
+                logger.warning(f"Skipping unreadable conversation blob {row['id']}")
+                continue
+            cursor.executemany(
+                "INSERT OR IGNORE INTO messages (conversation_id, seq, role, content, timestamp) VALUES (?, ?, ?, ?, ?)",
+                [self._message_row(row['id'], seq, message) for seq, message in enumerate(messages)]
+            )
+            cursor.execute("UPDATE conversations SET messages = '[]' WHERE id = ?", (row['id'],))
+        if rows:
+            logger.info(f"Migrated {len(rows)} conversations to the messages table")
+    
+    @staticmethod
+    def _message_row(conversation_id: str, seq: int, message: Dict) -> tuple:
+        return (
+            conversation_id,
+            seq,
+            message.get('role', ''),
+            message.get('content', ''),
+            message.get('timestamp')
+        )
+    
+    @staticmethod
+    def _message_from_row(row) -> Dict:
+        return {"role": row['role'], "content": row['content'], "timestamp": row['timestamp']}
+    
     # Conversation methods
+    def append_messages(self, user_id: int, conversation_id: str, messages: List[Dict]) -> bool:
+        """Append new messages to a conversation, creating it if needed"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    INSERT INTO conversations (id, user_id, messages, updated_at)
+                    VALUES (?, ?, '[]', ?)
+                    ON CONFLICT(id) DO UPDATE SET updated_at = excluded.updated_at
+                    WHERE conversations.user_id = excluded.user_id
+                """, (conversation_id, user_id, datetime.utcnow()))
+                
+                if cursor.rowcount == 0:
+                    # Conversation id exists but belongs to another user
+                    logger.error(f"Conversation {conversation_id} does not belong to user {user_id}")
+                    return False
+                
+                cursor.execute(
+                    "SELECT COALESCE(MAX(seq), -1) + 1 FROM messages WHERE conversation_id = ?",
+                    (conversation_id,)
+                )
+                next_seq = cursor.fetchone()[0]
+                cursor.executemany(
+                    "INSERT INTO messages (conversation_id, seq, role, content, timestamp) VALUES (?, ?, ?, ?, ?)",
+                    [self._message_row(conversation_id, next_seq + i, message) for i, message in enumerate(messages)]
+                )
+                
+                return True
+        except Exception as e:
+            logger.error(f"Error appending messages: {e}")
+            return False
+    
     def store_conversation(self, user_id: int, conversation_id: str, messages: List[Dict]):
-        """Store conversation history"""
+        """Replace the full conversation history (prefer append_messages per turn)"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            messages_json = json.dumps(messages)
-            cursor.execute("""
-                INSERT OR REPLACE INTO conversations (id, user_id, messages, updated_at)
-                VALUES (?, ?, ?, ?)
-            """, (conversation_id, user_id, messages_json, datetime.utcnow()))
-            
-            conn.commit()
-            conn.close()
-            return True
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    INSERT OR REPLACE INTO conversations (id, user_id, messages, updated_at)
+                    VALUES (?, ?, '[]', ?)
+                """, (conversation_id, user_id, datetime.utcnow()))
+                cursor.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+                cursor.executemany(
+                    "INSERT INTO messages (conversation_id, seq, role, content, timestamp) VALUES (?, ?, ?, ?, ?)",
+                    [self._message_row(conversation_id, seq, message) for seq, message in enumerate(messages)]
+                )
+                
+                return True
         except Exception as e:
             logger.error(f"Error storing conversation: {e}")
             return False
     
     def get_conversation(self, user_id: int, conversation_id: str) -> Optional[List[Dict]]:
-        """Get conversation history"""
+        """Get full conversation history"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT messages FROM conversations WHERE id = ? AND user_id = ?",
-                (conversation_id, user_id)
-            )
-            row = cursor.fetchone()
-            conn.close()
-            
-            if row:
-                return json.loads(row['messages'])
-            return None
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT 1 FROM conversations WHERE id = ? AND user_id = ?",
+                    (conversation_id, user_id)
+                )
+                if cursor.fetchone() is None:
+                    return None
+                
+                cursor.execute(
+                    "SELECT role, content, timestamp FROM messages WHERE conversation_id = ? ORDER BY seq",
+                    (conversation_id,)
+                )
+                rows = cursor.fetchall()
+                
+                return [self._message_from_row(row) for row in rows]
         except Exception as e:
             logger.error(f"Error getting conversation: {e}")
             return None
     
+    def get_recent_messages(self, user_id: int, conversation_id: str, limit: int) -> Optional[List[Dict]]:
+        """Get the last `limit` messages of a conversation, oldest first"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT m.role, m.content, m.timestamp
+                    FROM messages m
+                    JOIN conversations c ON c.id = m.conversation_id
+                    WHERE m.conversation_id = ? AND c.user_id = ?
+                    ORDER BY m.seq DESC
+                    LIMIT ?
+                """, (conversation_id, user_id, limit))
+                rows = cursor.fetchall()
+                
+                return [self._message_from_row(row) for row in reversed(rows)]
+        except Exception as e:
+            logger.error(f"Error getting recent messages: {e}")
+            return None
+    
+    def get_recent_history(self, user_id: int, conversation_id: str, limit: int,
+                           max_messages: Optional[int] = None) -> Optional[Dict]:
+        """
+        What the prompt needs from a conversation: its running summary, the
+        meaningful questions folded into it, and the last `limit` messages
+        together with any older ones not yet folded into the summary (at most
+        `max_messages` in all, default `limit`).
+        Two indexed lookups however long the conversation is.
+        """
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT summary, summary_seq, summary_questions FROM conversations WHERE id = ? AND user_id = ?",
+                    (conversation_id, user_id)
+                )
+                row = cursor.fetchone()
+                if row is None:
+                    return {"summary": "", "questions": [], "messages": []}
+                
+                cursor.execute("""
+                    SELECT role, content, timestamp FROM messages
+                    WHERE conversation_id = ?
+                      AND seq >= MIN(?, (SELECT COALESCE(MAX(seq), -1) + 1 FROM messages WHERE conversation_id = ?) - ?)
+                    ORDER BY seq DESC
+                    LIMIT ?
+                """, (conversation_id, row['summary_seq'], conversation_id, limit, max(limit, max_messages or 0)))
+                rows = cursor.fetchall()
+                
+                return {
+                    "summary": row['summary'],
+                    "questions": json.loads(row['summary_questions']),
+                    "messages": [self._message_from_row(r) for r in reversed(rows)]
+                }
+        except Exception as e:
+            logger.error(f"Error getting recent history: {e}")
+            return None
+    
+    def get_unsummarized_messages(self, user_id: int, conversation_id: str, keep_recent: int,
+                                  limit: int) -> Optional[Dict]:
+        """
+        Summary state plus up to `limit` messages that are neither summarized
+        nor among the last `keep_recent` (each message carries its `seq`)
+        """
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT summary, summary_seq, summary_questions FROM conversations WHERE id = ? AND user_id = ?",
+                    (conversation_id, user_id)
+                )
+                row = cursor.fetchone()
+                if row is None:
+                    return None
+                
+                cursor.execute("""
+                    SELECT seq, role, content, timestamp FROM messages
+                    WHERE conversation_id = ? AND seq >= ?
+                      AND seq < (SELECT COALESCE(MAX(seq), -1) + 1 FROM messages WHERE conversation_id = ?) - ?
+                    ORDER BY seq
+                    LIMIT ?
+                """, (conversation_id, row['summary_seq'], conversation_id, keep_recent, limit))
+                
+                return {
+                    "summary": row['summary'],
+                    "summary_seq": row['summary_seq'],
+                    "questions": json.loads(row['summary_questions']),
+                    "messages": [dict(self._message_from_row(r), seq=r['seq']) for r in cursor.fetchall()]
+                }
+        except Exception as e:
+            logger.error(f"Error getting unsummarized messages: {e}")
+            return None
+    
+    def update_conversation_summary(self, user_id: int, conversation_id: str, summary: str,
+                                    summary_seq: int, questions: List[str], expected_seq: int) -> bool:
+        """Store a new summary covering messages before `summary_seq`, unless another writer moved it first"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    UPDATE conversations SET summary = ?, summary_seq = ?, summary_questions = ?
+                    WHERE id = ? AND user_id = ? AND summary_seq = ?
+                """, (summary, summary_seq, json.dumps(questions), conversation_id, user_id, expected_seq))
+                return cursor.rowcount == 1
+        except Exception as e:
+            logger.error(f"Error updating conversation summary: {e}")
+            return False
+    
     def clear_conversation(self, user_id: int, conversation_id: str):
         """Delete a conversation"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                "DELETE FROM conversations WHERE id = ? AND user_id = ?",
-                (conversation_id, user_id)
-            )
-            conn.commit()
-            conn.close()
-            return True
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "DELETE FROM messages WHERE conversation_id IN "
+                    "(SELECT id FROM conversations WHERE id = ? AND user_id = ?)",
+                    (conversation_id, user_id)
+                )
+                cursor.execute(
+                    "DELETE FROM conversations WHERE id = ? AND user_id = ?",
+                    (conversation_id, user_id)
+                )
+                return True
         except Exception as e:
             logger.error(f"Error clearing conversation: {e}")
             return False
@@ -214,18 +494,21 @@ class Database:
     def cleanup_old_conversations(self, days: int = 1):
         """Clean up conversations older than specified days"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cutoff = datetime.utcnow() - timedelta(days=days)
-            cursor.execute(
-                "DELETE FROM conversations WHERE updated_at < ?",
-                (cutoff,)
-            )
-            deleted = cursor.rowcount
-            conn.commit()
-            conn.close()
-            logger.info(f"Cleaned up {deleted} old conversations")
-            return deleted
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cutoff = datetime.utcnow() - timedelta(days=days)
+                cursor.execute(
+                    "DELETE FROM messages WHERE conversation_id IN "
+                    "(SELECT id FROM conversations WHERE updated_at < ?)",
+                    (cutoff,)
+                )
+                cursor.execute(
+                    "DELETE FROM conversations WHERE updated_at < ?",
+                    (cutoff,)
+                )
+                deleted = cursor.rowcount
+                logger.info(f"Cleaned up {deleted} old conversations")
+                return deleted
         except Exception as e:
             logger.error(f"Error cleaning up conversations: {e}")
             return 0
@@ -251,64 +534,63 @@ class Database:
     ) -> Optional[int]:
         """Create or update user from Auth0 info with metadata"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Check if user exists by auth0_sub
-            cursor.execute("SELECT id FROM users WHERE auth0_sub = ?", (auth0_sub,))
-            existing = cursor.fetchone()
-            
-            if existing:
-                # Update existing user with all metadata (ALWAYS update name from Auth0)
-                user_id = existing['id']
-                logger.info(f"Updating existing user {user_id} with Auth0 data - name: {name}, email: {email}")
-                cursor.execute(
-                    """UPDATE users SET name = ?, email = ?, phone = ?, age = ?, 
-                       financial_goals = ?, income_range = ?, employment_status = ?, 
-                       marital_status = ?, dependents = ?, investment_experience = ?, 
-                       risk_tolerance = ?, education = ?, location = ?, username = ?,
-                       updated_at = CURRENT_TIMESTAMP 
-                       WHERE auth0_sub = ?""",
-                    (name, email, phone, age, financial_goals, income_range,
-                     employment_status, marital_status, dependents, investment_experience,
-                     risk_tolerance, education, location, username, auth0_sub)
-                )
-                logger.info(f"User {user_id} updated successfully - new name: {name}")
-            else:
-                # Check if user exists by email (for migration)
-                cursor.execute("SELECT id FROM users WHERE email = ?", (email,))
-                email_existing = cursor.fetchone()
+            with self.connection() as conn:
+                cursor = conn.cursor()
                 
-                if email_existing:
-                    # Update existing user with auth0_sub and metadata
-                    user_id = email_existing['id']
+                # Check if user exists by auth0_sub
+                cursor.execute("SELECT id FROM users WHERE auth0_sub = ?", (auth0_sub,))
+                existing = cursor.fetchone()
+                
+                if existing:
+                    # Update existing user with all metadata (ALWAYS update name from Auth0)
+                    user_id = existing['id']
+                    logger.info(f"Updating existing user {user_id} with Auth0 data - name: {name}, email: {email}")
                     cursor.execute(
-                        """UPDATE users SET auth0_sub = ?, name = ?, phone = ?, age = ?, 
+                        """UPDATE users SET name = ?, email = ?, phone = ?, age = ?, 
                            financial_goals = ?, income_range = ?, employment_status = ?, 
                            marital_status = ?, dependents = ?, investment_experience = ?, 
                            risk_tolerance = ?, education = ?, location = ?, username = ?,
                            updated_at = CURRENT_TIMESTAMP 
-                           WHERE email = ?""",
-                        (auth0_sub, name, phone, age, financial_goals, income_range,
+                           WHERE auth0_sub = ?""",
+                        (name, email, phone, age, financial_goals, income_range,
                          employment_status, marital_status, dependents, investment_experience,
-                         risk_tolerance, education, location, username, email)
+                         risk_tolerance, education, location, username, auth0_sub)
                     )
+                    logger.info(f"User {user_id} updated successfully - new name: {name}")
                 else:
-                    # Create new user with all metadata
-                    cursor.execute(
-                        """INSERT INTO users (auth0_sub, name, email, phone, age, 
-                           financial_goals, income_range, employment_status, 
-                           marital_status, dependents, investment_experience, risk_tolerance,
-                           education, location, username) 
-                           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                        (auth0_sub, name, email, phone, age, financial_goals, income_range,
-                         employment_status, marital_status, dependents, investment_experience,
-                         risk_tolerance, education, location, username)
-                    )
-                    user_id = cursor.lastrowid
+                    # Check if user exists by email (for migration)
+                    cursor.execute("SELECT id FROM users WHERE email = ?", (email,))
+                    email_existing = cursor.fetchone()
+                    
+                    if email_existing:
+                        # Update existing user with auth0_sub and metadata
+                        user_id = email_existing['id']
+                        cursor.execute(
+                            """UPDATE users SET auth0_sub = ?, name = ?, phone = ?, age = ?, 
+                               financial_goals = ?, income_range = ?, employment_status = ?, 
+                               marital_status = ?, dependents = ?, investment_experience = ?, 
+                               risk_tolerance = ?, education = ?, location = ?, username = ?,
+                               updated_at = CURRENT_TIMESTAMP 
+                               WHERE email = ?""",
+                            (auth0_sub, name, phone, age, financial_goals, income_range,
+                             employment_status, marital_status, dependents, investment_experience,
+                             risk_tolerance, education, location, username, email)
+                        )
+                    else:
+                        # Create new user with all metadata
+                        cursor.execute(
+                            """INSERT INTO users (auth0_sub, name, email, phone, age, 
+                               financial_goals, income_range, employment_status, 
+                               marital_status, dependents, investment_experience, risk_tolerance,
+                               education, location, username) 
+                               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                            (auth0_sub, name, email, phone, age, financial_goals, income_range,
+                             employment_status, marital_status, dependents, investment_experience,
+                             risk_tolerance, education, location, username)
+                        )
+                        user_id = cursor.lastrowid
             
-            conn.commit()
-            conn.close()
+            self.user_cache.invalidate(user_id=user_id, auth0_sub=auth0_sub)
             return user_id
         except Exception as e:
             logger.error(f"Error creating/updating user from Auth0: {e}")
@@ -316,19 +598,8 @@ class Database:
     
     def get_user_by_auth0_sub(self, auth0_sub: str) -> Optional[Dict]:
         """Get user by Auth0 sub (subject) identifier"""
-        try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM users WHERE auth0_sub = ?", (auth0_sub,))
-            row = cursor.fetchone()
-            conn.close()
-            
-            if row:
-                return dict(row)
-            return None
-        except Exception as e:
-            logger.error(f"Error getting user by auth0_sub: {e}")
-            return None
+        cached = self._get_cached_user(auth0_sub=auth0_sub)
+        return dict(cached.record) if cached else None
     
     def update_user_metadata(
         self,
@@ -345,49 +616,49 @@ class Database:
     ) -> bool:
         """Update user metadata"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            updates = []
-            values = []
-            
-            if age is not None:
-                updates.append("age = ?")
-                values.append(age)
-            if financial_goals is not None:
-                updates.append("financial_goals = ?")
-                values.append(financial_goals)
-            if income_range is not None:
-                updates.append("income_range = ?")
-                values.append(income_range)
-            if employment_status is not None:
-                updates.append("employment_status = ?")
-                values.append(employment_status)
-            if marital_status is not None:
-                updates.append("marital_status = ?")
-                values.append(marital_status)
-            if dependents is not None:
-                updates.append("dependents = ?")
-                values.append(dependents)
-            if investment_experience is not None:
-                updates.append("investment_experience = ?")
-                values.append(investment_experience)
-            if risk_tolerance is not None:
-                updates.append("risk_tolerance = ?")
-                values.append(risk_tolerance)
-            if metadata is not None:
-                updates.append("metadata = ?")
-                values.append(metadata)
-            
-            if updates:
-                updates.append("updated_at = CURRENT_TIMESTAMP")
-                values.append(user_id)
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                
+                updates = []
+                values = []
                 
-                query = f"UPDATE users SET {', '.join(updates)} WHERE id = ?"
-                cursor.execute(query, values)
-                conn.commit()
+                if age is not None:
+                    updates.append("age = ?")
+                    values.append(age)
+                if financial_goals is not None:
+                    updates.append("financial_goals = ?")
+                    values.append(financial_goals)
+                if income_range is not None:
+                    updates.append("income_range = ?")
+                    values.append(income_range)
+                if employment_status is not None:
+                    updates.append("employment_status = ?")
+                    values.append(employment_status)
+                if marital_status is not None:
+                    updates.append("marital_status = ?")
+                    values.append(marital_status)
+                if dependents is not None:
+                    updates.append("dependents = ?")
+                    values.append(dependents)
+                if investment_experience is not None:
+                    updates.append("investment_experience = ?")
+                    values.append(investment_experience)
+                if risk_tolerance is not None:
+                    updates.append("risk_tolerance = ?")
+                    values.append(risk_tolerance)
+                if metadata is not None:
+                    updates.append("metadata = ?")
+                    values.append(metadata)
+                
+                if updates:
+                    updates.append("updated_at = CURRENT_TIMESTAMP")
+                    values.append(user_id)
+                    
+                    query = f"UPDATE users SET {', '.join(updates)} WHERE id = ?"
+                    cursor.execute(query, values)
             
-            conn.close()
+            if updates:
+                self.user_cache.invalidate(user_id=user_id)
             return True
         except Exception as e:
             logger.error(f"Error updating user metadata: {e}")
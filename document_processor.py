@@ -1,30 +1,96 @@
 import os
+import time
 import PyPDF2
 from docx import Document
 from openpyxl import load_workbook
-from typing import List, Dict
+from typing import Iterator, List, Dict, Optional
 from pathlib import Path
 import logging
 
+from chunking import (
+    CHUNK_OVERLAP, CHUNK_SIZE, TextSegment, chunk_segments, chunk_segments_by_tokens, get_tokenizer
+)
+from config import Config
+from extraction_pool import extract_in_processes
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.doc', '.xlsx', '.xls')
+
 
 class DocumentProcessor:
     """Processes various document formats and extracts text for embedding"""
     
-    def __init__(self, knowledge_base_path: str):
+    def __init__(self, knowledge_base_path: str, workers: Optional[int] = None,
+                 timeout: Optional[float] = None, chunking: Optional[str] = None,
+                 chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP):
         self.knowledge_base_path = Path(knowledge_base_path)
+        # "tokens": model-tokenizer chunks on sentence boundaries; "chars": legacy 500/50 windows
+        self.chunking = Config.CHUNKING if chunking is None else chunking
+        if self.chunking not in ("tokens", "chars"):
+            raise ValueError(f"Unknown chunking strategy: {self.chunking!r} (expected 'tokens' or 'chars')")
+        # Loaded here, in the parent, and pickled to the extraction workers with the processor, so
+        # workers never download it and every file is chunked the same way; fails loudly if unavailable
+        self.tokenizer = self._load_tokenizer() if self.chunking == "tokens" else None
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        # workers=0 extracts in-process (no per-file timeout)
+        self.workers = Config.EXTRACTION_WORKERS if workers is None else workers
+        self.timeout = Config.EXTRACTION_TIMEOUT if timeout is None else timeout
+        # Per-file {"filename", "seconds", "status"} from the last process_files call
+        self.last_timings: List[Dict] = []
+    
+    def iter_pdf_segments(self, file_path: Path) -> Iterator[TextSegment]:
+        """Yield one segment per PDF page (pages are parsed lazily)"""
+        with open(file_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            for page_number, page in enumerate(pdf_reader.pages, start=1):
+                yield TextSegment(page.extract_text() + "\n", page=page_number)
+    
+    def iter_docx_segments(self, file_path: Path) -> Iterator[TextSegment]:
+        """Yield one segment per DOCX paragraph"""
+        doc = Document(file_path)
+        for index, paragraph in enumerate(doc.paragraphs):
+            # Paragraphs are newline-separated, not newline-terminated
+            yield TextSegment(("\n" if index else "") + paragraph.text, paragraph=index)
+    
+    def iter_xlsx_segments(self, file_path: Path) -> Iterator[TextSegment]:
+        """Yield a header segment per sheet and one segment per row (read-only streaming mode)"""
+        workbook = load_workbook(file_path, read_only=True)
+        try:
+            for sheet_name in workbook.sheetnames:
+                sheet = workbook[sheet_name]
+                yield TextSegment(f"\n=== Sheet: {sheet_name} ===\n", sheet=sheet_name)
+                # Unsized read-only sheets can report trailing blank rows;
+                # hold blank rows back until more data follows
+                blank_rows = []
+                for row_number, row in enumerate(sheet.iter_rows(values_only=True), start=1):
+                    row_text = " | ".join([str(cell) if cell else "" for cell in row])
+                    if all(cell is None for cell in row):
+                        blank_rows.append(TextSegment(row_text + "\n", sheet=sheet_name, row=row_number))
+                        continue
+                    yield from blank_rows
+                    blank_rows = []
+                    yield TextSegment(row_text + "\n", sheet=sheet_name, row=row_number)
+        finally:
+            workbook.close()
+    
+    def iter_segments(self, file_path: Path) -> Optional[Iterator[TextSegment]]:
+        """Segment iterator for a supported file, or None for unsupported types"""
+        file_ext = file_path.suffix.lower()
+        if file_ext == '.pdf':
+            return self.iter_pdf_segments(file_path)
+        elif file_ext == '.docx' or file_ext == '.doc':
+            return self.iter_docx_segments(file_path)
+        elif file_ext == '.xlsx' or file_ext == '.xls':
+            return self.iter_xlsx_segments(file_path)
+        return None
     
     def extract_text_from_pdf(self, file_path: Path) -> str:
         """Extract text from PDF file"""
         try:
-            text = ""
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-            return text
+            return "".join(segment.text for segment in self.iter_pdf_segments(file_path))
         except Exception as e:
             logger.error(f"Error extracting text from PDF {file_path}: {e}")
             return ""
@@ -32,9 +98,7 @@ class DocumentProcessor:
     def extract_text_from_docx(self, file_path: Path) -> str:
         """Extract text from DOCX file"""
         try:
-            doc = Document(file_path)
-            text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-            return text
+            return "".join(segment.text for segment in self.iter_docx_segments(file_path))
         except Exception as e:
             logger.error(f"Error extracting text from DOCX {file_path}: {e}")
             return ""
@@ -42,59 +106,121 @@ class DocumentProcessor:
     def extract_text_from_xlsx(self, file_path: Path) -> str:
         """Extract text from XLSX file"""
         try:
-            workbook = load_workbook(file_path)
-            text = ""
-            for sheet_name in workbook.sheetnames:
-                sheet = workbook[sheet_name]
-                text += f"\n=== Sheet: {sheet_name} ===\n"
-                for row in sheet.iter_rows(values_only=True):
-                    row_text = " | ".join([str(cell) if cell else "" for cell in row])
-                    text += row_text + "\n"
-            return text
+            return "".join(segment.text for segment in self.iter_xlsx_segments(file_path))
         except Exception as e:
             logger.error(f"Error extracting text from XLSX {file_path}: {e}")
             return ""
     
-    def process_document(self, file_path: Path) -> Dict[str, str]:
-        """Process a document and return its content"""
+    def process_document(self, file_path: Path) -> Dict:
+        """
+        Extract and chunk a document; returns its chunks with source positions.
+        
+        Returns None for an unsupported or empty file. A parse error is raised,
+        not swallowed, so callers can tell a broken file from an empty one and
+        keep its existing chunks.
+        """
         file_ext = file_path.suffix.lower()
         file_name = file_path.name
         
-        text = ""
-        if file_ext == '.pdf':
-            text = self.extract_text_from_pdf(file_path)
-        elif file_ext == '.docx' or file_ext == '.doc':
-            text = self.extract_text_from_docx(file_path)
-        elif file_ext == '.xlsx' or file_ext == '.xls':
-            text = self.extract_text_from_xlsx(file_path)
-        else:
+        segments = self.iter_segments(file_path)
+        if segments is None:
             logger.warning(f"Unsupported file type: {file_ext}")
             return None
         
-        if not text.strip():
+        chunks = [
+            {"text": text, **position}
+            for text, position in self.chunk(segments)
+        ]
+        
+        if not chunks:
             logger.warning(f"No text extracted from {file_name}")
             return None
         
         return {
             "filename": file_name,
-            "content": text,
+            "chunks": chunks,
             "file_path": str(file_path)
         }
     
-    def process_all_documents(self) -> List[Dict[str, str]]:
-        """Process all documents in the knowledge base directory"""
-        documents = []
-        
+    def _load_tokenizer(self):
+        try:
+            return get_tokenizer(Config.EMBEDDING_MODEL)
+        except Exception as e:
+            raise RuntimeError(
+                f"CHUNKING=tokens needs the {Config.EMBEDDING_MODEL} tokenizer, which could not be loaded "
+                f"({e}); install `tokenizers` and allow the download, or set CHUNKING=chars"
+            ) from e
+    
+    def chunk(self, segments: Iterator[TextSegment]) -> Iterator:
+        """Chunk a segment stream with the configured strategy"""
+        if self.chunking == "tokens":
+            return chunk_segments_by_tokens(
+                segments, self.tokenizer, Config.CHUNK_TOKENS, Config.CHUNK_OVERLAP_TOKENS
+            )
+        return chunk_segments(segments, self.chunk_size, self.chunk_overlap)
+    
+    def chunking_settings(self) -> Dict:
+        """Settings that determine chunk boundaries (a change means every file must be re-chunked)"""
+        if self.chunking == "tokens":
+            return {
+                "strategy": "tokens",
+                "model": Config.EMBEDDING_MODEL,
+                "max_tokens": Config.CHUNK_TOKENS,
+                "overlap_tokens": Config.CHUNK_OVERLAP_TOKENS,
+            }
+        return {"strategy": "chars", "chunk_size": self.chunk_size, "chunk_overlap": self.chunk_overlap}
+    
+    def list_documents(self) -> List[Path]:
+        """Supported files in the knowledge base directory, sorted by name"""
         if not self.knowledge_base_path.exists():
             logger.error(f"Knowledge base path does not exist: {self.knowledge_base_path}")
-            return documents
+            return []
         
-        for file_path in self.knowledge_base_path.iterdir():
-            if file_path.is_file():
-                logger.info(f"Processing document: {file_path.name}")
-                doc_data = self.process_document(file_path)
-                if doc_data:
-                    documents.append(doc_data)
+        return sorted(
+            file_path for file_path in self.knowledge_base_path.iterdir()
+            if file_path.is_file() and file_path.suffix.lower() in SUPPORTED_EXTENSIONS
+        )
+    
+    def process_files(self, file_paths: List[Path]) -> List[Optional[Dict[str, str]]]:
+        """
+        Extract files (on a process pool when workers > 0); results align with file_paths.
+        
+        Failed files yield None like empty ones; last_timings tells them apart
+        ("ok", "empty", "timeout" or "error: ...").
+        """
+        start = time.perf_counter()
+        if self.workers > 0 and file_paths:
+            results, timings = extract_in_processes(
+                self.process_document, file_paths, self.workers, self.timeout
+            )
+        else:
+            results, timings = [], []
+            for file_path in file_paths:
+                file_start = time.perf_counter()
+                try:
+                    doc_data, status = self.process_document(file_path), None
+                except Exception as e:
+                    logger.error(f"Error extracting text from {file_path.name}: {e}")
+                    doc_data, status = None, f"error: {e}"
+                results.append(doc_data)
+                timings.append({
+                    "filename": file_path.name,
+                    "seconds": round(time.perf_counter() - file_start, 3),
+                    "status": status or ("ok" if doc_data else "empty"),
+                })
+        
+        for timing in timings:
+            logger.info(f"Extracted {timing['filename']} in {timing['seconds']}s ({timing['status']})")
+        logger.info(
+            f"Extracted {len(file_paths)} files in {time.perf_counter() - start:.2f}s "
+            f"using {self.workers or 'no'} worker processes"
+        )
+        self.last_timings = timings
+        return results
+    
+    def process_all_documents(self) -> List[Dict[str, str]]:
+        """Process all documents in the knowledge base directory"""
+        documents = [doc_data for doc_data in self.process_files(self.list_documents()) if doc_data]
         
         logger.info(f"Processed {len(documents)} documents")
         return documents
@@ -0,0 +1,65 @@
+"""
+Batched embedding for ingestion, optionally across worker processes.
+
+`BatchEmbedder` embeds a list of chunk texts in fixed-size batches, either
+in-process with the vector store's embedding function or on a
+sentence-transformers multi-process pool (one model copy per process), so
+re-indexing can use every core instead of one.
+"""
+import logging
+import math
+from typing import Callable, List, Optional, Sequence
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class BatchEmbedder:
+    """Embeds text batches in-process or on a sentence-transformers process pool"""
+
+    def __init__(self, embedding_function: Callable[[List[str]], Sequence], model_name: str,
+                 processes: int = 0):
+        self.embedding_function = embedding_function
+        self.processes = processes
+        self._model = None
+        self._pool = None
+        if processes > 0:
+            # Imported lazily: only ingestion with EMBEDDING_PROCESSES > 0 needs it
+            from sentence_transformers import SentenceTransformer
+            # Same model and settings (no normalization) as the query-side embedding function
+            self._model = SentenceTransformer(model_name, device="cpu")
+            self._pool = self._model.start_multi_process_pool(target_devices=["cpu"] * processes)
+            logger.info(f"Started {processes} embedding worker processes for {model_name}")
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed one batch of texts"""
+        if self._pool is None:
+            return [
+                embedding.tolist() if hasattr(embedding, "tolist") else list(embedding)
+                for embedding in self.embedding_function(texts)
+            ]
+        embeddings = self._model.encode_multi_process(
+            texts, self._pool, chunk_size=max(1, math.ceil(len(texts) / self.processes))
+        )
+        return embeddings.tolist()
+
+    def close(self):
+        if self._pool is not None:
+            self._model.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+    def __enter__(self) -> "BatchEmbedder":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def max_upsert_batch(client, default: int) -> int:
+    """Largest batch the Chroma client accepts, capped at `default`"""
+    get_max = getattr(client, "get_max_batch_size", None)
+    try:
+        limit: Optional[int] = get_max() if get_max else getattr(client, "max_batch_size", None)
+    except Exception:
+        limit = None
+    return min(default, limit) if limit else default
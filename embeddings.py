@@ -0,0 +1,139 @@
+"""
+Embedding backends for chunks and queries.
+
+`SentenceTransformerEmbedder` runs the model on PyTorch (the original
+setup). `OnnxEmbedder` runs the ONNX export of the same model on ONNX
+Runtime with the model's fast tokenizer, mean pooling and normalization,
+so it never imports torch; it can also run a dynamically int8-quantized
+copy of the model. Both produce vectors compatible with one index (see
+benchmarks/embedding_backends.py for the tolerance check) and follow
+Chroma's embedding-function protocol (`__call__(input)`).
+"""
+import logging
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from config import Config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _repo_id(model_name: str) -> str:
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+class SentenceTransformerEmbedder:
+    """sentence-transformers model on PyTorch (CPU)"""
+
+    backend = "sentence-transformers"
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.name = f"{self.backend}:{model_name}"
+        self._model = SentenceTransformer(model_name, device="cpu")
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        return self._model.encode(list(input), convert_to_numpy=True).tolist()
+
+
+class OnnxEmbedder:
+    """ONNX Runtime export of a sentence-transformers model (mean pooling + L2 normalization)"""
+
+    backend = "onnx"
+
+    def __init__(self, model_name: str, model_path: Optional[str] = None, quantized: bool = False,
+                 threads: int = 0, max_length: int = 256, batch_size: int = 64):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        self.quantized = quantized
+        self.name = f"{self.backend}{'-int8' if quantized else ''}:{model_name}"
+        self.batch_size = batch_size
+
+        repo_id = _repo_id(model_name)
+        path = Path(model_path) if model_path else self._download(repo_id)
+        if quantized:
+            path = self._quantize(path)
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self._session = onnxruntime.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        self._input_names = {model_input.name for model_input in self._session.get_inputs()}
+
+        # Own instance: the chunker's tokenizer must not truncate or pad
+        self._tokenizer = Tokenizer.from_pretrained(repo_id)
+        self._tokenizer.enable_truncation(max_length)
+        self._tokenizer.enable_padding(pad_id=self._tokenizer.token_to_id("[PAD]") or 0)
+        logger.info(f"Loaded ONNX embedding model {path}")
+
+    @staticmethod
+    def _download(repo_id: str) -> Path:
+        """The model's ONNX export from the Hugging Face Hub (cached after the first call)"""
+        from huggingface_hub import hf_hub_download
+
+        return Path(hf_hub_download(repo_id, "onnx/model.onnx"))
+
+    @staticmethod
+    def _quantize(path: Path) -> Path:
+        """Dynamically int8-quantized copy of the model, created next to it once"""
+        target = path.with_name(f"{path.stem}_int8.onnx")
+        if not target.exists():
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            staging = target.with_suffix(".onnx.tmp")
+            quantize_dynamic(str(path), str(staging), weight_type=QuantType.QInt8)
+            staging.replace(target)
+            logger.info(f"Quantized {path.name} to {target}")
+        return target
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        texts = list(input)
+        if not texts:
+            return []
+        # Length-sorted batches keep padding (wasted compute) to a minimum
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        embeddings = np.empty((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(texts), self.batch_size):
+            rows = order[start:start + self.batch_size]
+            batch = self._embed_batch([texts[i] for i in rows])
+            if not embeddings.shape[1]:
+                embeddings = np.empty((len(texts), batch.shape[1]), dtype=np.float32)
+            embeddings[rows] = batch
+        return embeddings.tolist()
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self._tokenizer.encode_batch(texts)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": attention_mask,
+        }
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+        token_embeddings = self._session.run(None, feeds)[0]
+
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+
+def create_embedding_function(model_name: str, backend: Optional[str] = None):
+    """Embedding function for `backend` (default Config.EMBEDDING_BACKEND)"""
+    backend = backend or Config.EMBEDDING_BACKEND
+    if backend == "onnx":
+        return OnnxEmbedder(
+            model_name,
+            model_path=Config.EMBEDDING_ONNX_PATH or None,
+            quantized=Config.EMBEDDING_QUANTIZED,
+            threads=Config.EMBEDDING_THREADS,
+        )
+    if backend != "sentence-transformers":
+        logger.warning(f"Unknown embedding backend {backend!r}, using sentence-transformers")
+    return SentenceTransformerEmbedder(model_name)
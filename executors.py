@@ -0,0 +1,85 @@
+"""
+Bounded thread pools that keep blocking work off the asyncio event loop.
+
+Each class of work gets its own executor so slow outbound requests cannot
+starve database reads, and a burst of retrievals cannot starve either
+(Gemini calls are async and need no thread, see llm_client):
+
+- ``db``: SQLite reads/writes
+- ``retrieval``: query embedding and vector search
+- ``http``: blocking outbound HTTP (web search, JWKS)
+"""
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, TypeVar
+
+from config import Config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_POOL_SIZES = {
+    "db": Config.DB_EXECUTOR_WORKERS,
+    "retrieval": Config.RETRIEVAL_EXECUTOR_WORKERS,
+    "http": Config.HTTP_EXECUTOR_WORKERS,
+}
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+
+
+def get_executor(name: str) -> ThreadPoolExecutor:
+    """Get (lazily creating) the named executor"""
+    executor = _executors.get(name)
+    if executor is None:
+        if name not in _POOL_SIZES:
+            raise ValueError(f"Unknown executor: {name}")
+        executor = ThreadPoolExecutor(
+            max_workers=_POOL_SIZES[name],
+            thread_name_prefix=f"{name}-pool"
+        )
+        _executors[name] = executor
+        logger.info(f"Started '{name}' executor with {_POOL_SIZES[name]} workers")
+    return executor
+
+
+async def run_in_executor(name: str, func: Callable[..., T], *args, **kwargs) -> T:
+    """Run a blocking callable on the named executor and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(name), functools.partial(func, *args, **kwargs))
+
+
+async def run_db(func: Callable[..., T], *args, **kwargs) -> T:
+    """Run a blocking database call"""
+    return await run_in_executor("db", func, *args, **kwargs)
+
+
+async def run_retrieval(func: Callable[..., T], *args, **kwargs) -> T:
+    """Run a blocking embedding / vector search call"""
+    return await run_in_executor("retrieval", func, *args, **kwargs)
+
+
+async def run_http(func: Callable[..., T], *args, **kwargs) -> T:
+    """Run a blocking outbound HTTP call"""
+    return await run_in_executor("http", func, *args, **kwargs)
+
+
+def executor_stats() -> Dict[str, Dict]:
+    """Report configured size and current queue depth of each started executor"""
+    return {
+        name: {
+            "max_workers": executor._max_workers,
+            "queued": executor._work_queue.qsize(),
+        }
+        for name, executor in _executors.items()
+    }
+
+
+def shutdown_executors(wait: bool = True):
+    """Shut down all executors (used on application shutdown)"""
+    for executor in _executors.values():
+        executor.shutdown(wait=wait)
+    _executors.clear()
@@ -0,0 +1,140 @@
+"""
+Process pool for CPU-bound document extraction with per-file timeouts.
+
+PyPDF2 is pure Python, so extraction only scales across processes. Each
+worker handles one file at a time; a worker that exceeds the per-file
+timeout (a pathological PDF) is killed and replaced, and that file is
+reported as timed out instead of hanging the run. Results are returned in
+input order regardless of completion order.
+"""
+import logging
+import multiprocessing
+import time
+from collections import deque
+from multiprocessing.connection import wait
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Workers are spawned, not forked: the parent may hold threads (embedding
+# model, executors) whose locks a forked child would inherit
+_context = multiprocessing.get_context("spawn")
+
+
+def _worker_loop(conn, extract: Callable[[Path], Optional[Dict]]):
+    """Worker process: extract files sent over `conn` until told to stop"""
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        index, path = task
+        start = time.perf_counter()
+        try:
+            result, status = extract(Path(path)), None
+        except Exception as e:
+            logger.error(f"Error extracting text from {Path(path).name}: {e}")
+            result, status = None, f"error: {e}"
+        conn.send((index, result, status, time.perf_counter() - start))
+
+
+class _Worker:
+    """One worker process and the task it is currently running"""
+
+    def __init__(self, extract: Callable[[Path], Optional[Dict]]):
+        self.conn, child_conn = _context.Pipe()
+        self.process = _context.Process(target=_worker_loop, args=(child_conn, extract), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.task: Optional[Tuple[int, Path]] = None
+        self.started = 0.0
+
+    def submit(self, index: int, path: Path):
+        self.task = (index, path)
+        self.started = time.perf_counter()
+        self.conn.send((index, str(path)))
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=1)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+def extract_in_processes(extract: Callable[[Path], Optional[Dict]], file_paths: List[Path],
+                         workers: int, timeout: float) -> Tuple[List[Optional[Dict]], List[Dict]]:
+    """
+    Run `extract` (a picklable callable) over `file_paths` on `workers` processes.
+
+    Returns (results, timings): results align with `file_paths` (None for
+    failed, empty or timed-out files) and timings hold one
+    {"filename", "seconds", "status"} entry per file in the same order.
+    """
+    results: List[Optional[Dict]] = [None] * len(file_paths)
+    timings: List[Optional[Dict]] = [None] * len(file_paths)
+    pending = deque(enumerate(file_paths))
+    idle = [_Worker(extract) for _ in range(min(workers, len(file_paths)))]
+    busy: Dict[object, _Worker] = {}
+
+    def finish(index: int, result: Optional[Dict], status: Optional[str], seconds: float):
+        results[index] = result
+        timings[index] = {
+            "filename": file_paths[index].name,
+            "seconds": round(seconds, 3),
+            "status": status or ("ok" if result else "empty"),
+        }
+
+    try:
+        while pending or busy:
+            while pending and idle:
+                worker = idle.pop()
+                index, path = pending.popleft()
+                worker.submit(index, path)
+                busy[worker.conn] = worker
+
+            now = time.perf_counter()
+            next_deadline = min(w.started + timeout for w in busy.values())
+            for conn in wait(list(busy), timeout=max(0.0, next_deadline - now)):
+                worker = busy.pop(conn)
+                try:
+                    finish(*conn.recv())
+                    worker.task = None
+                    idle.append(worker)
+                except (EOFError, OSError):
+                    # Worker died mid-file (e.g. segfault in a parser)
+                    index, path = worker.task
+                    logger.error(f"Extraction worker crashed on {path.name}")
+                    finish(index, None, "error: worker crashed", time.perf_counter() - worker.started)
+                    worker.kill()
+                    if pending:
+                        idle.append(_Worker(extract))
+
+            now = time.perf_counter()
+            for conn, worker in list(busy.items()):
+                if now - worker.started >= timeout:
+                    index, path = worker.task
+                    logger.error(f"Extraction of {path.name} timed out after {timeout}s, killing worker")
+                    finish(index, None, "timeout", now - worker.started)
+                    del busy[conn]
+                    worker.kill()
+                    if pending:
+                        idle.append(_Worker(extract))
+    finally:
+        for worker in idle:
+            worker.stop()
+        for worker in busy.values():
+            worker.kill()
+
+    return results, timings
@@ -0,0 +1,185 @@
+"""
+Incremental knowledge-base ingestion.
+
+A JSON manifest next to the vector store records, per source file, its
+content hash and the chunk ids it produced. Each run only extracts and
+embeds files whose hash changed, upserts their chunks, and deletes chunks
+that no longer exist (shortened or removed files).
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "ingest_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def file_sha256(file_path: Path, block_size: int = 1 << 20) -> str:
+    """Hex SHA-256 of a file's bytes"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestionManifest:
+    """Per-file hash and chunk ids of everything currently in the vector store"""
+
+    def __init__(self, path: Path, files: Optional[Dict[str, Dict]] = None,
+                 settings: Optional[Dict] = None):
+        self.path = Path(path)
+        self.files: Dict[str, Dict] = files or {}
+        # Chunking settings the recorded chunks were built with
+        self.settings: Dict = settings or {}
+
+    @classmethod
+    def load(cls, vector_db_path: str) -> "IngestionManifest":
+        """Load the manifest stored in the vector DB directory (empty if missing or unreadable)"""
+        path = Path(vector_db_path) / MANIFEST_FILE
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                return cls(path, data.get("files", {}), data.get("settings", {}))
+            logger.warning(f"Ignoring manifest {path} with unknown version {data.get('version')}")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read manifest {path}: {e}")
+        return cls(path)
+
+    def save(self):
+        """Write the manifest atomically"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(
+                {"version": MANIFEST_VERSION, "settings": self.settings, "files": self.files},
+                f, indent=2, sort_keys=True
+            )
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        self.files = {}
+
+    def is_unchanged(self, filename: str, stat: os.stat_result) -> bool:
+        """Cheap check: same size and mtime as when the file was last hashed"""
+        entry = self.files.get(filename)
+        return (
+            entry is not None and
+            not entry.get("stale") and
+            entry.get("size") == stat.st_size and
+            entry.get("mtime_ns") == stat.st_mtime_ns
+        )
+
+    def record(self, filename: str, sha256: str, stat: os.stat_result, chunk_ids):
+        self.files[filename] = {
+            "sha256": sha256,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "chunk_ids": list(chunk_ids),
+        }
+
+    def mark_stale(self, filename: str):
+        """Keep an entry (and its chunks) whose re-extraction failed, but re-process it next run"""
+        entry = self.files.get(filename)
+        if entry is not None:
+            entry["stale"] = True
+
+
+def sync_knowledge_base(processor, vector_store, manifest: IngestionManifest) -> Dict:
+    """
+    Bring the vector store in line with the knowledge base directory.
+
+    Returns counts of added / updated / unchanged / removed / failed files and of
+    upserted / deleted chunks, plus the elapsed time.
+    """
+    start = time.perf_counter()
+    stats = {
+        "added": 0, "updated": 0, "unchanged": 0, "removed": 0,
+        "failed": 0, "chunks_upserted": 0, "chunks_deleted": 0,
+    }
+
+    settings = processor.chunking_settings()
+    rechunk = bool(manifest.files) and manifest.settings != settings
+    if rechunk:
+        logger.info(f"Chunking settings changed ({manifest.settings} -> {settings}), re-chunking every file")
+    elif manifest.files and vector_store.get_collection_info()["document_count"] == 0:
+        # Manifest outlived its index (e.g. VECTOR_BACKEND switched): rebuild from scratch
+        logger.info("Vector index is empty but the manifest lists files, re-ingesting every file")
+        rechunk = True
+    manifest.settings = settings
+
+    seen = set()
+    changed = []
+    for file_path in processor.list_documents():
+        filename = file_path.name
+        seen.add(filename)
+        stat = file_path.stat()
+
+        if not rechunk and manifest.is_unchanged(filename, stat):
+            stats["unchanged"] += 1
+            continue
+
+        sha256 = file_sha256(file_path)
+        entry = manifest.files.get(filename)
+        if not rechunk and entry is not None and not entry.get("stale") and entry["sha256"] == sha256:
+            # Touched but identical: refresh size/mtime so the next run skips hashing
+            manifest.record(filename, sha256, stat, entry["chunk_ids"])
+            stats["unchanged"] += 1
+            continue
+
+        logger.info(f"{'Updating' if entry else 'Adding'} document: {filename}")
+        changed.append((file_path, sha256, stat))
+
+    # Extraction is the CPU-heavy part, so all changed files go through the pool at once
+    documents = processor.process_files([file_path for file_path, _, _ in changed])
+    extracted = []
+    for (file_path, sha256, stat), doc_data, timing in zip(changed, documents, processor.last_timings):
+        if timing["status"] not in ("ok", "empty"):
+            # Timed out, crashed or failed to parse: keep the old chunks and manifest entry, and mark
+            # the entry so the next run retries it even if the file (and the settings) stay the same
+            logger.warning(f"Skipping {file_path.name}: extraction {timing['status']}")
+            manifest.mark_stale(file_path.name)
+            stats["failed"] += 1
+            continue
+        extracted.append((file_path.name, sha256, stat, doc_data))
+
+    # All of the run's writes are saved together (once, for the NumPy index)
+    with vector_store.write_batch():
+        # One upsert for every changed file keeps embedding batches full
+        new_chunk_ids = vector_store.upsert_documents([doc_data for _, _, _, doc_data in extracted if doc_data])
+        for filename, sha256, stat, doc_data in extracted:
+            entry = manifest.files.get(filename)
+            new_ids = new_chunk_ids.get(filename, [])
+            old_ids = entry["chunk_ids"] if entry else []
+            stale_ids = sorted(set(old_ids) - set(new_ids))
+            vector_store.delete_chunks(stale_ids)
+
+            manifest.record(filename, sha256, stat, new_ids)
+            stats["updated" if entry else "added"] += 1
+            stats["chunks_upserted"] += len(new_ids)
+            stats["chunks_deleted"] += len(stale_ids)
+
+        for filename in sorted(set(manifest.files) - seen):
+            logger.info(f"Removing deleted document: {filename}")
+            old_ids = manifest.files.pop(filename)["chunk_ids"]
+            vector_store.delete_chunks(old_ids)
+            stats["removed"] += 1
+            stats["chunks_deleted"] += len(old_ids)
+
+    manifest.save()
+    if stats["added"] or stats["updated"] or stats["removed"] or not vector_store.has_lexical_index():
+        vector_store.rebuild_lexical_index()
+        vector_store.bump_knowledge_base_version()
+
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    return stats
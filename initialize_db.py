@@ -1,48 +1,53 @@
 """
 Script to initialize the vector database with knowledge base documents
-Run this once to populate the vector database
+Run it again after changing the knowledge base: only new or changed files
+are re-embedded and chunks of removed files are deleted (--full rebuilds)
 """
+import argparse
 import logging
 from config import Config
 from document_processor import DocumentProcessor
+from ingestion import IngestionManifest, sync_knowledge_base
 from vector_store import VectorStore
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def initialize_vector_db():
-    """Initialize vector database with knowledge base documents"""
+def initialize_vector_db(full: bool = False):
+    """Initialize or incrementally update the vector database from the knowledge base"""
     logger.info("Starting vector database initialization...")
     
     # Initialize document processor
     processor = DocumentProcessor(Config.KNOWLEDGE_BASE_PATH)
     
-    # Process all documents
-    logger.info(f"Processing documents from {Config.KNOWLEDGE_BASE_PATH}")
-    documents = processor.process_all_documents()
-    
-    if not documents:
-        logger.warning("No documents found to process")
-        return
-    
     # Initialize vector store
     logger.info(f"Initializing vector store at {Config.VECTOR_DB_PATH}")
     vector_store = VectorStore(
         db_path=Config.VECTOR_DB_PATH,
         embedding_model=Config.EMBEDDING_MODEL
     )
+    manifest = IngestionManifest.load(Config.VECTOR_DB_PATH)
     
-    # Clear existing collection (optional - comment out if you want to add to existing)
-    # vector_store.delete_collection()
-    # vector_store = VectorStore(
-    #     db_path=Config.VECTOR_DB_PATH,
-    #     embedding_model=Config.EMBEDDING_MODEL
-    # )
+    if full:
+        # Drop everything and re-ingest every file
+        logger.info("Full rebuild requested, clearing existing collection")
+        vector_store.delete_collection()
+        vector_store = VectorStore(
+            db_path=Config.VECTOR_DB_PATH,
+            embedding_model=Config.EMBEDDING_MODEL
+        )
+        manifest.clear()
     
-    # Add documents to vector store
-    logger.info("Adding documents to vector store...")
-    vector_store.add_documents(documents)
+    # Extract, embed and upsert only what changed since the last run
+    logger.info(f"Syncing documents from {Config.KNOWLEDGE_BASE_PATH}")
+    stats = sync_knowledge_base(processor, vector_store, manifest)
+    logger.info(
+        f"Files: {stats['added']} added, {stats['updated']} updated, "
+        f"{stats['unchanged']} unchanged, {stats['removed']} removed, {stats['failed']} failed; "
+        f"chunks: {stats['chunks_upserted']} upserted, {stats['chunks_deleted']} deleted "
+        f"({stats['seconds']}s)"
+    )
     
     # Get collection info
     info = vector_store.get_collection_info()
@@ -51,10 +56,12 @@ def initialize_vector_db():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Populate the vector database from the knowledge base")
+    parser.add_argument("--full", action="store_true", help="delete the collection and re-ingest every file")
+    args = parser.parse_args()
     try:
         Config.validate()
-        initialize_vector_db()
+        initialize_vector_db(full=args.full)
     except Exception as e:
         logger.error(f"Error initializing vector database: {e}")
         raise
-
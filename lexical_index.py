@@ -0,0 +1,211 @@
+"""
+Compact BM25 inverted index over the vector store's chunks.
+
+Dense MiniLM embeddings match exact terms ("401(k)", "Roth", "1-800",
+"FICO") poorly, so retrieval fuses them with lexical BM25 scores. Postings
+are stored CSR-style in flat NumPy arrays (term offsets, chunk indexes,
+term frequencies), saved as .npy files next to the vector DB and
+memory-mapped at load, so opening the index is cheap and its pages are
+shared between worker processes. Each save writes a new generation
+directory and then atomically replaces the pointer file naming it.
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = "bm25"
+# Names the generation directory (inside INDEX_DIR) readers should load
+POINTER_FILE = "current.json"
+
+_WORD = re.compile(r"[a-z0-9]+")
+# Terms written with inner punctuation: 401(k), 1-800, w-2, u.s.
+_COMPOUND = re.compile(r"[a-z0-9]+(?:[-()'./]+[a-z0-9]+)+\)?")
+# Compound parts combined into sub-runs (longer compounds also keep their full joined form)
+MAX_COMPOUND_PARTS = 6
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased alphanumeric words, plus punctuation-free forms of compound
+    terms and of every run of adjacent parts in them, so 1-800-799-7233
+    gives 1800, 800799, 1800799, ... 18007997233 and a query for "1-800"
+    matches it as one term
+    """
+    text = text.lower()
+    terms = _WORD.findall(text)
+    for compound in _COMPOUND.findall(text):
+        parts = _WORD.findall(compound)
+        runs = parts[:MAX_COMPOUND_PARTS]
+        for start in range(len(runs) - 1):
+            for end in range(start + 2, len(runs) + 1):
+                terms.append("".join(runs[start:end]))
+        if len(parts) > MAX_COMPOUND_PARTS:
+            terms.append("".join(parts))
+    return terms
+
+
+class BM25Index:
+    """BM25 over chunk ids with array-backed postings"""
+
+    def __init__(self, chunk_ids: List[str], vocabulary: Dict[str, int], offsets: np.ndarray,
+                 postings: np.ndarray, term_freqs: np.ndarray, doc_lengths: np.ndarray,
+                 k1: float = 1.5, b: float = 0.75):
+        self.chunk_ids = chunk_ids
+        self.vocabulary = vocabulary
+        # Postings of term t are postings[offsets[t]:offsets[t + 1]] (chunk indexes, ascending)
+        self.offsets = offsets
+        self.postings = postings
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        # Per-chunk length normalisation term of the BM25 denominator
+        self._norm = k1 * (1 - b + b * np.asarray(doc_lengths) / max(self.avg_doc_length, 1e-9))
+
+    @classmethod
+    def build(cls, chunk_ids: Sequence[str], texts: Sequence[str], **params) -> "BM25Index":
+        """Index chunk texts (one pass to count, one to lay out the postings arrays)"""
+        vocabulary: Dict[str, int] = {}
+        doc_terms = []
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+        for doc, text in enumerate(texts):
+            terms = tokenize(text)
+            doc_lengths[doc] = len(terms)
+            counts = Counter(terms)
+            doc_terms.append([(vocabulary.setdefault(term, len(vocabulary)), tf) for term, tf in counts.items()])
+
+        doc_freqs = np.zeros(len(vocabulary), dtype=np.int64)
+        for terms in doc_terms:
+            for term_id, _ in terms:
+                doc_freqs[term_id] += 1
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(doc_freqs, out=offsets[1:])
+
+        postings = np.empty(offsets[-1], dtype=np.int32)
+        term_freqs = np.empty(offsets[-1], dtype=np.float32)
+        cursor = offsets[:-1].copy()
+        for doc, terms in enumerate(doc_terms):
+            for term_id, tf in terms:
+                postings[cursor[term_id]] = doc
+                term_freqs[cursor[term_id]] = tf
+                cursor[term_id] += 1
+
+        return cls(list(chunk_ids), vocabulary, offsets, postings, term_freqs, doc_lengths, **params)
+
+    def search(self, query: str, n_results: int = 10) -> List[Tuple[str, float]]:
+        """Top chunks by BM25 score as (chunk_id, score), best first"""
+        n_docs = len(self.chunk_ids)
+        if not n_docs:
+            return []
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.postings[start:end]
+            tf = self.term_freqs[start:end]
+            idf = np.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            # Postings hold each chunk at most once per term, so fancy-index add is safe
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + self._norm[docs])
+
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        if len(matched) > n_results:
+            matched = matched[np.argpartition(-scores[matched], n_results - 1)[:n_results]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(self.chunk_ids[i], float(scores[i])) for i in matched]
+
+    def save(self, db_path: str):
+        """
+        Write the index to a new generation directory under db_path/bm25 and
+        switch the pointer file to it in one os.replace. The previous
+        generation is kept (a reader may have just read the old pointer);
+        older ones are removed.
+        """
+        root = Path(db_path) / INDEX_DIR
+        root.mkdir(parents=True, exist_ok=True)
+        previous = _current_generation(root)
+        generation = f"gen-{uuid.uuid4().hex}"
+        target = root / generation
+        target.mkdir()
+        for name in ("offsets", "postings", "term_freqs", "doc_lengths"):
+            np.save(target / f"{name}.npy", getattr(self, name))
+        with open(target / "meta.json", "w") as f:
+            json.dump({"k1": self.k1, "b": self.b, "chunk_ids": self.chunk_ids, "vocabulary": self.vocabulary}, f)
+
+        staging = root / f"{POINTER_FILE}.tmp"
+        with open(staging, "w") as f:
+            json.dump({"generation": generation}, f)
+        os.replace(staging, root / POINTER_FILE)
+        for stale in root.iterdir():
+            if stale.name not in (POINTER_FILE, generation, previous):
+                if stale.is_dir():
+                    shutil.rmtree(stale, ignore_errors=True)
+                else:
+                    stale.unlink()
+        logger.info(f"Saved BM25 index ({len(self.chunk_ids)} chunks, {len(self.vocabulary)} terms) to {target}")
+
+    @classmethod
+    def load(cls, db_path: str) -> Optional["BM25Index"]:
+        """Memory-map the current saved index, or None if there is none"""
+        root = Path(db_path) / INDEX_DIR
+        generation = _current_generation(root)
+        if generation is None:
+            return None
+        source = root / generation
+        try:
+            with open(source / "meta.json") as f:
+                meta = json.load(f)
+            arrays = {
+                name: np.load(source / f"{name}.npy", mmap_mode="r")
+                for name in ("offsets", "postings", "term_freqs", "doc_lengths")
+            }
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load BM25 index from {source}: {e}")
+            return None
+        return cls(meta["chunk_ids"], meta["vocabulary"], k1=meta["k1"], b=meta["b"], **arrays)
+
+    @staticmethod
+    def exists(db_path: str) -> bool:
+        return _current_generation(Path(db_path) / INDEX_DIR) is not None
+
+    @staticmethod
+    def remove(db_path: str):
+        shutil.rmtree(Path(db_path) / INDEX_DIR, ignore_errors=True)
+
+
+def _current_generation(root: Path) -> Optional[str]:
+    """Name of the generation directory the pointer file names, or None"""
+    try:
+        with open(root / POINTER_FILE) as f:
+            return json.load(f)["generation"]
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"Could not read BM25 index pointer in {root}: {e}")
+        return None
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[str]:
+    """Fuse ranked id lists: score(id) = sum over lists of 1 / (k + rank)"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda chunk_id: -scores[chunk_id])
@@ -0,0 +1,376 @@
+"""
+Async LLM client: concurrency limit, deadlines, retries and hedging.
+
+RAGSystem used to call `GenerativeModel.generate_content` directly from
+executor threads with no timeout, no cap on concurrent calls and no retry,
+so a Gemini slowdown piled up unbounded in-flight requests. `LLMClient`
+wraps a backend with:
+
+- a per-process semaphore (LLM_MAX_CONCURRENCY calls in flight; waiting
+  for a slot counts against the deadline)
+- a deadline per call (LLM_TIMEOUT) and for the first chunk
+  (LLM_FIRST_TOKEN_TIMEOUT)
+- jittered exponential-backoff retries of 429 / 5xx / first-chunk
+  timeouts, only before any text has been returned
+- optional hedging: if the first chunk has not arrived after
+  LLM_HEDGE_AFTER seconds, a second identical request is raced against it
+
+Backends: `GeminiBackend` (google-generativeai) and `FakeBackend`, a
+deterministic local model streaming with configurable latencies, for
+offline load tests (LLM_BACKEND=fake).
+"""
+import asyncio
+import logging
+import random
+import weakref
+import zlib
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from config import Config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying (google.api_core exceptions carry theirs in `.code`)
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """An LLM call failed after its retries, or could not start before its deadline"""
+
+
+class LLMTimeout(LLMError):
+    """An LLM call ran past its deadline"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (LLMTimeout, asyncio.TimeoutError)):
+        return True
+    code = getattr(error, "code", None)
+    try:
+        return int(code) in RETRYABLE_STATUS
+    except (TypeError, ValueError):
+        return False
+
+
+class GeminiBackend:
+    """Google Gemini through google-generativeai's async API"""
+
+    name = "gemini"
+
+    def __init__(self, model_name: str, api_key: Optional[str] = None):
+        import google.generativeai as genai
+        self._genai = genai
+        if api_key is not None:
+            genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+        self.model_name = model_name
+        self.count_sample = Config.PROMPT_TOKEN_COUNT_SAMPLE
+        self._client = None
+
+    def client(self):
+        """The SDK's shared async GenerativeService client (grpc.aio: bound to the app's event loop on first use)"""
+        if self._client is None:
+            from google.generativeai import client
+            self._client = client.get_default_generative_async_client()
+        return self._client
+
+    async def stream(self, prompt: str, generation_config: Optional[Dict] = None,
+                     usage: Optional[Dict] = None) -> AsyncIterator[str]:
+        # google-generativeai 0.3.1 responses carry no usage metadata, so a sample of prompts is
+        # counted with a separate countTokens call racing the generation; it is only used if it
+        # has finished by the end of the stream, so it never delays the reply
+        count = None
+        if usage is not None and random.random() < self.count_sample:
+            count = asyncio.ensure_future(self._count_tokens(prompt))
+        try:
+            async for text in self._generate(prompt, generation_config):
+                yield text
+            if count is not None and count.done() and count.result():
+                usage["prompt_tokens"] = count.result()
+        finally:
+            if count is not None and not count.done():
+                count.cancel()
+
+    async def _count_tokens(self, prompt: str) -> int:
+        """Gemini's prompt token count, or 0 if the call fails"""
+        try:
+            contents = self._genai.types.content_types.to_contents(prompt)
+            response = await self.client().count_tokens(model=self.model.model_name, contents=contents)
+            return response.total_tokens
+        except Exception as e:
+            logger.debug(f"countTokens failed: {e}")
+            return 0
+
+    async def _generate(self, prompt: str, generation_config: Optional[Dict] = None) -> AsyncIterator[str]:
+        # The raw streamGenerateContent RPC is used instead of GenerativeModel.generate_content_async:
+        # the SDK's response wrapper holds each chunk back until the next one has arrived
+        from google.ai import generativelanguage as glm
+        request = glm.GenerateContentRequest(
+            model=self.model.model_name,
+            contents=self._genai.types.content_types.to_contents(prompt),
+            generation_config=glm.GenerationConfig(**generation_config) if generation_config else None,
+        )
+        response = await self.client().stream_generate_content(request)
+        async for chunk in response:
+            text = _chunk_text(self._genai.types.GenerateContentResponse.from_response(chunk))
+            if text:
+                yield text
+
+
+def _chunk_text(chunk) -> str:
+    try:
+        return chunk.text or ""
+    except ValueError:
+        # Blocked or empty candidate: no text in this chunk
+        return ""
+
+
+class FakeBackendError(Exception):
+    """Injected failure of the fake backend (retryable, like a 503)"""
+
+    code = 503
+
+
+class FakeBackend:
+    """
+    Deterministic local model for offline load tests.
+
+    The answer is pseudo-random text seeded by the prompt, streamed in
+    chunks of `chunk_tokens` words: the first after `first_token_ms`, the
+    rest `token_ms` per word apart, with +/- `jitter` relative variation.
+    A `failure_rate` share of calls fails before the first chunk.
+    """
+
+    name = "fake"
+
+    WORDS = ("budget", "savings", "retirement", "plan", "income", "goal", "invest", "fund", "credit",
+             "emergency", "monthly", "steady", "**important**", "start", "small", "grow", "your", "the",
+             "and", "to", "a", "of", "with", "for")
+
+    def __init__(self, first_token_ms: Optional[float] = None, token_ms: Optional[float] = None,
+                 tokens: Optional[int] = None, chunk_tokens: Optional[int] = None,
+                 failure_rate: Optional[float] = None, jitter: Optional[float] = None,
+                 seed: Optional[int] = None):
+        self.first_token_ms = Config.FAKE_LLM_FIRST_TOKEN_MS if first_token_ms is None else first_token_ms
+        self.token_ms = Config.FAKE_LLM_TOKEN_MS if token_ms is None else token_ms
+        self.tokens = Config.FAKE_LLM_TOKENS if tokens is None else tokens
+        self.chunk_tokens = Config.FAKE_LLM_CHUNK_TOKENS if chunk_tokens is None else chunk_tokens
+        self.failure_rate = Config.FAKE_LLM_FAILURE_RATE if failure_rate is None else failure_rate
+        self.jitter = Config.FAKE_LLM_JITTER if jitter is None else jitter
+        self.seed = Config.FAKE_LLM_SEED if seed is None else seed
+        self.calls = 0
+
+    def _latency(self, rng: random.Random, ms: float) -> float:
+        return max(0.0, ms * (1 + self.jitter * rng.uniform(-1, 1))) / 1000
+
+    async def stream(self, prompt: str, generation_config: Optional[Dict] = None,
+                     usage: Optional[Dict] = None) -> AsyncIterator[str]:
+        # Latency / failure draws depend on the prompt and the call count (so retries and hedges get
+        # fresh ones, and a run with the same request order repeats exactly); the answer on the prompt only
+        self.calls += 1
+        rng = random.Random(zlib.crc32(prompt.encode()) ^ self.seed ^ (self.calls << 32))
+        await asyncio.sleep(self._latency(rng, self.first_token_ms))
+        if rng.random() < self.failure_rate:
+            raise FakeBackendError("fake backend: injected failure")
+        answer_rng = random.Random(zlib.crc32(prompt.encode()) ^ self.seed)
+        words = [answer_rng.choice(self.WORDS) for _ in range(self.tokens)]
+        for start in range(0, len(words), self.chunk_tokens):
+            if start:
+                await asyncio.sleep(self._latency(rng, self.token_ms * self.chunk_tokens))
+            yield " ".join(words[start:start + self.chunk_tokens]) + " "
+        if usage is not None:
+            usage["prompt_tokens"] = len(prompt) // 4
+
+
+class LLMClient:
+    """Async access to a backend with a concurrency limit, deadlines, retries and hedging"""
+
+    def __init__(self, backend, max_concurrency: Optional[int] = None, timeout: Optional[float] = None,
+                 first_token_timeout: Optional[float] = None, max_retries: Optional[int] = None,
+                 retry_backoff: Optional[float] = None, hedge_after: Optional[float] = None):
+        self.backend = backend
+        self.max_concurrency = Config.LLM_MAX_CONCURRENCY if max_concurrency is None else max_concurrency
+        self.timeout = Config.LLM_TIMEOUT if timeout is None else timeout
+        self.first_token_timeout = Config.LLM_FIRST_TOKEN_TIMEOUT if first_token_timeout is None else first_token_timeout
+        self.max_retries = Config.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.retry_backoff = Config.LLM_RETRY_BACKOFF if retry_backoff is None else retry_backoff
+        self.hedge_after = Config.LLM_HEDGE_AFTER if hedge_after is None else hedge_after
+        # asyncio primitives belong to one loop: the app has one, scripts calling asyncio.run repeatedly do not
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = \
+            weakref.WeakKeyDictionary()
+        self.calls = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    async def generate(self, prompt: str, generation_config: Optional[Dict] = None,
+                       usage: Optional[Dict] = None) -> str:
+        """The whole answer as one string"""
+        return "".join([text async for text in self.stream(prompt, generation_config, usage)])
+
+    async def stream(self, prompt: str, generation_config: Optional[Dict] = None,
+                     usage: Optional[Dict] = None) -> AsyncIterator[str]:
+        """
+        Stream the answer. Raises LLMTimeout past the deadline and LLMError
+        when retries are exhausted; nothing is retried once text was yielded.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        semaphore = self._semaphore()
+        self.calls += 1
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise LLMTimeout(f"No free LLM slot within {self.timeout}s ({self.max_concurrency} in flight)")
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        stream = None
+        try:
+            stream, first, attempt_usage = await self._open_with_retries(prompt, generation_config, deadline)
+            yield first
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError
+                try:
+                    text = await asyncio.wait_for(stream.__anext__(), timeout=remaining)
+                except StopAsyncIteration:
+                    break
+                yield text
+            if usage is not None:
+                usage.update(attempt_usage)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise LLMTimeout(f"LLM call exceeded its {self.timeout}s deadline")
+        finally:
+            self.in_flight -= 1
+            semaphore.release()
+            if stream is not None:
+                await _close(stream)
+
+    async def _open_with_retries(self, prompt: str, generation_config: Optional[Dict],
+                                 deadline: float) -> Tuple[AsyncIterator[str], str, Dict]:
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            try:
+                return await self._open_hedged(prompt, generation_config, deadline)
+            except Exception as e:
+                delay = self.retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+                if not is_retryable(e) or attempt >= self.max_retries or loop.time() + delay >= deadline:
+                    self.failures += 1
+                    if isinstance(e, LLMError):
+                        raise
+                    raise LLMError(f"LLM call failed after {attempt + 1} attempt(s): {e}") from e
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"Retrying LLM call in {delay:.2f}s (attempt {attempt + 1}): {e}")
+                await asyncio.sleep(delay)
+
+    async def _open_hedged(self, prompt: str, generation_config: Optional[Dict],
+                           deadline: float) -> Tuple[AsyncIterator[str], str, Dict]:
+        """Start the stream and wait for its first chunk, racing a second request if it is slow"""
+        loop = asyncio.get_running_loop()
+        first_deadline = min(deadline, loop.time() + self.first_token_timeout)
+        hedge_at = loop.time() + self.hedge_after if self.hedge_after > 0 else None
+        tasks = [asyncio.ensure_future(self._first_chunk(prompt, generation_config))]
+        winner: Optional[asyncio.Task] = None
+        error: Optional[BaseException] = None
+        try:
+            while winner is None:
+                pending = [task for task in tasks if not task.done()]
+                if not pending:
+                    raise error
+                wake_at = first_deadline if hedge_at is None else min(first_deadline, hedge_at)
+                done, _ = await asyncio.wait(pending, timeout=max(0.0, wake_at - loop.time()),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        break
+                    error = task.exception()
+                if done:
+                    continue
+                if hedge_at is not None and loop.time() >= hedge_at:
+                    hedge_at = None
+                    self.hedges += 1
+                    tasks.append(asyncio.ensure_future(self._first_chunk(prompt, generation_config)))
+                elif loop.time() >= first_deadline:
+                    self.timeouts += 1
+                    raise LLMTimeout(f"No first chunk within {self.first_token_timeout}s")
+            if winner is not tasks[0]:
+                self.hedge_wins += 1
+            return winner.result()
+        finally:
+            # Losers: cancel the one still waiting, close any that also got its first chunk
+            for task in tasks:
+                if task is winner:
+                    continue
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled() and task.exception() is None:
+                    await _close(task.result()[0])
+
+    async def _first_chunk(self, prompt: str,
+                           generation_config: Optional[Dict]) -> Tuple[AsyncIterator[str], str, Dict]:
+        usage: Dict = {}
+        stream = self.backend.stream(prompt, generation_config, usage)
+        try:
+            while True:
+                text = await stream.__anext__()
+                if text:
+                    return stream, text, usage
+        except BaseException:
+            await _close(stream)
+            raise
+
+    def stats(self) -> Dict:
+        return {
+            "backend": self.backend.name,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "calls": self.calls,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+        }
+
+
+async def _close(stream):
+    close = getattr(stream, "aclose", None)
+    if close is not None:
+        try:
+            await close()
+        except Exception:
+            pass
+
+
+def create_llm_client(model_name: str, backend: Optional[str] = None, api_key: Optional[str] = None) -> LLMClient:
+    """LLMClient for Config.LLM_BACKEND ("gemini" or "fake")"""
+    backend = (backend or Config.LLM_BACKEND).lower()
+    if backend == "fake":
+        logger.info("Using the fake LLM backend")
+        return LLMClient(FakeBackend())
+    if backend != "gemini":
+        raise ValueError(f"Unknown LLM backend: {backend}")
+    return LLMClient(GeminiBackend(model_name, api_key=api_key))
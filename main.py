@@ -1,20 +1,21 @@
 from fastapi import FastAPI, HTTPException, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, StreamingResponse, RedirectResponse
+from fastapi.responses import FileResponse, StreamingResponse, RedirectResponse, JSONResponse
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional, Dict
 import uuid
 from datetime import datetime
 import logging
-import json
 
 from config import Config
 from database import Database
-from vector_store import VectorStore
-from rag_system import RAGSystem
-from web_search import WebSearchService
-from auth0_utils import get_current_user, verify_token
+from answer_cache import SemanticAnswerCache
+from services import Services
+from conversation_summary import ConversationSummarizer
+from auth0_utils import get_current_user_async, verify_token, verified_token_cache
+from executors import run_db, run_retrieval, run_http, shutdown_executors, executor_stats
+from streaming import coalesce_chunks, sse_event
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -38,21 +39,87 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
-# Initialize services
+# Lightweight services are built at import
 db = Database(db_path=Config.DATABASE_PATH)
 
-vector_store = VectorStore(
-    db_path=Config.VECTOR_DB_PATH,
-    embedding_model=Config.EMBEDDING_MODEL
-)
+answer_cache = SemanticAnswerCache(
+    maxsize=Config.ANSWER_CACHE_SIZE,
+    ttl=Config.ANSWER_CACHE_TTL,
+    similarity_threshold=Config.ANSWER_CACHE_SIMILARITY
+) if Config.ANSWER_CACHE_ENABLED else None
+
+# Heavy services (embedding model, vector index, Gemini client) are imported and
+# built lazily, on the warm-up thread started below or on first use
+services = Services()
+
+
+def _create_vector_store():
+    from vector_store import VectorStore
+    return VectorStore(
+        db_path=Config.VECTOR_DB_PATH,
+        embedding_model=Config.EMBEDDING_MODEL
+    )
+
+
+def _warm_vector_store(vector_store):
+    """Load the embedding model and the index pages with one throwaway search"""
+    vector_store.search("retirement savings", n_results=1)
+
+
+def _create_rag_system():
+    from rag_system import RAGSystem
+    return RAGSystem(
+        api_key=Config.GOOGLE_GEMINI_API_KEY,
+        vector_store=services.get("vector_store"),
+        model_name=Config.GEMINI_MODEL,
+        answer_cache=answer_cache
+    )
+
+
+def _create_web_search_service():
+    from web_search import WebSearchService
+    return WebSearchService()
+
+
+services.register("vector_store", _create_vector_store, warmup=_warm_vector_store)
+services.register("rag_system", _create_rag_system)
+services.register("web_search", _create_web_search_service)
+
+# Folds messages that leave the prompt's history window into a running summary, after each reply
+summarizer = ConversationSummarizer(db, lambda: services.aget("rag_system")) if Config.SUMMARY_ENABLED else None
+
+
+async def _recent_history(rag_system, user_id: int, conversation_id: str) -> Dict:
+    """
+    The history the prompt uses (the current message fills the last window slot), any older
+    messages still waiting to be folded into the running summary, and the summary itself
+    """
+    # A fold runs once SUMMARY_MIN_MESSAGES (plus a trailing question) have left the window,
+    # so this many extra messages covers the gap between the summary and the window
+    pending = Config.SUMMARY_MIN_MESSAGES + 1 if summarizer is not None else 0
+    limit = rag_system.HISTORY_MESSAGES - 1
+    return await run_db(db.get_recent_history, user_id, conversation_id, limit, limit + pending) or {}
+
+
+def _schedule_summary(rag_system, user_id: int, conversation_id: str, recent_messages: int):
+    """Start a background summary update once earlier messages are leaving the history window"""
+    # Fewer recent messages than the window holds means nothing older exists yet
+    if summarizer is not None and recent_messages >= rag_system.HISTORY_MESSAGES - 1:
+        summarizer.schedule(user_id, conversation_id)
+
+
+@app.on_event("startup")
+def startup_event():
+    """Start warming the heavy services without delaying the server start"""
+    if Config.WARMUP_ON_STARTUP:
+        services.start_warmup(["vector_store", "rag_system", "web_search"])
 
-rag_system = RAGSystem(
-    api_key=Config.GOOGLE_GEMINI_API_KEY,
-    vector_store=vector_store,
-    model_name=Config.GEMINI_MODEL
-)
 
-web_search_service = WebSearchService()
+@app.on_event("shutdown")
+def shutdown_event():
+    """Release executor threads on shutdown"""
+    shutdown_executors(wait=False)
+
 
 # Request/Response Models
 class ChatMessage(BaseModel):
@@ -115,7 +182,7 @@ async def get_user_from_token(authorization: Optional[str] = Header(None)):
             status_code=401,
             detail="Authorization header required"
         )
-    user_info = get_current_user(authorization)
+    user_info = await get_current_user_async(authorization)
     return user_info
 
 # Dependency that allows optional token (for fallback when no token available)
@@ -127,7 +194,7 @@ async def get_user_optional_token(
     if authorization:
         # Try to verify token
         try:
-            user_info = get_current_user(authorization)
+            user_info = await get_current_user_async(authorization)
             return user_info
         except HTTPException:
             # Token invalid, fall through to userId check
@@ -156,12 +223,33 @@ async def root():
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
+def _readiness_response() -> JSONResponse:
+    """200 with the component report once every service is ready, 503 until then"""
+    report = services.readiness()
+    report["status"] = "ready" if report["ready"] else "starting"
+    if any(component["status"] == "failed" for component in report["components"].values()):
+        report["status"] = "degraded"
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
 @app.get("/health")
 async def health_check():
-    """Health check endpoint for ALB"""
+    """Health check endpoint for ALB (liveness; readiness is /health/ready)"""
     return {"status": "healthy", "service": "chatbot-api"}
 
 
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness: the process is up and its event loop is serving requests"""
+    return {"status": "alive", "service": "chatbot-api"}
+
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness: embedding model, vector index and LLM client are loaded"""
+    return _readiness_response()
+
+
 @app.get("/api/auth/callback")
 async def auth_callback_get(
     sub: Optional[str] = None,
@@ -232,7 +320,7 @@ async def auth_callback(user_info: Auth0UserInfo, authorization: Optional[str] =
     # Verify token if provided
     if authorization:
         try:
-            token_user = get_current_user(authorization)
+            token_user = await get_current_user_async(authorization)
             # Use token user info if available, otherwise use body
             auth0_sub = token_user.get("sub") or user_info.sub
             name = token_user.get("name") or user_info.name
@@ -411,9 +499,9 @@ async def chat(
     # Try to get user from token if available
     if authorization:
         try:
-            user_info = get_current_user(authorization)
+            user_info = await get_current_user_async(authorization)
             auth0_sub = user_info.get("sub")
-            db_user = db.get_user_by_auth0_sub(auth0_sub)
+            db_user = await run_db(db.get_user_by_auth0_sub, auth0_sub)
             if db_user:
                 user_id = db_user['id']
         except HTTPException:
@@ -425,30 +513,21 @@ async def chat(
         try:
             user_id = int(request.user_id)
             # Verify user exists
-            db_user = db.get_user(user_id)
+            db_user = await run_db(db.get_user, user_id)
             if not db_user:
                 raise HTTPException(status_code=404, detail="User not found")
         except (ValueError, TypeError):
             raise HTTPException(status_code=400, detail="Invalid user_id")
     
     conversation_id = request.conversation_id or str(uuid.uuid4())
+    rag_system = await services.aget("rag_system")
     
-    # Get conversation history
-    conversation_history = db.get_conversation(user_id, conversation_id) or []
-    
-    # Get user metadata for personalized responses
-    user_metadata = None
-    if db_user:
-        user_metadata = {
-            'age': db_user.get('age'),
-            'income_range': db_user.get('income_range'),
-            'marital_status': db_user.get('marital_status'),
-            'employment_status': db_user.get('employment_status'),
-            'education': db_user.get('education'),
-            'location': db_user.get('location'),
-            'financial_goals': db_user.get('financial_goals'),
-            'risk_tolerance': db_user.get('risk_tolerance'),
-        }
+    history = await _recent_history(rag_system, user_id, conversation_id)
+    conversation_history = history.get("messages", [])
+    recent_messages = len(conversation_history)
+    
+    # Get user metadata for personalized responses (prebuilt by the user cache)
+    user_metadata = await run_db(db.get_user_metadata, user_id)
     
     # Add user message to history
     user_message = {
@@ -458,42 +537,41 @@ async def chat(
     }
     conversation_history.append(user_message)
     
-    # Generate response using RAG with user metadata
-    rag_response = rag_system.generate_response(
+    # Classify and retrieve once; the same pipeline feeds the single LLM call
+    pipeline = await run_retrieval(
+        rag_system.build_pipeline,
         query=request.message,
         conversation_history=conversation_history,
-        user_metadata=user_metadata
+        user_metadata=user_metadata,
+        conversation_summary=history.get("summary", ""),
+        earlier_questions=history.get("questions", [])
     )
     
-    # If web search is needed
-    if rag_response.get("requires_web_search"):
+    # If web search is needed, attach results before generating
+    if pipeline.requires_web_search:
         logger.info("Performing web search for additional information")
-        search_results = web_search_service.search(request.message)
+        web_search_service = await services.aget("web_search")
+        search_results = await run_http(web_search_service.search, request.message)
         if search_results:
-            formatted_results = web_search_service.format_search_results(search_results)
-            rag_response = rag_system.generate_response(
-                query=request.message,
-                conversation_history=conversation_history,
-                use_web_search=True,
-                web_search_results=formatted_results,
-                user_metadata=user_metadata
-            )
+            pipeline.web_search_results = web_search_service.format_search_results(search_results)
+    
+    rag_response = await rag_system.arun_pipeline(pipeline)
     
     # Handle escalation
     if rag_response.get("escalate"):
         escalation_type = rag_response.get("escalation_type", "SENSITIVE")
         logger.warning(f"⚠️ ESCALATION: {escalation_type} - User {user_id}: {request.message}")
     
-    # Add assistant response to history
+    # Build assistant message
     assistant_message = {
         "role": "assistant",
         "content": rag_response["response"],
         "timestamp": datetime.utcnow().isoformat()
     }
-    conversation_history.append(assistant_message)
     
-    # Store updated conversation
-    db.store_conversation(user_id, conversation_id, conversation_history)
+    # Append only this turn's messages
+    if await run_db(db.append_messages, user_id, conversation_id, [user_message, assistant_message]):
+        _schedule_summary(rag_system, user_id, conversation_id, recent_messages)
     
     return ChatResponse(
         response=rag_response["response"],
@@ -503,25 +581,14 @@ async def chat(
     )
 
 
-async def generate_streaming_response(user_id: int, conversation_id: str, message: str):
+async def generate_streaming_response(rag_system, user_id: int, conversation_id: str, message: str):
     """Generator function for streaming responses"""
-    # Get conversation history
-    conversation_history = db.get_conversation(user_id, conversation_id) or []
+    history = await _recent_history(rag_system, user_id, conversation_id)
+    conversation_history = history.get("messages", [])
+    recent_messages = len(conversation_history)
     
-    # Get user metadata for personalized responses
-    db_user = db.get_user(user_id)
-    user_metadata = None
-    if db_user:
-        user_metadata = {
-            'age': db_user.get('age'),
-            'income_range': db_user.get('income_range'),
-            'marital_status': db_user.get('marital_status'),
-            'employment_status': db_user.get('employment_status'),
-            'education': db_user.get('education'),
-            'location': db_user.get('location'),
-            'financial_goals': db_user.get('financial_goals'),
-            'risk_tolerance': db_user.get('risk_tolerance'),
-        }
+    # Get user metadata for personalized responses (prebuilt by the user cache)
+    user_metadata = await run_db(db.get_user_metadata, user_id)
     
     # Add user message to history
     user_message = {
@@ -531,48 +598,47 @@ async def generate_streaming_response(user_id: int, conversation_id: str, messag
     }
     conversation_history.append(user_message)
     
-    # Check for sensitive content early
-    is_sensitive, sensitivity_type = rag_system.detect_sensitive_content(message)
-    
     full_response = ""
-    escalation_detected = False
+    pipeline = None
     
-    # Generate streaming response with user metadata
+    # Classify and retrieve on the retrieval executor, then stream Gemini's answer
+    # through the async LLM client
     try:
-        for chunk in rag_system.generate_response_stream(
+        pipeline = await run_retrieval(
+            rag_system.build_pipeline,
             query=message,
             conversation_history=conversation_history,
-            user_metadata=user_metadata
-        ):
+            user_metadata=user_metadata,
+            conversation_summary=history.get("summary", ""),
+            earlier_questions=history.get("questions", [])
+        )
+        # Merge small pieces into word-aligned frames; Gemini chunks pass straight through
+        async for chunk in coalesce_chunks(rag_system.astream_pipeline(pipeline)):
             full_response += chunk
-            # Send chunk as JSON
-            yield f"data: {json.dumps({'chunk': chunk, 'done': False})}\n\n"
-        
-        # Check if escalation happened
-        escalation_detected = is_sensitive
-        
-        # If web search might be needed, we can add it here in future
-        # For now, just send the complete response
+            yield sse_event({'chunk': chunk, 'done': False})
         
     except Exception as e:
         logger.error(f"Error in streaming response: {e}")
         error_chunk = "I apologize, but I encountered an error. Please try again."
         full_response = error_chunk
-        yield f"data: {json.dumps({'chunk': error_chunk, 'done': False, 'error': True})}\n\n"
+        yield sse_event({'chunk': error_chunk, 'done': False, 'error': True})
     
-    # Add assistant response to history
+    # Build assistant message
     assistant_message = {
         "role": "assistant",
         "content": full_response,
         "timestamp": datetime.utcnow().isoformat()
     }
-    conversation_history.append(assistant_message)
     
-    # Store updated conversation
-    db.store_conversation(user_id, conversation_id, conversation_history)
+    # Append only this turn's messages
+    if await run_db(db.append_messages, user_id, conversation_id, [user_message, assistant_message]):
+        _schedule_summary(rag_system, user_id, conversation_id, recent_messages)
     
-    # Send final message with metadata
-    yield f"data: {json.dumps({'done': True, 'conversation_id': conversation_id, 'escalate': escalation_detected, 'escalation_type': sensitivity_type if escalation_detected else None})}\n\n"
+    # Send final message with the same metadata /api/chat returns
+    final_event = {'done': True, 'conversation_id': conversation_id, 'escalate': False, 'escalation_type': None}
+    if pipeline is not None:
+        final_event.update(pipeline.metadata())
+    yield sse_event(final_event)
 
 
 @app.post("/api/chat/stream")
@@ -586,9 +652,9 @@ async def chat_stream(
     # Try to get user from token if available
     if authorization:
         try:
-            user_info = get_current_user(authorization)
+            user_info = await get_current_user_async(authorization)
             auth0_sub = user_info.get("sub")
-            db_user = db.get_user_by_auth0_sub(auth0_sub)
+            db_user = await run_db(db.get_user_by_auth0_sub, auth0_sub)
             if db_user:
                 user_id = db_user['id']
         except HTTPException:
@@ -600,20 +666,18 @@ async def chat_stream(
         try:
             user_id = int(request.user_id)
             # Verify user exists
-            db_user = db.get_user(user_id)
+            db_user = await run_db(db.get_user, user_id)
             if not db_user:
                 raise HTTPException(status_code=404, detail="User not found")
         except (ValueError, TypeError):
             raise HTTPException(status_code=400, detail="Invalid user_id")
     
-    # Get user metadata if not already retrieved
-    if not db_user:
-        db_user = db.get_user(user_id)
-    
     conversation_id = request.conversation_id or str(uuid.uuid4())
+    # Resolved before streaming starts, so a service that failed to load is a plain 500
+    rag_system = await services.aget("rag_system")
     
     return StreamingResponse(
-        generate_streaming_response(user_id, conversation_id, request.message),
+        generate_streaming_response(rag_system, user_id, conversation_id, request.message),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -627,7 +691,7 @@ async def chat_stream(
 async def get_conversation(user_id: str, conversation_id: str, user: Dict = Depends(get_user_from_token)):
     """Get conversation history"""
     auth0_sub = user.get("sub")
-    db_user = db.get_user_by_auth0_sub(auth0_sub)
+    db_user = await run_db(db.get_user_by_auth0_sub, auth0_sub)
     
     if not db_user or str(db_user['id']) != user_id:
         raise HTTPException(status_code=403, detail="Access denied")
@@ -637,7 +701,7 @@ async def get_conversation(user_id: str, conversation_id: str, user: Dict = Depe
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid user_id")
     
-    conversation = db.get_conversation(user_id_int, conversation_id)
+    conversation = await run_db(db.get_conversation, user_id_int, conversation_id)
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
     return {"conversation": conversation}
@@ -647,7 +711,7 @@ async def get_conversation(user_id: str, conversation_id: str, user: Dict = Depe
 async def delete_conversation(user_id: str, conversation_id: str, user: Dict = Depends(get_user_from_token)):
     """Delete a conversation"""
     auth0_sub = user.get("sub")
-    db_user = db.get_user_by_auth0_sub(auth0_sub)
+    db_user = await run_db(db.get_user_by_auth0_sub, auth0_sub)
     
     if not db_user or str(db_user['id']) != user_id:
         raise HTTPException(status_code=403, detail="Access denied")
@@ -657,17 +721,36 @@ async def delete_conversation(user_id: str, conversation_id: str, user: Dict = D
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid user_id")
     
-    db.clear_conversation(user_id_int, conversation_id)
+    await run_db(db.clear_conversation, user_id_int, conversation_id)
     return {"message": "Conversation deleted"}
 
 
+@app.get("/api/stats")
+async def stats():
+    """In-process cache, prompt size and executor statistics"""
+    vector_store = services.peek("vector_store")
+    rag_system = services.peek("rag_system")
+    return {
+        "user_cache": db.user_cache.stats(),
+        "token_cache": verified_token_cache.stats(),
+        "query_embedding_cache": vector_store.get_query_cache_stats() if vector_store else None,
+        "answer_cache": answer_cache.stats() if answer_cache else None,
+        "prompt_tokens": rag_system.prompt_stats.stats() if rag_system else None,
+        "llm": rag_system.llm.stats() if rag_system else None,
+        "summaries": summarizer.stats() if summarizer else None,
+        "executors": executor_stats(),
+        "services": services.readiness()
+    }
+
+
 @app.get("/api/health")
-async def health_check():
-    """Health check endpoint"""
+async def api_health_check():
+    """Health check endpoint (always 200; per-component warm-up status under "services")"""
+    report = services.readiness()
     return {
         "status": "healthy",
-        "database": "connected",
-        "vector_store": "ready"
+        "vector_store": report["components"]["vector_store"]["status"],
+        "services": report
     }
 
 
@@ -0,0 +1,441 @@
+"""
+Exact vector search over a memory-mapped NumPy matrix.
+
+At knowledge-base scale (a few thousand chunks) a brute-force scan is both
+exact and faster than Chroma's HNSW + sqlite stack, with no client to start.
+Normalized embeddings live in one contiguous float32 (or float16) .npy file
+that is memory-mapped at load, so every worker process shares the same page
+cache. Chunk texts and metadata are memory-mapped too (one UTF-8 blob per
+column plus row offsets) and decoded only for the rows a query returns;
+meta.json holds just the chunk ids and the data file names.
+
+With dtype "int8" the index also keeps per-vector-scaled int8 codes (a
+quarter of the float32 size) and scans those instead; only the top
+candidates are rescored against the full-precision rows, which stay on disk
+and are paged in on demand.
+
+`NumpyCollection` implements the subset of Chroma's Collection API that
+VectorStore uses (add / upsert / delete / get / query / count), so it can be
+swapped in behind VectorStore unchanged (Config.VECTOR_BACKEND = "numpy").
+Every save rewrites the index, so ingestion groups its writes in `batch()`
+and the index is written once per run.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Set
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = "numpy_index"
+META_FILE = "meta.json"
+# Rows converted to float32 at a time when scanning a float16 / int8 matrix
+SCAN_BLOCK = 1024
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """Float32 copy of `vectors` scaled to unit length (zero rows stay zero)"""
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Row indexes of the k highest scores, best first"""
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def quantize_int8(vectors: np.ndarray):
+    """Per-row symmetric int8 codes and scales: vectors[i] ~= codes[i] * scales[i]"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0 if len(vectors) else np.zeros(0, dtype=np.float32)
+    scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales
+
+
+class _StringColumn:
+    """Read-only sequence of strings stored as one UTF-8 blob plus row offsets (both memory-mapped)"""
+
+    __slots__ = ("blob", "offsets", "decode")
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray, decode: Optional[Callable[[str], object]] = None):
+        self.blob = blob
+        self.offsets = offsets
+        self.decode = decode
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row: int):
+        text = self.blob[self.offsets[row]:self.offsets[row + 1]].tobytes().decode("utf-8")
+        return self.decode(text) if self.decode else text
+
+    def __iter__(self):
+        return (self[row] for row in range(len(self)))
+
+
+def encode_strings(values: Sequence[str]):
+    """(UTF-8 blob, int64 row offsets) for a _StringColumn"""
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return b"".join(encoded), offsets
+
+
+def load_blob(path: Path) -> np.ndarray:
+    """Memory-mapped bytes of `path` (mmap cannot map an empty file)"""
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode="r")
+
+
+def scan(matrix: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    """matrix @ queries.T as float32, upcasting non-float32 matrices block by block"""
+    if matrix.dtype == np.float32:
+        return np.dot(matrix, queries.T)
+    # BLAS has no half-precision or int8 GEMM; blocks bound the float32 temporaries
+    scores = np.empty((len(matrix), len(queries)), dtype=np.float32)
+    for start in range(0, len(matrix), SCAN_BLOCK):
+        block = matrix[start:start + SCAN_BLOCK]
+        np.dot(block.astype(np.float32), queries.T, out=scores[start:start + len(block)])
+    return scores
+
+
+class _Snapshot:
+    """Immutable view of the index; writers swap in a new one"""
+
+    __slots__ = ("ids", "documents", "metadatas", "embeddings", "codes", "scales", "positions")
+
+    def __init__(self, ids: List[str], documents: Sequence[str], metadatas: Sequence[Dict], embeddings: np.ndarray,
+                 codes: Optional[np.ndarray] = None, scales: Optional[np.ndarray] = None):
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.embeddings = embeddings
+        # int8 codes and per-row scales when the index is quantized
+        self.codes = codes
+        self.scales = scales
+        self.positions = {chunk_id: i for i, chunk_id in enumerate(ids)}
+
+
+class _Pending:
+    """Working copy of the index during a write batch (nothing reaches disk until the batch ends)"""
+
+    def __init__(self, snapshot: _Snapshot, dtype: np.dtype):
+        self.ids = list(snapshot.ids)
+        self.documents = list(snapshot.documents)
+        self.metadatas = list(snapshot.metadatas)
+        self.positions = dict(snapshot.positions)
+        # Rows beyond `size` are spare capacity, so appends are amortized O(1)
+        self.matrix = np.array(snapshot.embeddings, dtype=dtype, ndmin=2)
+        self.size = len(self.ids)
+        self.alive = np.ones(self.size, dtype=bool)
+        self.changed = False
+
+    def append(self, ids: List[str], documents: List[str], metadatas: List[Dict], vectors: np.ndarray):
+        needed = self.size + len(ids)
+        if needed > len(self.matrix) or self.matrix.shape[1] != vectors.shape[1]:
+            grown = np.empty((max(needed, 2 * len(self.matrix)), vectors.shape[1]), dtype=self.matrix.dtype)
+            if self.size:
+                grown[:self.size] = self.matrix[:self.size]
+            self.matrix = grown
+            alive = np.zeros(len(grown), dtype=bool)
+            alive[:self.size] = self.alive[:self.size]
+            self.alive = alive
+        for chunk_id in ids:
+            self.positions[chunk_id] = len(self.ids)
+            self.ids.append(chunk_id)
+        self.documents.extend(documents)
+        self.metadatas.extend(metadatas)
+        self.matrix[self.size:needed] = vectors
+        self.alive[self.size:needed] = True
+        self.size = needed
+
+    def compacted(self):
+        """(ids, documents, metadatas, embeddings) of the live rows"""
+        keep = np.flatnonzero(self.alive[:self.size])
+        return (
+            [self.ids[i] for i in keep],
+            [self.documents[i] for i in keep],
+            [self.metadatas[i] for i in keep],
+            self.matrix[keep],
+        )
+
+
+class NumpyCollection:
+    """Chroma-compatible collection answering queries with one matrix product"""
+
+    def __init__(self, db_path: str, embedding_function: Optional[Callable[[List[str]], Sequence]] = None,
+                 dtype: str = "float32", rescore_candidates: int = 50):
+        self.path = Path(db_path) / INDEX_DIR
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.embedding_function = embedding_function
+        # int8 scans quantized codes; full-precision rows are kept as float32 for rescoring
+        self.quantized = dtype == "int8"
+        self.dtype = np.dtype("float32" if self.quantized else dtype)
+        self.rescore_candidates = rescore_candidates
+        self._write_lock = threading.Lock()
+        # Open write batches, and their shared working copy
+        self._batch_depth = 0
+        self._pending: Optional[_Pending] = None
+        self._meta_stamp = None
+        self._snapshot = self._empty()
+        self._reload()
+
+    # -- persistence -------------------------------------------------------
+
+    def _empty(self) -> _Snapshot:
+        return _Snapshot([], [], [], np.zeros((0, 0), dtype=self.dtype))
+
+    def _reload(self) -> _Snapshot:
+        """Current snapshot, re-read if another process saved a newer one"""
+        meta_path = self.path / META_FILE
+        try:
+            stat = os.stat(meta_path)
+        except FileNotFoundError:
+            # Never saved, or removed (delete_collection): the index is empty
+            if self._meta_stamp is not None:
+                self._snapshot = self._empty()
+                self._meta_stamp = None
+            return self._snapshot
+        # meta.json is always replaced, never rewritten, so a new inode means a new index
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        if stamp == self._meta_stamp:
+            return self._snapshot
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            embeddings = np.load(self.path / meta["embeddings"], mmap_mode="r")
+            documents = _StringColumn(load_blob(self.path / meta["documents"]),
+                                      np.load(self.path / meta["document_offsets"], mmap_mode="r"))
+            metadatas = _StringColumn(load_blob(self.path / meta["metadatas"]),
+                                      np.load(self.path / meta["metadata_offsets"], mmap_mode="r"), json.loads)
+            codes = scales = None
+            if self.quantized and "codes" in meta:
+                codes = np.load(self.path / meta["codes"], mmap_mode="r")
+                scales = np.load(self.path / meta["scales"], mmap_mode="r")
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Could not load vector index from {self.path}: {e}")
+            return self._snapshot
+        if self.quantized and codes is None:
+            # Index written without codes (dtype switched to int8): quantize in memory until the next save
+            codes, scales = quantize_int8(embeddings)
+        self._snapshot = _Snapshot(meta["ids"], documents, metadatas, embeddings, codes, scales)
+        self._meta_stamp = stamp
+        return self._snapshot
+
+    def _referenced_files(self) -> Set[str]:
+        """Data files named by the meta.json currently on disk"""
+        try:
+            with open(self.path / META_FILE) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return set()
+        return {value for key, value in meta.items() if isinstance(value, str)}
+
+    def _save(self, ids: List[str], documents: List[str], metadatas: List[Dict], embeddings: np.ndarray):
+        """
+        Persist a new snapshot and switch to it.
+
+        The matrix, texts and metadata go to fresh files named in meta.json,
+        and meta.json is replaced atomically last, so readers in other processes see either
+        the old or the new index, never a mix. The previous generation's
+        files are kept until the next save, so a reader that read the old
+        meta.json just before the switch can still open them.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        previous = self._referenced_files()
+        token = uuid.uuid4().hex
+        embeddings = np.ascontiguousarray(embeddings, dtype=self.dtype)
+        arrays = {"embeddings": embeddings}
+        if self.quantized:
+            arrays["codes"], arrays["scales"] = quantize_int8(embeddings)
+        blobs = {}
+        blobs["documents"], arrays["document_offsets"] = encode_strings(documents)
+        blobs["metadatas"], arrays["metadata_offsets"] = encode_strings(
+            [json.dumps(metadata) for metadata in metadatas]
+        )
+        meta = {"ids": ids}
+        for name, array in arrays.items():
+            meta[name] = f"{name}-{token}.npy"
+            np.save(self.path / meta[name], array)
+        for name, blob in blobs.items():
+            meta[name] = f"{name}-{token}.bin"
+            with open(self.path / meta[name], "wb") as f:
+                f.write(blob)
+        staging = self.path / f"{META_FILE}.tmp"
+        with open(staging, "w") as f:
+            json.dump(meta, f)
+        os.replace(staging, self.path / META_FILE)
+        # Processes still mapping an older file keep reading it until they reload
+        for stale in [*self.path.glob("*.npy"), *self.path.glob("*.bin")]:
+            if f"-{token}." not in stale.name and stale.name not in previous:
+                try:
+                    stale.unlink()
+                except OSError:
+                    pass
+        self._meta_stamp = None
+        self._reload()
+
+    @staticmethod
+    def remove(db_path: str):
+        shutil.rmtree(Path(db_path) / INDEX_DIR, ignore_errors=True)
+
+    # -- Chroma Collection API ---------------------------------------------
+
+    def count(self) -> int:
+        return len(self._reload().ids)
+
+    def add(self, ids: List[str], documents: List[str], metadatas: Optional[List[Dict]] = None,
+            embeddings: Optional[Sequence] = None):
+        """Insert new chunks (ids already present are skipped, as in Chroma)"""
+        self._write(ids, documents, metadatas, embeddings, overwrite=False)
+
+    def upsert(self, ids: List[str], documents: List[str], metadatas: Optional[List[Dict]] = None,
+               embeddings: Optional[Sequence] = None):
+        """Insert chunks, overwriting those with the same ids"""
+        self._write(ids, documents, metadatas, embeddings, overwrite=True)
+
+    @contextmanager
+    def batch(self):
+        """
+        Group writes: add / upsert / delete inside the block change an
+        in-memory copy and the index is saved once when the block exits
+        (discarded if it raises). Readers see the old index until then.
+        """
+        with self._write_lock:
+            self._batch_depth += 1
+        committed = False
+        try:
+            yield self
+            committed = True
+        finally:
+            with self._write_lock:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    pending, self._pending = self._pending, None
+                    if committed and pending is not None and pending.changed:
+                        self._save(*pending.compacted())
+
+    def _working_copy(self) -> _Pending:
+        """The batch's working copy, or a fresh one for a single write (call with the write lock held)"""
+        if self._pending is not None:
+            return self._pending
+        pending = _Pending(self._reload(), self.dtype)
+        if self._batch_depth:
+            self._pending = pending
+        return pending
+
+    def _commit(self, pending: _Pending):
+        """Save a single write's changes; batched writes are saved when the batch ends"""
+        if pending.changed and not self._batch_depth:
+            self._save(*pending.compacted())
+
+    def _write(self, ids, documents, metadatas, embeddings, overwrite: bool):
+        if embeddings is None:
+            embeddings = self.embedding_function(list(documents))
+        vectors = normalize_rows(embeddings)
+        metadatas = metadatas or [{} for _ in ids]
+        with self._write_lock:
+            pending = self._working_copy()
+            rows = []
+            for i, chunk_id in enumerate(ids):
+                position = pending.positions.get(chunk_id)
+                if position is None:
+                    rows.append(i)
+                elif overwrite:
+                    pending.documents[position] = documents[i]
+                    pending.metadatas[position] = metadatas[i]
+                    pending.matrix[position] = vectors[i]
+                    pending.changed = True
+            if not rows and not overwrite:
+                logger.warning(f"All {len(ids)} ids already exist, nothing added")
+                return
+            if rows:
+                # An id repeated within one call keeps its last occurrence
+                rows = sorted({ids[i]: i for i in rows}.values())
+                pending.append([ids[i] for i in rows], [documents[i] for i in rows],
+                               [metadatas[i] for i in rows], vectors[rows])
+                pending.changed = True
+            self._commit(pending)
+
+    def delete(self, ids: Optional[List[str]] = None):
+        """Delete chunks by id (unknown ids are ignored)"""
+        with self._write_lock:
+            pending = self._working_copy()
+            doomed = [pending.positions.pop(chunk_id) for chunk_id in ids or [] if chunk_id in pending.positions]
+            if not doomed:
+                return
+            pending.alive[doomed] = False
+            pending.changed = True
+            self._commit(pending)
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None) -> Dict:
+        """Chunks by id (all chunks when ids is None); embeddings are unit-length float32"""
+        include = include if include is not None else ["documents", "metadatas"]
+        snapshot = self._reload()
+        if ids is None:
+            rows = list(range(len(snapshot.ids)))
+        else:
+            rows = [snapshot.positions[chunk_id] for chunk_id in ids if chunk_id in snapshot.positions]
+        return {
+            "ids": [snapshot.ids[i] for i in rows],
+            "documents": [snapshot.documents[i] for i in rows] if "documents" in include else None,
+            "metadatas": [snapshot.metadatas[i] for i in rows] if "metadatas" in include else None,
+            "embeddings": (
+                np.asarray(snapshot.embeddings[rows], dtype=np.float32) if "embeddings" in include else None
+            ),
+        }
+
+    def query(self, query_embeddings: Optional[Sequence] = None, query_texts: Optional[List[str]] = None,
+              n_results: int = 10) -> Dict:
+        """
+        Top-n by cosine distance for each query, one list per query.
+
+        All queries are scored in a single matrix product (n_chunks x n_queries).
+        A quantized index scores the int8 codes, then rescores the best
+        `rescore_candidates` rows per query with the full-precision vectors,
+        so returned distances are exact.
+        """
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(list(query_texts))
+        queries = normalize_rows(query_embeddings)
+        snapshot = self._reload()
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if not len(snapshot.ids):
+            for key in results:
+                results[key] = [[] for _ in range(len(queries))]
+            return results
+
+        if snapshot.codes is None:
+            scores = scan(snapshot.embeddings, queries)
+        else:
+            scores = scan(snapshot.codes, queries) * np.asarray(snapshot.scales)[:, None]
+        for column, query in enumerate(queries):
+            if snapshot.codes is None:
+                rows = top_k(scores[:, column], n_results)
+                similarities = scores[rows, column]
+            else:
+                # Sorted row order keeps the reads from the on-disk float32 matrix sequential
+                candidates = np.sort(top_k(scores[:, column], max(n_results, self.rescore_candidates)))
+                exact = np.asarray(snapshot.embeddings[candidates], dtype=np.float32) @ query
+                best = top_k(exact, n_results)
+                rows, similarities = candidates[best], exact[best]
+            results["ids"].append([snapshot.ids[i] for i in rows])
+            results["documents"].append([snapshot.documents[i] for i in rows])
+            results["metadatas"].append([snapshot.metadatas[i] for i in rows])
+            results["distances"].append([float(1.0 - similarity) for similarity in similarities])
+        return results
@@ -0,0 +1,204 @@
+"""
+Token budget for the Gemini prompt.
+
+The prompt is assembled from sections (system prompt, knowledge-base
+sources, web results, user profile, recent conversation, question) whose
+sizes were never capped, so a few long assistant replies in the history
+could double a request's input tokens. `PromptBudget.fit` applies a
+per-item cap, a per-section cap and a total cap, cutting the least
+valuable material first (oldest messages, lowest-ranked sources, the
+lowest-priority sections), and reports every cut. `PromptStats` keeps
+rolling token counts for /api/stats.
+
+Tokens are estimated from character counts (Config.PROMPT_CHARS_PER_TOKEN)
+since counting with the Gemini tokenizer takes an API call. A sample of
+prompts (Config.PROMPT_TOKEN_COUNT_SAMPLE) is counted by Gemini's
+countTokens alongside the generation, and those counts are recorded next
+to the estimates.
+"""
+import logging
+import math
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from config import Config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TRUNCATION_MARKER = " …[truncated]"
+# A truncated item shorter than this is dropped instead
+MIN_TRUNCATED_TOKENS = 16
+
+
+class PromptSection:
+    """A named part of the prompt, made of items that can be dropped or truncated individually"""
+
+    def __init__(self, name: str, items: List[str], separator: str = "\n",
+                 max_tokens: Optional[int] = None, item_max_tokens: Optional[int] = None,
+                 priority: int = 0, required: bool = False, newest_last: bool = False):
+        self.name = name
+        self.items = [item for item in items if item]
+        self.separator = separator
+        self.max_tokens = max_tokens
+        self.item_max_tokens = item_max_tokens
+        # Lower priority is cut first when the total is over budget; required sections are never cut
+        self.priority = priority
+        self.required = required
+        # Items are most valuable first, unless newest_last (conversation history: oldest cut first)
+        self.newest_last = newest_last
+
+    def text(self) -> str:
+        return self.separator.join(self.items)
+
+
+class BudgetedPrompt:
+    """Section texts after fitting, with their token counts and the cuts made"""
+
+    def __init__(self, texts: Dict[str, str], tokens: Dict[str, int], reserved_tokens: int, cuts: List[Dict]):
+        self.texts = texts
+        self.tokens = tokens
+        self.reserved_tokens = reserved_tokens
+        self.cuts = cuts
+
+    @property
+    def total_tokens(self) -> int:
+        return self.reserved_tokens + sum(self.tokens.values())
+
+
+class PromptBudget:
+    """Fits prompt sections into per-item, per-section and total token limits"""
+
+    def __init__(self, total_tokens: Optional[int] = None, chars_per_token: Optional[float] = None):
+        self.total_tokens = Config.PROMPT_TOKEN_BUDGET if total_tokens is None else total_tokens
+        self.chars_per_token = Config.PROMPT_CHARS_PER_TOKEN if chars_per_token is None else chars_per_token
+
+    def count(self, text: str) -> int:
+        """Estimated token count of `text`"""
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """`text` cut at a word boundary to at most `max_tokens` (marker included)"""
+        if self.count(text) <= max_tokens:
+            return text
+        limit = max(0, int(max_tokens * self.chars_per_token) - len(TRUNCATION_MARKER))
+        cut = text.rfind(" ", 0, limit + 1)
+        return text[:cut if cut > limit // 2 else limit].rstrip() + TRUNCATION_MARKER
+
+    def fit(self, sections: List[PromptSection], reserved_tokens: int = 0) -> BudgetedPrompt:
+        """
+        Cut sections down to their limits, then the lowest-priority sections
+        until the total (plus `reserved_tokens` of fixed template text) fits.
+        """
+        cuts: List[Dict] = []
+        for section in sections:
+            if section.item_max_tokens:
+                self._cap_items(section, cuts)
+            if section.max_tokens is not None:
+                self._shrink(section, section.max_tokens, "section_limit", cuts)
+
+        total = reserved_tokens + sum(self.count(section.text()) for section in sections)
+        for section in sorted((s for s in sections if not s.required), key=lambda s: s.priority):
+            excess = total - self.total_tokens
+            if excess <= 0:
+                break
+            before = self.count(section.text())
+            self._shrink(section, max(0, before - excess), "total_limit", cuts)
+            total -= before - self.count(section.text())
+        if total > self.total_tokens:
+            logger.warning(f"Prompt is {total} tokens after trimming, over the {self.total_tokens} budget")
+
+        return BudgetedPrompt(
+            texts={section.name: section.text() for section in sections},
+            tokens={section.name: self.count(section.text()) for section in sections},
+            reserved_tokens=reserved_tokens,
+            cuts=cuts,
+        )
+
+    def _cap_items(self, section: PromptSection, cuts: List[Dict]):
+        removed = truncated = 0
+        for i, item in enumerate(section.items):
+            capped = self.truncate(item, section.item_max_tokens)
+            if capped is not item:
+                removed += self.count(item) - self.count(capped)
+                truncated += 1
+                section.items[i] = capped
+        if truncated:
+            cuts.append({"section": section.name, "reason": "item_limit", "dropped": 0,
+                         "truncated": truncated, "tokens_removed": removed})
+
+    def _shrink(self, section: PromptSection, limit: int, reason: str, cuts: List[Dict]):
+        """Drop the least valuable items, then truncate the last one left, until the section fits `limit`"""
+        before = self.count(section.text())
+        dropped = truncated = 0
+        while section.items and self.count(section.text()) > limit:
+            if len(section.items) > 1:
+                section.items.pop(0 if section.newest_last else -1)
+                dropped += 1
+            elif limit >= MIN_TRUNCATED_TOKENS:
+                section.items[0] = self.truncate(section.items[0], limit)
+                truncated += 1
+                break
+            else:
+                section.items.pop()
+                dropped += 1
+        if dropped or truncated:
+            cuts.append({"section": section.name, "reason": reason, "dropped": dropped,
+                         "truncated": truncated, "tokens_removed": before - self.count(section.text())})
+
+
+class PromptStats:
+    """Rolling prompt token counts (estimated, and as reported by Gemini) for /api/stats"""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._totals: Deque[int] = deque(maxlen=window)
+        self._sections: Deque[Dict[str, int]] = deque(maxlen=window)
+        self._actual: Deque[tuple] = deque(maxlen=window)
+        self.prompts = 0
+        self.trimmed = 0
+        self.cuts_by_section: Dict[str, int] = {}
+
+    def record(self, prompt: BudgetedPrompt):
+        with self._lock:
+            self.prompts += 1
+            self._totals.append(prompt.total_tokens)
+            self._sections.append(prompt.tokens)
+            if prompt.cuts:
+                self.trimmed += 1
+                for cut in prompt.cuts:
+                    self.cuts_by_section[cut["section"]] = self.cuts_by_section.get(cut["section"], 0) + 1
+
+    def record_actual(self, estimated_tokens: int, actual_tokens: int):
+        """Pair an estimate with Gemini's countTokens result for the same prompt"""
+        with self._lock:
+            self._actual.append((estimated_tokens, actual_tokens))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            totals = sorted(self._totals)
+            sections = list(self._sections)
+            actual = list(self._actual)
+            result = {
+                "prompts": self.prompts,
+                "trimmed": self.trimmed,
+                "cuts_by_section": dict(self.cuts_by_section),
+            }
+        if totals:
+            result["estimated_tokens"] = {
+                "mean": round(sum(totals) / len(totals), 1),
+                "p50": totals[len(totals) // 2],
+                "p95": totals[min(len(totals) - 1, int(0.95 * len(totals)))],
+                "max": totals[-1],
+            }
+            names = {name for tokens in sections for name in tokens}
+            result["section_tokens_mean"] = {
+                name: round(sum(tokens.get(name, 0) for tokens in sections) / len(sections), 1)
+                for name in sorted(names)
+            }
+        if actual:
+            result["counted_prompts"] = len(actual)
+            result["gemini_prompt_tokens_mean"] = round(sum(a for _, a in actual) / len(actual), 1)
+            result["actual_to_estimate"] = round(sum(a for _, a in actual) / max(1, sum(e for e, _ in actual)), 3)
+        return result
@@ -0,0 +1,178 @@
+"""
+Single-pass query classification.
+
+Sensitivity, financial-term and context checks used to lowercase and
+re-scan the message once per keyword list. `QueryClassifier` compiles all
+keyword lists from query_keywords.json into one Aho-Corasick automaton, so
+a single pass over the lowercased message finds every keyword, overlapping
+matches included, in time that does not grow with the number of keywords.
+The immutable `QueryClassification` is computed once per request and
+carried on the RAGPipeline.
+"""
+import json
+import logging
+import re
+import threading
+from collections import deque
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from config import Config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Highest priority first: a message matching several classes gets the first
+SENSITIVITY_ORDER = ("DANGER", "ABUSE", "SENSITIVE")
+
+Label = Tuple[str, str]
+
+
+class AhoCorasick:
+    """Keyword automaton reporting the labels of every (overlapping) substring match in one pass"""
+
+    def __init__(self, terms: Dict[str, Iterable[Label]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[FrozenSet[Label]] = [frozenset()]
+
+        for term, labels in terms.items():
+            state = 0
+            for char in term:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(frozenset())
+                state = next_state
+            self._out[state] = self._out[state] | frozenset(labels)
+
+        # Breadth-first failure links; each state also reports its suffixes' labels
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._out[next_state] = self._out[next_state] | self._out[self._fail[next_state]]
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def labels(self, text: str) -> Set[Label]:
+        """Labels of all keywords occurring in `text`"""
+        goto, fail, out = self._goto, self._fail, self._out
+        found: Set[Label] = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+class QueryClassification(NamedTuple):
+    """Everything the pipeline needs to know about a message, computed in one pass"""
+
+    sensitivity_type: str  # "DANGER", "ABUSE", "SENSITIVE" or ""
+    is_vague: bool
+    has_context: bool
+    needs_clarification: bool
+    financial_terms: Tuple[str, ...]
+    sub_questions: Tuple[str, ...]
+    word_count: int
+
+    @property
+    def is_sensitive(self) -> bool:
+        return bool(self.sensitivity_type)
+
+
+class QueryClassifier:
+    """Classifies messages with one keyword automaton and one prefix regex"""
+
+    def __init__(self, sensitivity: Dict[str, List[str]], financial: List[str], context: List[str],
+                 vague_prefixes: List[str]):
+        terms: Dict[str, Set[Label]] = {}
+        for sensitivity_type, keywords in sensitivity.items():
+            for keyword in keywords:
+                terms.setdefault(keyword.lower(), set()).add(("sensitivity", sensitivity_type))
+        for keyword in financial:
+            terms.setdefault(keyword.lower(), set()).add(("financial", keyword.lower()))
+        for keyword in context:
+            terms.setdefault(keyword.lower(), set()).add(("context", ""))
+        self._automaton = AhoCorasick(terms)
+        # Sensitivity classes not in SENSITIVITY_ORDER rank after it, in file order
+        self._sensitivity_order = list(SENSITIVITY_ORDER) + [
+            name for name in sensitivity if name not in SENSITIVITY_ORDER
+        ]
+        self._vague = re.compile("|".join(f"(?:{prefix})" for prefix in vague_prefixes)) if vague_prefixes else None
+
+    @classmethod
+    def from_file(cls, path: str) -> "QueryClassifier":
+        """Build from a keywords JSON file (see query_keywords.json)"""
+        with open(path) as f:
+            data = json.load(f)
+        classifier = cls(
+            sensitivity=data.get("sensitivity", {}),
+            financial=data.get("financial", []),
+            context=data.get("context", []),
+            vague_prefixes=data.get("vague_prefixes", []),
+        )
+        logger.info(f"Loaded query classifier from {path} ({len(classifier._automaton)} automaton states)")
+        return classifier
+
+    def classify(self, query: str) -> QueryClassification:
+        """Classify a message in a single pass over its lowercased text"""
+        lowered = query.lower()
+        labels = self._automaton.labels(lowered)
+
+        matched_types = {name for kind, name in labels if kind == "sensitivity"}
+        sensitivity_type = next((name for name in self._sensitivity_order if name in matched_types), "")
+        financial_terms = tuple(sorted(term for kind, term in labels if kind == "financial"))
+        has_context = ("context", "") in labels
+
+        is_vague = bool(self._vague and self._vague.match(lowered))
+        word_count = len(query.split())
+        needs_clarification = ((is_vague and word_count < 5) or word_count < 3) and not has_context
+
+        return QueryClassification(
+            sensitivity_type=sensitivity_type,
+            is_vague=is_vague,
+            has_context=has_context,
+            needs_clarification=needs_clarification,
+            financial_terms=financial_terms,
+            sub_questions=self._split_questions(query, bool(financial_terms)),
+            word_count=word_count,
+        )
+
+    @staticmethod
+    def _split_questions(query: str, has_financial_terms: bool) -> Tuple[str, ...]:
+        """Sub-questions of a compound message, for retrieval"""
+        query = query.strip()
+        questions = re.split(r'[?]\s+', query)
+        questions = [q.strip() + '?' if not q.endswith('?') and q else q.strip()
+                     for q in questions if q.strip()]
+
+        # A short single question without financial terms is kept as typed (likely too vague to expand)
+        if len(questions) == 1 and not has_financial_terms and len(query.split()) < 5:
+            return (query,)
+        return tuple(questions) if questions else (query,)
+
+
+_classifier: Optional[QueryClassifier] = None
+_classifier_lock = threading.Lock()
+
+
+def get_query_classifier() -> QueryClassifier:
+    """Process-wide classifier built from Config.QUERY_KEYWORDS_PATH (loaded once)"""
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None:
+            _classifier = QueryClassifier.from_file(Config.QUERY_KEYWORDS_PATH)
+        return _classifier
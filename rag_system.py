@@ -1,20 +1,63 @@
-import google.generativeai as genai
-from typing import List, Dict, Optional, Generator
+from typing import AsyncIterator, List, Dict, Optional
 import logging
 from datetime import datetime
-import re
+
+from config import Config
+from llm_client import LLMClient, create_llm_client
+from prompt_budget import PromptBudget, PromptSection, PromptStats
+from query_classifier import QueryClassification, QueryClassifier, get_query_classifier
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+NO_CONTEXT = "No relevant documents found in the knowledge base."
+
+PROMPT_TEMPLATE = """{system_prompt}
+
+Based on the following context from the knowledge base, please answer the user's question about women's finance.
+
+Context from Knowledge Base:
+{context}
+{web_search_info}
+{user_context}
+
+Previous Conversation:
+{summary}{history}
+
+User Question: {query}
+
+Instructions:
+- Provide a helpful, empathetic, and accurate answer
+- Use proper markdown formatting with **bold** for emphasis
+- Structure your response with clear paragraphs and bullet points
+- If you need more information, ask 1-2 specific clarifying questions
+- If information is not fully available, be honest and suggest next steps
+- Format for readability with proper line breaks
+
+Now provide your response:"""
+
 
 class RAGSystem:
     """Enhanced RAG """
     
-    def __init__(self, api_key: str, vector_store, model_name: str = "gemini-2.5-flash"):
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(model_name)
+    # Number of most recent messages (including the current one) put in the prompt
+    HISTORY_MESSAGES = 6
+    
+    # Sub-questions of a compound message retrieved for (in one batched search)
+    MAX_SUB_QUERIES = 4
+    
+    GENERATION_CONFIG = {"temperature": 0.7, "top_p": 0.8, "top_k": 40}
+    
+    def __init__(self, api_key: str, vector_store, model_name: str = "gemini-2.5-flash",
+                 answer_cache=None, classifier: Optional[QueryClassifier] = None,
+                 llm: Optional[LLMClient] = None):
+        # Concurrency limit, deadlines and retries for every LLM call (Config.LLM_*)
+        self.llm = llm or create_llm_client(model_name, api_key=api_key)
         self.vector_store = vector_store
+        # Optional SemanticAnswerCache for repeat first-turn questions
+        self.answer_cache = answer_cache
+        # Keyword classifier shared by every request (lists in query_keywords.json)
+        self.classifier = classifier or get_query_classifier()
         
         # Enhanced system prompt - Pia, AI assistant for Creating Wings
         self.system_prompt = """You are Pia, an AI assistant and part of Creating Wings, an NGO dedicated to empowering women through accessible, AI-powered financial guidance and career development resources.
@@ -75,93 +118,32 @@ RESPONSE GUIDELINES:
 
 Remember: As Pia, you're part of Creating Wings' mission to empower women. You're helping women build financial confidence and independence through education and support. Every response should move them forward, even if it's just a small step. Be their ally, not their teacher—support their journey with respect and belief in their capabilities. You're here to bridge the financial literacy gap and help them achieve self-sufficiency with confidence.
 """
+        
+        # Prompt sections are fitted to Config.PROMPT_* token limits; sizes are reported in /api/stats
+        self.prompt_budget = PromptBudget()
+        self.prompt_stats = PromptStats()
+        self._prompt_frame_tokens = self.prompt_budget.count(PROMPT_TEMPLATE.format(
+            system_prompt="", context="", web_search_info="", user_context="", summary="", history="",
+            query=""
+        ))
     
     def preprocess_query(self, query: str) -> List[str]:
         """Preprocess and chunk user query for better retrieval"""
-        # Clean the query
-        query = query.strip()
-        
-        # Split compound questions
-        questions = re.split(r'[?]\s+', query)
-        questions = [q.strip() + '?' if not q.endswith('?') and q else q.strip() 
-                    for q in questions if q.strip()]
-        
-        # If it's a single question, try to extract key concepts
-        if len(questions) == 1:
-            # Extract key financial terms and concepts
-            query_lower = query.lower()
-            financial_keywords = [
-                'investment', 'savings', 'retirement', 'budget', 'debt', 'credit',
-                'insurance', 'tax', 'mortgage', 'loan', 'income', 'expense',
-                'portfolio', '401k', 'ira', 'stocks', 'bonds', 'mutual fund'
-            ]
-            
-            # Check if query needs expansion
-            has_keywords = any(keyword in query_lower for keyword in financial_keywords)
-            if not has_keywords and len(query.split()) < 5:
-                # Query might be too vague
-                return [query]  # Return as-is, let the system ask clarifying questions
-        
-        return questions if questions else [query]
+        return list(self.classifier.classify(query).sub_questions)
     
     def analyze_query_completeness(self, query: str, conversation_history: List[Dict] = None) -> Dict:
         """Analyze if query has enough context or needs clarification"""
-        query_lower = query.lower()
-        
-        # Patterns indicating incomplete queries
-        vague_patterns = [
-            r'^how\s+(do|can|should)',
-            r'^what\s+is',
-            r'^tell\s+me\s+about',
-            r'^help\s+with',
-        ]
-        
-        is_vague = any(re.match(pattern, query_lower) for pattern in vague_patterns)
-        word_count = len(query.split())
-        
-        # Check if question is too short or vague
-        needs_clarification = (is_vague and word_count < 5) or word_count < 3
-        
-        # Check for missing context indicators
-        context_indicators = ['my', 'i', 'me', 'specific', 'situation', 'current']
-        has_context = any(indicator in query_lower for indicator in context_indicators)
-        
+        classification = self.classifier.classify(query)
         return {
-            "needs_clarification": needs_clarification and not has_context,
-            "is_vague": is_vague,
-            "has_context": has_context
+            "needs_clarification": classification.needs_clarification,
+            "is_vague": classification.is_vague,
+            "has_context": classification.has_context
         }
     
     def detect_sensitive_content(self, query: str) -> tuple:
         """Enhanced detection of sensitive or dangerous content"""
-        sensitive_keywords = [
-            'suicide', 'self-harm', 'kill myself', 'end my life', 'want to die',
-            'abuse', 'domestic violence', 'violence', 'beaten', 'hurt me',
-            'fraud', 'illegal', 'scam', 'stolen',
-            'emergency', 'crisis', 'immediate danger', '911'
-        ]
-        
-        query_lower = query.lower()
-        
-        # Check for immediate danger keywords
-        danger_keywords = ['suicide', 'kill myself', 'end my life', 'want to die', 'harm myself']
-        for keyword in danger_keywords:
-            if keyword in query_lower:
-                return True, "DANGER"
-        
-        # Check for abuse/violence
-        abuse_keywords = ['abuse', 'violence', 'beaten', 'hurt me', 'threaten']
-        for keyword in abuse_keywords:
-            if keyword in query_lower:
-                return True, "ABUSE"
-        
-        # Check for sensitive keywords (financial crisis, legal issues)
-        sensitive_patterns = ['financial crisis', 'bankruptcy', 'losing everything', 'can\'t pay']
-        for pattern in sensitive_patterns:
-            if pattern in query_lower:
-                return True, "SENSITIVE"
-        
-        return False, ""
+        classification = self.classifier.classify(query)
+        return classification.is_sensitive, classification.sensitivity_type
     
     def is_query_contextual(self, retrieved_docs: List[Dict], threshold: float = 0.85) -> bool:
         """Check if query is contextual based on retrieved document relevance"""
@@ -208,11 +190,26 @@ Remember: As Pia, you're part of Creating Wings' mission to empower women. You'r
     def build_context(self, retrieved_docs: List[Dict]) -> str:
         """Build intelligent context string from retrieved documents"""
         if not retrieved_docs:
-            return "No relevant documents found in the knowledge base."
-        
+            return NO_CONTEXT
+        return "\n---\n".join(self.build_context_parts(retrieved_docs))
+    
+    def build_context_parts(self, retrieved_docs: List[Dict]) -> List[str]:
+        """Formatted knowledge-base sources for the prompt, most relevant first"""
         # Sort by relevance (lower distance = more relevant)
         sorted_docs = sorted(retrieved_docs, key=lambda x: x.get('distance', 1.0))
         
+        # Merged sub-question results: take the best of each sub-question in turn,
+        # so one well-matched sub-question cannot crowd the others out of the top 5
+        groups: Dict[int, List[Dict]] = {}
+        for doc in sorted_docs:
+            groups.setdefault(doc.get('query_index', 0), []).append(doc)
+        if len(groups) > 1:
+            ranked = [group for _, group in sorted(groups.items())]
+            sorted_docs = [
+                group[rank] for rank in range(max(len(group) for group in ranked))
+                for group in ranked if rank < len(group)
+            ]
+        
         # Only use highly relevant documents (distance < 0.8)
         relevant_docs = [doc for doc in sorted_docs if doc.get('distance', 1.0) < 0.8]
         
@@ -230,7 +227,7 @@ Remember: As Pia, you're part of Creating Wings' mission to empower women. You'r
             if content:
                 context_parts.append(f"[Source {i} from {filename}]:\n{content}\n")
         
-        return "\n---\n".join(context_parts)
+        return context_parts
     
     def _generate_redirect_response(self, current_query: str, meaningful_questions: List[str]) -> str:
         """Generate a playful redirect response to previous meaningful questions"""
@@ -257,8 +254,8 @@ Remember: As Pia, you're part of Creating Wings' mission to empower women. You'r
         
         return "\n".join(response_parts)
     
-    def generate_follow_up_questions(self, query: str, retrieved_docs: List[Dict], 
-                                    conversation_history: List[Dict] = None) -> Optional[str]:
+    async def generate_follow_up_questions(self, query: str, retrieved_docs: List[Dict], 
+                                          conversation_history: List[Dict] = None) -> Optional[str]:
         """Generate clarifying questions when query needs more context"""
         analysis = self.analyze_query_completeness(query, conversation_history)
         
@@ -278,8 +275,7 @@ Example format:
 Generate questions now:"""
         
         try:
-            response = self.model.generate_content(prompt)
-            questions = response.text.strip() if hasattr(response, 'text') else None
+            questions = (await self.llm.generate(prompt)).strip()
             
             # Extract questions from response
             if questions and len(questions) > 10:
@@ -289,80 +285,108 @@ Generate questions now:"""
         
         return None
     
-    def generate_response_stream(self, query: str, conversation_history: List[Dict] = None, 
-                                 use_web_search: bool = False, web_search_results: str = "",
-                                 user_metadata: Optional[Dict] = None) -> Generator[str, None, None]:
-        """Generate streaming response using RAG"""
-        # Check for sensitive content
-        is_sensitive, sensitivity_type = self.detect_sensitive_content(query)
-        
-        if is_sensitive:
+    def build_pipeline(self, query: str, conversation_history: List[Dict] = None,
+                       user_metadata: Optional[Dict] = None,
+                       web_search_results: str = "",
+                       conversation_summary: str = "",
+                       earlier_questions: Optional[List[str]] = None) -> "RAGPipeline":
+        """
+        Run classification and retrieval once for a request.
+
+        The returned pipeline carries everything later stages need, so a
+        request costs one embedding batch + one vector query and at most one
+        LLM call (in astream_pipeline / arun_pipeline).
+        """
+        pipeline = RAGPipeline(query, conversation_history, user_metadata, web_search_results,
+                               conversation_summary, earlier_questions)
+        
+        # One keyword pass covers sensitivity, vagueness, financial terms and sub-questions
+        pipeline.classification = self.classifier.classify(query)
+        pipeline.is_sensitive = pipeline.classification.is_sensitive
+        pipeline.sensitivity_type = pipeline.classification.sensitivity_type
+        
+        if pipeline.is_sensitive:
             escalation_responses = {
                 "DANGER": "I'm concerned about your safety. **Please contact 911 immediately** or the National Suicide Prevention Lifeline at **988** for immediate help.",
                 "ABUSE": "I want to make sure you get the support you need. Please contact the **National Domestic Violence Hotline at 1-800-799-7233** for confidential support and resources.",
                 "SENSITIVE": "I understand this is an important concern. For comprehensive support with this financial situation, I recommend connecting with a **certified financial planner** or calling the **Consumer Financial Protection Bureau at 1-855-411-2372** for guidance."
             }
-            response_text = escalation_responses.get(sensitivity_type, 
+            pipeline.response_type = "escalation"
+            pipeline.canned_response = escalation_responses.get(pipeline.sensitivity_type,
                 "I want to make sure you get the best support. Please contact **911 for emergencies** or a professional counselor for assistance.")
-            
-            for char in response_text:
-                yield char
-            return
+            return pipeline
         
         # Preprocess query for better retrieval
-        query_chunks = self.preprocess_query(query)
-        main_query = query_chunks[0] if query_chunks else query
+        pipeline.query_chunks = list(pipeline.classification.sub_questions)
+        main_query = pipeline.query_chunks[0] if pipeline.query_chunks else query
         
-        # Retrieve relevant documents
-        retrieved_docs = self.vector_store.search(main_query, n_results=7)
+        # Retrieve for every sub-question at once (one embedding batch, one vector query)
+        sub_queries = pipeline.query_chunks[:self.MAX_SUB_QUERIES] or [query]
+        if len(sub_queries) > 1:
+            pipeline.retrieved_docs = self.vector_store.search_many(sub_queries, n_results=7)
+        else:
+            pipeline.retrieved_docs = self.vector_store.search(main_query, n_results=7)
         
         # Check if query is contextual (relevant to knowledge base)
-        is_contextual = self.is_query_contextual(retrieved_docs, threshold=0.85)
-        
-        # Check if this is the first message in the conversation
-        is_first_message = (
-            not conversation_history or 
-            len(conversation_history) == 0 or
-            (len(conversation_history) == 1 and conversation_history[0].get('role') == 'user')
-        )
+        pipeline.is_contextual = self.is_query_contextual(pipeline.retrieved_docs, threshold=0.85)
         
         # If query is not contextual, redirect to previous meaningful questions
         # BUT: Allow first message to proceed even if off-topic (user might be exploring)
-        if not is_contextual and not is_first_message:
-            meaningful_questions = self.extract_meaningful_questions(conversation_history, limit=3)
+        if not pipeline.is_contextual and not pipeline.is_first_message:
+            # Questions already folded into the summary, then those still in the recent window
+            meaningful_questions = (
+                pipeline.earlier_questions +
+                self.extract_meaningful_questions(pipeline.conversation_history, limit=3)
+            )[-3:]
+            pipeline.response_type = "redirect"
             
             if meaningful_questions:
-                redirect_response = self._generate_redirect_response(query, meaningful_questions)
-                for char in redirect_response:
-                    yield char
-                return
+                pipeline.canned_response = self._generate_redirect_response(query, meaningful_questions)
             else:
                 # No previous questions, give a playful response anyway
-                playful_response = "Haha, that's an interesting question! 😄 I'm actually here to help with women's financial and health empowerment. Want to chat about **financial planning**, **investing**, **budgeting**, or **wellness** instead?"
-                for char in playful_response:
-                    yield char
-                return
+                pipeline.canned_response = "Haha, that's an interesting question! 😄 I'm actually here to help with women's financial and health empowerment. Want to chat about **financial planning**, **investing**, **budgeting**, or **wellness** instead?"
+            return pipeline
         
-        context = self.build_context(retrieved_docs)
+        pipeline.context_parts = self.build_context_parts(pipeline.retrieved_docs)
         
         # Determine if web search is needed
-        needs_web_search = len(retrieved_docs) == 0 or all(
-            doc.get('distance', 1.0) > 0.75 for doc in retrieved_docs
+        pipeline.needs_web_search = len(pipeline.retrieved_docs) == 0 or all(
+            doc.get('distance', 1.0) > 0.75 for doc in pipeline.retrieved_docs
         )
         
-        # Build conversation history context
-        history_context = ""
-        if conversation_history:
-            recent_history = conversation_history[-6:]  # Last 6 messages for better context
-            history_context = "\n".join([
-                f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}"
-                for msg in recent_history
-            ])
+        # Reuse the answer to an equivalent first question (history would change the answer)
+        if self.answer_cache is not None and pipeline.is_first_message:
+            pipeline.answer_cache_key = self.answer_cache.make_key(
+                [doc['id'] for doc in pipeline.retrieved_docs if doc.get('id')],
+                user_metadata
+            )
+            # Served from the query-embedding cache filled by the search above
+            pipeline.query_embedding = self.vector_store.embed_query(main_query)
+            pipeline.kb_version = self.vector_store.get_knowledge_base_version()
+            cached_answer = self.answer_cache.lookup(
+                pipeline.answer_cache_key, pipeline.query_embedding, pipeline.kb_version
+            )
+            if cached_answer is not None:
+                pipeline.cache_hit = True
+                pipeline.canned_response = cached_answer
+        
+        return pipeline
+    
+    def build_prompt(self, pipeline: "RAGPipeline") -> str:
+        """Build the full Gemini prompt for a prepared pipeline, fitted to the prompt token budget"""
+        conversation_history = pipeline.conversation_history
+        user_metadata = pipeline.user_metadata
+        
+        # Conversation history, oldest first: the recent window plus any messages not yet in the
+        # running summary (the budget drops the oldest messages first)
+        history_items = [
+            f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}"
+            for msg in conversation_history
+        ]
         
         # Build user context from metadata
-        user_context = ""
+        user_parts = []
         if user_metadata:
-            user_parts = []
             if user_metadata.get('age'):
                 user_parts.append(f"Age: {user_metadata['age']}")
             if user_metadata.get('income_range'):
@@ -373,86 +397,153 @@ Generate questions now:"""
                 user_parts.append(f"Employment: {user_metadata['employment_status']}")
             if user_metadata.get('education'):
                 user_parts.append(f"Education: {user_metadata['education']}")
-            if user_parts:
-                user_context = f"\n\nUser Profile:\n" + "\n".join(f"- {part}" for part in user_parts)
+        
+        web_items = []
+        if pipeline.needs_web_search and pipeline.web_search_results:
+            web_items = [pipeline.web_search_results]
+        
+        # Cut first when over the total: older history, then the summary and web results, then sources,
+        # then the profile
+        prompt = self.prompt_budget.fit([
+            PromptSection("system", [self.system_prompt], required=True),
+            PromptSection("context", pipeline.context_parts, separator="\n---\n",
+                          max_tokens=Config.PROMPT_CONTEXT_TOKENS, priority=2),
+            PromptSection("web", web_items, max_tokens=Config.PROMPT_WEB_TOKENS, priority=1),
+            PromptSection("profile", [f"- {part}" for part in user_parts], priority=3),
+            PromptSection("summary", [pipeline.conversation_summary], max_tokens=Config.PROMPT_SUMMARY_TOKENS,
+                          priority=1),
+            PromptSection("history", history_items, max_tokens=Config.PROMPT_HISTORY_TOKENS,
+                          item_max_tokens=Config.PROMPT_HISTORY_MESSAGE_TOKENS, priority=0, newest_last=True),
+            PromptSection("question", [pipeline.query], required=True),
+        ], reserved_tokens=self._prompt_frame_tokens)
+        pipeline.prompt_tokens = prompt.total_tokens
+        pipeline.prompt_cuts = prompt.cuts
+        self.prompt_stats.record(prompt)
+        if prompt.cuts:
+            logger.info(f"Prompt trimmed to ~{prompt.total_tokens} tokens: {prompt.cuts}")
+        texts = prompt.texts
         
         web_search_info = ""
-        if needs_web_search and web_search_results:
-            web_search_info = f"\n\nAdditional Information from Web Search:\n{web_search_results}\n"
-        elif needs_web_search and not web_search_results:
+        if texts["web"]:
+            web_search_info = f"\n\nAdditional Information from Web Search:\n{texts['web']}\n"
+        elif pipeline.needs_web_search:
             web_search_info = "\n\nNote: The requested information is not fully available in the knowledge base. Provide a helpful answer based on your knowledge while indicating limitations.\n"
         
-        # Build the enhanced prompt
-        full_prompt = f"""{self.system_prompt}
-
-Based on the following context from the knowledge base, please answer the user's question about women's finance.
-
-Context from Knowledge Base:
-{context}
-{web_search_info}
-{user_context}
-
-Previous Conversation:
-{history_context if history_context else "No previous conversation."}
-
-User Question: {query}
-
-Instructions:
-- Provide a helpful, empathetic, and accurate answer
-- Use proper markdown formatting with **bold** for emphasis
-- Structure your response with clear paragraphs and bullet points
-- If you need more information, ask 1-2 specific clarifying questions
-- If information is not fully available, be honest and suggest next steps
-- Format for readability with proper line breaks
-
-Now provide your response:"""
+        return PROMPT_TEMPLATE.format(
+            system_prompt=texts["system"],
+            context=texts["context"] or NO_CONTEXT,
+            web_search_info=web_search_info,
+            user_context=f"\n\nUser Profile:\n{texts['profile']}" if texts["profile"] else "",
+            summary=f"Summary of earlier messages: {texts['summary']}\n\nRecent messages:\n" if texts["summary"] else "",
+            history=texts["history"] or "No previous conversation.",
+            query=texts["question"],
+        )
+    
+    async def astream_pipeline(self, pipeline: "RAGPipeline") -> AsyncIterator[str]:
+        """Stream the answer for a prepared pipeline (at most one LLM call)"""
+        # Canned replies and answer-cache hits (which set canned_response too)
+        if pipeline.canned_response is not None:
+            yield pipeline.canned_response
+            return
+        
+        full_prompt = self.build_prompt(pipeline)
         
         try:
-            # Generate streaming response
-            response = self.model.generate_content(
-                full_prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.7,
-                    top_p=0.8,
-                    top_k=40,
-                ),
-                stream=True
-            )
+            parts = []
+            usage: Dict = {}
+            async for text in self.llm.stream(full_prompt, self.GENERATION_CONFIG, usage):
+                parts.append(text)
+                yield text
+            
+            # Calibrate the character-based estimate against Gemini's own count (sampled prompts only)
+            if usage.get("prompt_tokens"):
+                self.prompt_stats.record_actual(pipeline.prompt_tokens, usage["prompt_tokens"])
             
-            for chunk in response:
-                if hasattr(chunk, 'text') and chunk.text:
-                    yield chunk.text
+            # Web results are time-sensitive, so those answers are not reused
+            if pipeline.answer_cache_key is not None and parts and not pipeline.web_search_results:
+                self.answer_cache.store(
+                    pipeline.answer_cache_key, pipeline.query_embedding, "".join(parts), pipeline.kb_version
+                )
                     
         except Exception as e:
             logger.error(f"Error generating streaming response: {e}")
-            error_msg = "I apologize, but I encountered an error while processing your question. Please try again or rephrase your question."
-            for char in error_msg:
-                yield char
+            pipeline.response_type = "error"
+            yield "I apologize, but I encountered an error while processing your question. Please try again or rephrase your question."
+    
+    async def arun_pipeline(self, pipeline: "RAGPipeline") -> Dict:
+        """Generate the full answer for a prepared pipeline, with its metadata"""
+        full_response = "".join([text async for text in self.astream_pipeline(pipeline)])
+        result = pipeline.metadata()
+        result["response"] = full_response
+        return result
+
+
+class RAGPipeline:
+    """Per-request state carried through classification, retrieval and generation"""
+    
+    def __init__(self, query: str, conversation_history: List[Dict] = None,
+                 user_metadata: Optional[Dict] = None, web_search_results: str = "",
+                 conversation_summary: str = "", earlier_questions: Optional[List[str]] = None):
+        self.query = query
+        self.conversation_history = conversation_history or []
+        # Running summary of the messages before conversation_history, and their meaningful questions
+        self.conversation_summary = conversation_summary
+        self.earlier_questions = earlier_questions or []
+        self.user_metadata = user_metadata
+        self.web_search_results = web_search_results
+        
+        # Classification
+        self.classification: Optional[QueryClassification] = None
+        self.is_sensitive = False
+        self.sensitivity_type = ""
+        self.query_chunks: List[str] = []
+        
+        # Retrieval
+        self.retrieved_docs: List[Dict] = []
+        self.is_contextual = False
+        self.context_parts: List[str] = []
+        
+        # Prompt size after budgeting (estimated tokens) and what was cut to fit
+        self.prompt_tokens = 0
+        self.prompt_cuts: List[Dict] = []
+        self.needs_web_search = False
+        
+        # "generated" (LLM answer), "escalation", "redirect" or "error"
+        self.response_type = "generated"
+        self.canned_response: Optional[str] = None
+        
+        # Semantic answer cache
+        self.answer_cache_key: Optional[tuple] = None
+        self.query_embedding = None
+        self.kb_version = ""
+        self.cache_hit = False
     
-    def generate_response(self, query: str, conversation_history: List[Dict] = None, 
-                         use_web_search: bool = False, web_search_results: str = "",
-                         user_metadata: Optional[Dict] = None) -> Dict:
-        """Generate non-streaming response using RAG (for backwards compatibility)"""
-        full_response = ""
-        for chunk in self.generate_response_stream(query, conversation_history, use_web_search, web_search_results, user_metadata):
-            full_response += chunk
-        
-        # Check for escalation in the response
-        is_sensitive, sensitivity_type = self.detect_sensitive_content(query)
-        
-        # Retrieve docs for metadata
-        query_chunks = self.preprocess_query(query)
-        main_query = query_chunks[0] if query_chunks else query
-        retrieved_docs = self.vector_store.search(main_query, n_results=5)
-        needs_web_search = len(retrieved_docs) == 0 or all(
-            doc.get('distance', 1.0) > 0.75 for doc in retrieved_docs
+    @property
+    def is_first_message(self) -> bool:
+        """True when the history holds nothing but the current user message"""
+        history = self.conversation_history
+        return (
+            len(history) == 0 or
+            (len(history) == 1 and history[0].get('role') == 'user')
         )
-        
+    
+    @property
+    def requires_web_search(self) -> bool:
+        """True when the answer would benefit from web results not yet attached"""
+        return (
+            self.response_type == "generated" and
+            not self.cache_hit and
+            self.needs_web_search and
+            not self.web_search_results
+        )
+    
+    def metadata(self) -> Dict:
+        """Response metadata shared by /api/chat and the final SSE event"""
         return {
-            "response": full_response,
-            "escalate": is_sensitive,
-            "escalation_type": sensitivity_type if is_sensitive else None,
-            "requires_web_search": needs_web_search and not web_search_results,
-            "context_used": len(retrieved_docs) > 0
+            "escalate": self.is_sensitive,
+            "escalation_type": self.sensitivity_type if self.is_sensitive else None,
+            "requires_web_search": self.requires_web_search,
+            "context_used": len(self.retrieved_docs) > 0,
+            "response_type": self.response_type,
+            "cache_hit": self.cache_hit
         }
-
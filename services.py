@@ -0,0 +1,123 @@
+"""
+Lazy construction and background warm-up of the heavy services.
+
+Building the vector store (embedding model + index) and the RAG system
+(Gemini client) at import time kept a worker from answering anything, even
+its health check, until everything had loaded. `Services` builds each
+registered component on first use or on a warm-up thread started with the
+app, and records per-component state for the liveness / readiness probes.
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class Services:
+    """Registry of lazily built services with per-component readiness"""
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], object]] = {}
+        self._warmups: Dict[str, Optional[Callable[[object], None]]] = {}
+        self._instances: Dict[str, object] = {}
+        self._state: Dict[str, Dict] = {}
+        # In-progress (or last failed) build per component; waiters block on or await it
+        self._builds: Dict[str, Future] = {}
+        self._builds_lock = threading.Lock()
+        self._warmup_thread: Optional[threading.Thread] = None
+        self.started_at = time.time()
+
+    def register(self, name: str, factory: Callable[[], object],
+                 warmup: Optional[Callable[[object], None]] = None):
+        """Register a component; `warmup(instance)` runs once after construction"""
+        self._factories[name] = factory
+        self._warmups[name] = warmup
+        self._state[name] = {"status": "pending"}
+
+    def _claim(self, name: str) -> Tuple[Future, bool]:
+        """The component's current build, and whether the caller has to run it (no build in progress)"""
+        with self._builds_lock:
+            future = self._builds.get(name)
+            if future is not None and (not future.done() or name in self._instances):
+                return future, False
+            # Never built, or the last attempt failed: start a new build
+            future = self._builds[name] = Future()
+            return future, True
+
+    def _build(self, name: str, future: Future):
+        """Construct and warm a component, resolving `future` with it (or with the error)"""
+        state = self._state[name]
+        state.clear()
+        state["status"] = "loading"
+        start = time.perf_counter()
+        try:
+            instance = self._factories[name]()
+            warmup = self._warmups[name]
+            if warmup is not None:
+                warmup(instance)
+        except Exception as e:
+            state.update(status="failed", error=str(e), seconds=round(time.perf_counter() - start, 3))
+            logger.error(f"Failed to start {name}: {e}")
+            future.set_exception(e)
+            return
+        self._instances[name] = instance
+        state.update(status="ready", seconds=round(time.perf_counter() - start, 3))
+        logger.info(f"{name} ready in {state['seconds']}s")
+        future.set_result(instance)
+
+    def get(self, name: str):
+        """The component, building (and warming) it first if needed; blocks while another thread does"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        future, build = self._claim(name)
+        if build:
+            self._build(name, future)
+        return future.result()
+
+    async def aget(self, name: str):
+        """
+        `get` for the event loop: a missing component is built on its own
+        thread and awaited, so waiting requests hold no executor thread
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        future, build = self._claim(name)
+        if build:
+            threading.Thread(target=self._build, args=(name, future), name=f"build-{name}", daemon=True).start()
+        return await asyncio.wrap_future(future)
+
+    def peek(self, name: str):
+        """The component if it is ready, else None (never triggers a build)"""
+        return self._instances.get(name)
+
+    def start_warmup(self, names: Optional[List[str]] = None):
+        """Build and warm components in order on a background thread (failures are retried on first use)"""
+        names = list(names or self._factories)
+
+        def warm():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception:
+                    pass  # recorded in the component state by get()
+
+        self._warmup_thread = threading.Thread(target=warm, name="service-warmup", daemon=True)
+        self._warmup_thread.start()
+
+    def is_ready(self) -> bool:
+        return all(state["status"] == "ready" for state in self._state.values())
+
+    def readiness(self) -> Dict:
+        """Readiness report: overall flag plus status / build seconds / error per component"""
+        return {
+            "ready": self.is_ready(),
+            "uptime_seconds": round(time.time() - self.started_at, 3),
+            "components": {name: dict(state) for name, state in self._state.items()},
+        }
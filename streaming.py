@@ -0,0 +1,121 @@
+"""
+Server-sent event framing for streamed chat answers.
+
+Every upstream piece used to become its own `data:` frame, so a canned
+reply streamed character by character cost one JSON encode and one
+network write per character. `coalesce_chunks` sits between the answer
+generator and the SSE encoder: pieces that are already frame-sized (Gemini
+chunks, whole canned replies) pass straight through, smaller ones are
+merged into word-aligned frames, and nothing is held back for longer than
+a short deadline.
+"""
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional
+
+from config import Config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# A frame may end after any of these without splitting a word
+BOUNDARY_CHARS = frozenset(" \t\n.,;:!?")
+
+
+def sse_event(payload: Dict) -> str:
+    """One SSE `data:` frame carrying a JSON payload"""
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def _last_boundary(text: str) -> int:
+    """Length of the longest prefix of `text` that ends on a word boundary (0 if none)"""
+    for i in range(len(text) - 1, -1, -1):
+        if text[i] in BOUNDARY_CHARS:
+            return i + 1
+    return 0
+
+
+async def coalesce_chunks(chunks: AsyncIterator[str], min_chars: Optional[int] = None,
+                          max_delay: Optional[float] = None) -> AsyncIterator[str]:
+    """
+    Re-chunk a text stream into SSE-sized frames.
+
+    - A piece of at least `min_chars` is emitted at once (with anything
+      still buffered in front of it).
+    - Smaller pieces are buffered until the buffer reaches `min_chars`, then
+      emitted up to the last word boundary; the partial word waits for more.
+    - Buffered text is flushed as-is once it is `max_delay` seconds old, so
+      a slow upstream never delays what it has already produced.
+
+    Upstream is read by a separate task into a queue; the frame loop sleeps
+    on one event that is set by a new piece or by the flush deadline timer.
+    """
+    min_chars = Config.SSE_MIN_FRAME_CHARS if min_chars is None else min_chars
+    max_delay = Config.SSE_MAX_FRAME_DELAY if max_delay is None else max_delay
+    loop = asyncio.get_running_loop()
+    queue: Deque[str] = deque()
+    wake = asyncio.Event()
+    finished = False
+
+    async def pump():
+        nonlocal finished
+        try:
+            async for piece in chunks:
+                queue.append(piece)
+                wake.set()
+        finally:
+            finished = True
+            wake.set()
+
+    reader = asyncio.ensure_future(pump())
+    timer: Optional[asyncio.TimerHandle] = None
+    buffer = ""
+    flush_at = 0.0
+
+    def hold(text: str) -> str:
+        # Start the age clock for newly buffered text; the timer wakes the loop at its deadline
+        nonlocal flush_at, timer
+        if text:
+            if timer is not None:
+                timer.cancel()
+            flush_at = loop.time() + max_delay
+            timer = loop.call_at(flush_at, wake.set)
+        return text
+
+    try:
+        while True:
+            while queue:
+                chunk = queue.popleft()
+                if not chunk:
+                    continue
+                if len(chunk) >= min_chars:
+                    yield buffer + chunk
+                    buffer = ""
+                    continue
+                buffer = buffer + chunk if buffer else hold(chunk)
+                if len(buffer) >= min_chars:
+                    cut = _last_boundary(buffer) or len(buffer)
+                    yield buffer[:cut]
+                    buffer = hold(buffer[cut:])
+
+            if finished:
+                break
+            if buffer and loop.time() >= flush_at:
+                # Upstream is slow: send what is buffered rather than wait for it
+                yield buffer
+                buffer = ""
+                continue
+            wake.clear()
+            await wake.wait()
+
+        await reader  # re-raises an upstream error
+        if buffer:
+            yield buffer
+    finally:
+        # Also reached when the consumer goes away (client disconnect): stop the upstream
+        if timer is not None:
+            timer.cancel()
+        if not reader.done():
+            reader.cancel()
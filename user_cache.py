@@ -0,0 +1,76 @@
+"""
+In-process cache of user records, keyed by both id and auth0_sub.
+
+Chat handlers resolve the same user several times per message; the cache
+serves those lookups without touching SQLite and builds the prompt's
+`user_metadata` dict once per cached record.
+"""
+from typing import Dict, Optional
+
+from ttl_cache import TTLCache
+
+# User fields passed to RAGSystem as user_metadata
+USER_METADATA_FIELDS = (
+    'age',
+    'income_range',
+    'marital_status',
+    'employment_status',
+    'education',
+    'location',
+    'financial_goals',
+    'risk_tolerance',
+)
+
+
+def build_user_metadata(user: Dict) -> Dict:
+    """Pick the personalization fields out of a users row"""
+    return {field: user.get(field) for field in USER_METADATA_FIELDS}
+
+
+class CachedUser:
+    """A users row plus its prebuilt metadata dict (both treated as read-only)"""
+
+    __slots__ = ("record", "user_metadata")
+
+    def __init__(self, record: Dict):
+        self.record = record
+        self.user_metadata = build_user_metadata(record)
+
+
+class UserCache:
+    """Bounded LRU + TTL cache of users, looked up by id or auth0_sub"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        # Each user occupies an ("id", ...) and an ("sub", ...) slot
+        self._cache = TTLCache(maxsize=maxsize * 2, ttl=ttl)
+
+    def get_by_id(self, user_id: int) -> Optional[CachedUser]:
+        return self._cache.get(("id", user_id))
+
+    def get_by_auth0_sub(self, auth0_sub: str) -> Optional[CachedUser]:
+        return self._cache.get(("sub", auth0_sub))
+
+    def put(self, record: Dict) -> CachedUser:
+        """Cache a users row under its id and auth0_sub"""
+        cached = CachedUser(record)
+        self._cache.set(("id", record['id']), cached)
+        if record.get('auth0_sub'):
+            self._cache.set(("sub", record['auth0_sub']), cached)
+        return cached
+
+    def invalidate(self, user_id: Optional[int] = None, auth0_sub: Optional[str] = None):
+        """Drop a user by id and/or auth0_sub (both keys of the cached record go)"""
+        for key in (("id", user_id), ("sub", auth0_sub)):
+            if key[1] is None:
+                continue
+            cached = self._cache.pop(key)
+            if cached is not None:
+                self._cache.pop(("id", cached.record['id']))
+                if cached.record.get('auth0_sub'):
+                    self._cache.pop(("sub", cached.record['auth0_sub']))
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> Dict:
+        return self._cache.stats()
@@ -1,13 +1,52 @@
-import chromadb
-from chromadb.config import Settings
-from chromadb.utils import embedding_functions
 from typing import List, Dict, Optional
+import contextlib
 import logging
+import os
+import queue
+import re
+import threading
+import time
+import uuid
 from pathlib import Path
 
+import numpy as np
+
+from config import Config
+from embedding_pool import BatchEmbedder, max_upsert_batch
+from embeddings import create_embedding_function
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from numpy_index import NumpyCollection
+from ttl_cache import TTLCache
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Process-wide cache of normalized query text -> embedding, tagged with the
+# model that produced it so a model change can never serve stale vectors
+_query_embedding_cache = TTLCache(
+    maxsize=Config.QUERY_EMBEDDING_CACHE_SIZE,
+    ttl=Config.QUERY_EMBEDDING_CACHE_TTL or None
+)
+_query_embedding_model: Optional[str] = None
+_query_embedding_lock = threading.Lock()
+
+
+# Marker file rewritten on every ingestion; readers compare it to detect re-ingests
+KB_VERSION_FILE = "kb_version"
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form used both as cache key and as the text that is embedded"""
+    return re.sub(r"\s+", " ", query.strip().lower())
+
+
+def _cosine_distance(a, b) -> float:
+    """1 - cosine similarity (Chroma's "cosine" space)"""
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    norm = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return 1.0 - float(a @ b) / norm if norm else 1.0
+
 
 class VectorStore:
     """Manages vector database for document embeddings"""
@@ -15,55 +54,175 @@ class VectorStore:
     def __init__(self, db_path: str, embedding_model: str = "all-MiniLM-L6-v2"):
         self.db_path = Path(db_path)
         self.db_path.mkdir(parents=True, exist_ok=True)
+        self.embedding_model = embedding_model
+        self._kb_version_path = self.db_path / KB_VERSION_FILE
+        self._kb_version = None
+        self._kb_version_mtime = None
+        # BM25 index, reloaded whenever the knowledge-base version changes
+        self._lexical_index: Optional[BM25Index] = None
+        self._lexical_index_version: Optional[str] = None
         
-        # Use sentence transformers for embeddings
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name=embedding_model
-        )
-        
-        # Initialize ChromaDB client
-        self.client = chromadb.PersistentClient(
-            path=str(self.db_path),
-            settings=Settings(anonymized_telemetry=False)
-        )
+        # sentence-transformers (PyTorch) or ONNX Runtime, per Config.EMBEDDING_BACKEND
+        self.embedding_function = create_embedding_function(embedding_model)
         
-        # Get or create collection
-        self.collection = self.client.get_or_create_collection(
-            name="finance_knowledge_base",
-            embedding_function=self.embedding_function,
-            metadata={"hnsw:space": "cosine"}
-        )
+        self.backend = Config.VECTOR_BACKEND
+        if self.backend == "numpy":
+            self.client = None
+            self.collection = NumpyCollection(
+                str(self.db_path), embedding_function=self.embedding_function, dtype=Config.VECTOR_DTYPE,
+                rescore_candidates=Config.VECTOR_RESCORE_CANDIDATES
+            )
+        else:
+            import chromadb
+            from chromadb.config import Settings
+            
+            # Initialize ChromaDB client
+            self.client = chromadb.PersistentClient(
+                path=str(self.db_path),
+                settings=Settings(anonymized_telemetry=False)
+            )
+            
+            # Get or create collection
+            self.collection = self.client.get_or_create_collection(
+                name="finance_knowledge_base",
+                embedding_function=self.embedding_function,
+                metadata={"hnsw:space": "cosine"}
+            )
+    
+    def write_batch(self):
+        """
+        Context manager grouping writes: the NumPy index is saved once when it
+        exits instead of after every embedding batch and delete (Chroma writes through)
+        """
+        if self.backend == "numpy":
+            return self.collection.batch()
+        return contextlib.nullcontext()
     
     def add_documents(self, documents: List[Dict[str, str]], chunk_size: int = 500, chunk_overlap: int = 50):
         """Add documents to vector store with chunking"""
+        all_ids, all_texts, all_metadatas = self._build_chunks(documents, chunk_size, chunk_overlap)
+        
+        if all_texts:
+            with self.write_batch():
+                self._write_chunks(self.collection.add, all_ids, all_texts, all_metadatas)
+            logger.info(f"Added {len(all_texts)} document chunks to vector store")
+            self.rebuild_lexical_index()
+            self.bump_knowledge_base_version()
+    
+    def upsert_documents(self, documents: List[Dict[str, str]], chunk_size: int = 500,
+                         chunk_overlap: int = 50) -> Dict[str, List[str]]:
+        """
+        Chunk and upsert documents, overwriting chunks with the same ids.
+        
+        Returns the chunk ids written per filename. Does not bump the
+        knowledge-base version; callers do that once per ingestion run.
+        """
+        all_ids, all_texts, all_metadatas = self._build_chunks(documents, chunk_size, chunk_overlap)
+        
+        chunk_ids = {doc["filename"]: [] for doc in documents}
+        for chunk_id, metadata in zip(all_ids, all_metadatas):
+            chunk_ids[metadata["filename"]].append(chunk_id)
+        
+        if all_texts:
+            self._write_chunks(self.collection.upsert, all_ids, all_texts, all_metadatas)
+            logger.info(f"Upserted {len(all_texts)} document chunks")
+        return chunk_ids
+    
+    def _write_chunks(self, write, ids: List[str], texts: List[str], metadatas: List[Dict]) -> Dict:
+        """
+        Embed chunks in batches and hand each batch to `write` (collection.add / upsert).
+        
+        Writes run on a background thread so Chroma stores batch N while
+        batch N+1 embeds. Logs progress and returns throughput stats.
+        """
+        batch_size = max_upsert_batch(self.client, Config.EMBEDDING_BATCH_SIZE)
+        total = len(texts)
+        start = time.perf_counter()
+        # Bounded so embedding can run at most two batches ahead of the writer
+        pending = queue.Queue(maxsize=2)
+        errors = []
+        
+        def writer():
+            while True:
+                batch = pending.get()
+                if batch is None:
+                    return
+                if errors:
+                    continue
+                try:
+                    write(**batch)
+                except Exception as e:
+                    errors.append(e)
+        
+        writer_thread = threading.Thread(target=writer, name="chunk-writer", daemon=True)
+        writer_thread.start()
+        try:
+            # The process pool runs sentence-transformers; ONNX Runtime already uses every core in-process
+            processes = Config.EMBEDDING_PROCESSES if self.embedding_function.backend == "sentence-transformers" else 0
+            with BatchEmbedder(self.embedding_function, self.embedding_model, processes=processes) as embedder:
+                for offset in range(0, total, batch_size):
+                    if errors:
+                        break
+                    end = min(offset + batch_size, total)
+                    pending.put({
+                        "ids": ids[offset:end],
+                        "documents": texts[offset:end],
+                        "metadatas": metadatas[offset:end],
+                        "embeddings": embedder.embed(texts[offset:end]),
+                    })
+                    elapsed = time.perf_counter() - start
+                    logger.info(f"Embedded {end}/{total} chunks ({end / elapsed:.0f} chunks/sec)")
+        finally:
+            pending.put(None)
+            writer_thread.join()
+        if errors:
+            raise errors[0]
+        
+        elapsed = time.perf_counter() - start
+        stats = {
+            "chunks": total,
+            "seconds": round(elapsed, 3),
+            "chunks_per_sec": round(total / elapsed, 1) if elapsed else 0.0,
+        }
+        logger.info(f"Wrote {total} chunks in {stats['seconds']}s ({stats['chunks_per_sec']} chunks/sec)")
+        return stats
+    
+    def delete_chunks(self, chunk_ids: List[str]):
+        """Delete chunks by id (unknown ids are ignored)"""
+        if chunk_ids:
+            self.collection.delete(ids=list(chunk_ids))
+            logger.info(f"Deleted {len(chunk_ids)} document chunks")
+    
+    def _build_chunks(self, documents: List[Dict[str, str]], chunk_size: int, chunk_overlap: int):
+        """Chunk documents into parallel id / text / metadata lists"""
         all_ids = []
         all_texts = []
         all_metadatas = []
         
         for doc in documents:
             filename = doc["filename"]
-            content = doc["content"]
             
-            # Simple chunking by character count
-            chunks = self._chunk_text(content, chunk_size, chunk_overlap)
+            if "chunks" in doc:
+                # Already chunked while streaming the extraction (DocumentProcessor)
+                chunks = doc["chunks"]
+            else:
+                # Simple chunking by character count
+                chunks = [{"text": chunk} for chunk in self._chunk_text(doc["content"], chunk_size, chunk_overlap)]
             
             for i, chunk in enumerate(chunks):
                 chunk_id = f"{filename}_chunk_{i}"
                 all_ids.append(chunk_id)
-                all_texts.append(chunk)
-                all_metadatas.append({
+                all_texts.append(chunk["text"])
+                metadata = {
                     "filename": filename,
                     "chunk_index": i,
                     "file_path": doc.get("file_path", "")
-                })
+                }
+                # Source position (page / paragraph / sheet / row) when known
+                metadata.update((key, value) for key, value in chunk.items() if key != "text")
+                all_metadatas.append(metadata)
         
-        if all_texts:
-            self.collection.add(
-                ids=all_ids,
-                documents=all_texts,
-                metadatas=all_metadatas
-            )
-            logger.info(f"Added {len(all_texts)} document chunks to vector store")
+        return all_ids, all_texts, all_metadatas
     
     def _chunk_text(self, text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
         """Split text into overlapping chunks"""
@@ -91,37 +250,194 @@ class VectorStore:
         
         return [chunk for chunk in chunks if chunk]
     
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a query, reusing the cached vector for repeat (normalized) queries"""
+        return self.embed_queries([query])[0]
+    
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed several queries; cache misses are embedded together in one batch"""
+        global _query_embedding_model
+        with _query_embedding_lock:
+            if _query_embedding_model != self.embedding_function.name:
+                # Vectors from another embedding model (or backend) are not interchangeable
+                _query_embedding_cache.clear()
+                _query_embedding_model = self.embedding_function.name
+        
+        texts = [normalize_query(query) for query in queries]
+        embeddings = [_query_embedding_cache.get(text) for text in texts]
+        missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        if missing:
+            fresh = dict(zip(missing, self.embedding_function(missing)))
+            for text, embedding in fresh.items():
+                _query_embedding_cache.set(text, embedding)
+            embeddings = [
+                embedding if embedding is not None else fresh[text]
+                for text, embedding in zip(texts, embeddings)
+            ]
+        return embeddings
+    
+    def get_query_cache_stats(self) -> Dict:
+        """Hit/miss statistics of the query-embedding cache"""
+        stats = _query_embedding_cache.stats()
+        stats["embedding_model"] = _query_embedding_model
+        return stats
+    
     def search(self, query: str, n_results: int = 5) -> List[Dict]:
-        """Search for similar documents"""
+        """Search for similar documents (dense, fused with BM25 when the lexical index is available)"""
+        return self._search_batch([query], n_results)[0]
+    
+    def search_many(self, queries: List[str], n_results: int = 5) -> List[Dict]:
+        """
+        Retrieve for several sub-questions at once and merge the results.
+        
+        All queries are embedded in one batch and sent in one vector query.
+        The per-query rankings are interleaved (best of each query first)
+        and deduplicated by chunk id, keeping each chunk's smallest distance;
+        every doc records the `query_index` it was retrieved for.
+        """
+        results = self._search_batch(queries, n_results)
+        merged: Dict[str, Dict] = {}
+        for rank in range(max((len(docs) for docs in results), default=0)):
+            for query_index, docs in enumerate(results):
+                if rank >= len(docs):
+                    continue
+                doc = docs[rank]
+                seen = merged.get(doc["id"])
+                if seen is None:
+                    merged[doc["id"]] = dict(doc, query_index=query_index)
+                elif doc["distance"] < seen["distance"]:
+                    seen["distance"] = doc["distance"]
+        return list(merged.values())
+    
+    def _search_batch(self, queries: List[str], n_results: int) -> List[List[Dict]]:
+        """Ranked docs per query from one embedding batch and one vector query"""
+        query_embeddings = self.embed_queries(queries)
+        lexical_index = self.get_lexical_index()
+        if lexical_index is None:
+            return self._dense_search(query_embeddings, n_results)
+        
+        candidates = max(n_results, Config.HYBRID_CANDIDATES)
+        dense_results = self._dense_search(query_embeddings, candidates)
+        fused = []
+        for query, dense_docs in zip(queries, dense_results):
+            lexical_ids = [chunk_id for chunk_id, _ in lexical_index.search(query, candidates)]
+            fused.append(reciprocal_rank_fusion(
+                [[doc["id"] for doc in dense_docs], lexical_ids], k=Config.RRF_K
+            )[:n_results])
+        
+        # Lexical-only hits of every query are fetched in one call
+        dense_by_id = [{doc["id"]: doc for doc in dense_docs} for dense_docs in dense_results]
+        missing = list(dict.fromkeys(
+            chunk_id for ids, docs in zip(fused, dense_by_id) for chunk_id in ids if chunk_id not in docs
+        ))
+        chunks = self._get_chunks(missing) if missing else {}
+        
+        results = []
+        for ids, docs, query_embedding in zip(fused, dense_by_id, query_embeddings):
+            ranked = []
+            for chunk_id in ids:
+                if chunk_id in docs:
+                    ranked.append(docs[chunk_id])
+                elif chunk_id in chunks:
+                    content, metadata, embedding = chunks[chunk_id]
+                    ranked.append({
+                        "id": chunk_id,
+                        "content": content,
+                        "metadata": metadata,
+                        "distance": _cosine_distance(query_embedding, embedding)
+                    })
+            results.append(ranked)
+        return results
+    
+    def _get_chunks(self, chunk_ids: List[str]) -> Dict[str, tuple]:
+        """Fetch (content, metadata, embedding) of chunks by id"""
+        results = self.collection.get(ids=chunk_ids, include=["documents", "metadatas", "embeddings"])
+        return {
+            chunk_id: (
+                results['documents'][i],
+                results['metadatas'][i] if results['metadatas'] else {},
+                results['embeddings'][i]
+            )
+            for i, chunk_id in enumerate(results['ids'])
+        }
+    
+    def _dense_search(self, query_embeddings: List[List[float]], n_results: int) -> List[List[Dict]]:
+        """Nearest chunks by cosine distance, one list per query embedding"""
         results = self.collection.query(
-            query_texts=[query],
+            query_embeddings=list(query_embeddings),
             n_results=n_results
         )
         
-        retrieved_docs = []
-        if results['documents'] and len(results['documents'][0]) > 0:
-            for i in range(len(results['documents'][0])):
-                retrieved_docs.append({
-                    "content": results['documents'][0][i],
-                    "metadata": results['metadatas'][0][i] if results['metadatas'] else {},
-                    "distance": results['distances'][0][i] if results['distances'] else 0
-                })
+        all_docs = []
+        for q in range(len(query_embeddings)):
+            retrieved_docs = []
+            if results['documents'] and len(results['documents'][q]) > 0:
+                for i in range(len(results['documents'][q])):
+                    retrieved_docs.append({
+                        "id": results['ids'][q][i],
+                        "content": results['documents'][q][i],
+                        "metadata": results['metadatas'][q][i] if results['metadatas'] else {},
+                        "distance": results['distances'][q][i] if results['distances'] else 0
+                    })
+            all_docs.append(retrieved_docs)
         
-        return retrieved_docs
+        return all_docs
+    
+    def get_lexical_index(self) -> Optional[BM25Index]:
+        """The BM25 index for the current knowledge-base version, or None (disabled / not built)"""
+        if not Config.HYBRID_SEARCH:
+            return None
+        version = self.get_knowledge_base_version()
+        if version != self._lexical_index_version:
+            self._lexical_index = BM25Index.load(str(self.db_path))
+            self._lexical_index_version = version
+        return self._lexical_index
+    
+    def has_lexical_index(self) -> bool:
+        return BM25Index.exists(str(self.db_path))
+    
+    def rebuild_lexical_index(self):
+        """Re-index every chunk in the collection for BM25 (cheap at knowledge-base scale)"""
+        results = self.collection.get(include=["documents"])
+        BM25Index.build(results['ids'], results['documents']).save(str(self.db_path))
+        self._lexical_index_version = None
     
     def delete_collection(self):
         """Delete the collection (use with caution)"""
         try:
-            self.client.delete_collection("finance_knowledge_base")
+            if self.backend == "numpy":
+                NumpyCollection.remove(str(self.db_path))
+            else:
+                self.client.delete_collection("finance_knowledge_base")
+            BM25Index.remove(str(self.db_path))
+            self.bump_knowledge_base_version()
             logger.info("Collection deleted")
         except Exception as e:
             logger.error(f"Error deleting collection: {e}")
     
+    def bump_knowledge_base_version(self) -> str:
+        """Record that the knowledge base changed (invalidates answer caches in every process)"""
+        version = uuid.uuid4().hex
+        self._kb_version_path.write_text(version)
+        return version
+    
+    def get_knowledge_base_version(self) -> str:
+        """Current knowledge-base version (re-read only when the marker file changes)"""
+        try:
+            mtime = os.stat(self._kb_version_path).st_mtime_ns
+        except FileNotFoundError:
+            return ""
+        if mtime != self._kb_version_mtime:
+            self._kb_version = self._kb_version_path.read_text().strip()
+            self._kb_version_mtime = mtime
+        return self._kb_version
+    
     def get_collection_info(self) -> Dict:
         """Get information about the collection"""
         count = self.collection.count()
         return {
             "collection_name": "finance_knowledge_base",
-            "document_count": count
+            "document_count": count,
+            "backend": self.backend
         }
 